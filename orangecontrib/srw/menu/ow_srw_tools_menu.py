@@ -1,5 +1,7 @@
 __author__ = 'labx'
 
+from PyQt5.QtWidgets import QFileDialog
+
 from orangecanvas.scheme.link import SchemeLink
 from oasys.menus.menu import OMenu
 
@@ -8,6 +10,7 @@ from wofrysrw.propagator.propagators2D.srw_fresnel_native import SRW_APPLICATION
 from wofrysrw.propagator.propagators2D.srw_propagation_mode import SRWPropagationMode
 
 from orangecontrib.srw.util.srw_util import showWarningMessage, showCriticalMessage
+from orangecontrib.srw.util.srw_profiling import SRWPropagationProfile
 from orangecontrib.srw.widgets.optical_elements.ow_srw_screen import OWSRWScreen
 from orangecontrib.srw.widgets.native.ow_srw_intensity_plotter import OWSRWIntensityPlotter
 from orangecontrib.srw.widgets.native.ow_srw_me_degcoh_plotter import OWSRWDegCohPlotter
@@ -32,6 +35,11 @@ class SRWToolsMenu(OMenu):
         self.addSubMenu("Select Plots \'No\' on all Source and O.E. widgets")
         self.addSubMenu("Select Plots \'Yes\' on all Source and O.E. widgets")
         self.closeContainer()
+        self.openContainer()
+        self.addContainer("Profiling")
+        self.addSubMenu("Export Propagation Profile (JSON)")
+        self.addSubMenu("Export Propagation Profile (CSV)")
+        self.closeContainer()
 
     def executeAction_1(self, action):
         try:
@@ -114,8 +122,42 @@ class SRWToolsMenu(OMenu):
         except Exception as exception:
             showCriticalMessage(exception.args[0])
 
+    def executeAction_7(self, action):
+        try:
+            self.export_propagation_profile("JSON")
+        except Exception as exception:
+            showCriticalMessage(exception.args[0])
+
+    def executeAction_8(self, action):
+        try:
+            self.export_propagation_profile("CSV")
+        except Exception as exception:
+            showCriticalMessage(exception.args[0])
+
     #################################################################
 
+    def export_propagation_profile(self, format):
+        records = []
+
+        for node in self.canvas_main_window.current_document().scheme().nodes:
+            widget = self.canvas_main_window.current_document().scheme().widget_for_node(node)
+
+            if hasattr(widget, "propagation_profile") and not widget.propagation_profile is None:
+                for record in widget.propagation_profile.get_records():
+                    if not any(record is collected for collected in records): records.append(record)
+
+        if len(records) == 0: raise Exception("No propagation profile available: run the beamline first")
+
+        file_name, _ = QFileDialog.getSaveFileName(None, "Export Propagation Profile", "propagation_profile." + format.lower(), format + " Files (*." + format.lower() + ")")
+
+        if file_name:
+            propagation_profile = SRWPropagationProfile(records=records)
+
+            if format == "JSON": propagation_profile.save_as_json(file_name)
+            else: propagation_profile.save_as_csv(file_name)
+
+            showWarningMessage("Propagation Profile of " + str(len(records)) + " elements exported to " + file_name)
+
     def set_srw_live_propagation_mode(self):
         for node in self.canvas_main_window.current_document().scheme().nodes:
             widget = self.canvas_main_window.current_document().scheme().widget_for_node(node)
@@ -0,0 +1,129 @@
+import unittest
+
+import numpy
+
+from wofrysrw.propagator.wavefront2D.srw_wavefront import SRWWavefront
+
+from orangecontrib.srw.util.srw_cross_spectral_density import HORIZONTAL, VERTICAL, get_fields, set_fields, \
+    SRWCrossSpectralDensityCuts, SRWLowRankCrossSpectralDensity
+
+NX, NY = 7, 6
+
+def _get_wavefront(ex, ey):
+    wavefront = SRWWavefront()
+    wavefront.allocate(1, NX, NY)
+    wavefront.mesh.eStart, wavefront.mesh.eFin = 1000.0, 1000.0
+    wavefront.mesh.xStart, wavefront.mesh.xFin = -1e-4, 1e-4
+    wavefront.mesh.yStart, wavefront.mesh.yFin = -5e-5, 5e-5
+
+    return set_fields(wavefront, ex, ey)
+
+def _get_random_wavefronts(number_of_wavefronts, seed=0):
+    generator = numpy.random.default_rng(seed)
+
+    def get_field(): return generator.normal(size=(NX, NY)) + 1j*generator.normal(size=(NX, NY))
+
+    return [_get_wavefront(get_field(), get_field()) for _ in range(number_of_wavefronts)]
+
+def _get_dense_reference(wavefronts):
+    '''
+    :return: fields (as stored by SRW) and the exact cross-spectral density, mean of E E^H
+    '''
+    fields = [get_fields(wavefront)[2:] for wavefront in wavefronts]
+    stacked = numpy.array([numpy.concatenate((ex.ravel(), ey.ravel())) for ex, ey in fields])
+
+    return fields, stacked.T @ stacked.conj()/len(wavefronts)
+
+def _get_cut_reference(fields, direction):
+    mutual_intensity = 0.0
+
+    for ex, ey in fields:
+        for field in [ex, ey]:
+            cut = field[:, int(NY/2)] if direction == HORIZONTAL else field[int(NX/2), :]
+            mutual_intensity = mutual_intensity + numpy.outer(cut, cut.conj())
+
+    return mutual_intensity/len(fields)
+
+class SRWCrossSpectralDensityTest(unittest.TestCase):
+
+    def setUp(self):
+        self.wavefronts = _get_random_wavefronts(4)
+        self.fields, self.csd = _get_dense_reference(self.wavefronts)
+
+    def test_fields_round_trip(self):
+        ex, ey = self.fields[0]
+        _, _, ex_copy, ey_copy = get_fields(_get_wavefront(ex, ey))
+
+        numpy.testing.assert_allclose(ex_copy, ex)
+        numpy.testing.assert_allclose(ey_copy, ey)
+
+    def test_cuts_are_exact(self):
+        cuts = SRWCrossSpectralDensityCuts()
+        for wavefront in self.wavefronts: cuts.add(wavefront)
+
+        self.assertEqual(cuts.get_count(), 4)
+
+        for direction in [HORIZONTAL, VERTICAL]:
+            reference = _get_cut_reference(self.fields, direction)
+            mutual_intensity = cuts.get_mutual_intensity(direction)
+
+            numpy.testing.assert_allclose(mutual_intensity, reference, rtol=1e-10, atol=1e-12)
+            numpy.testing.assert_allclose(numpy.linalg.eigvalsh(mutual_intensity), numpy.linalg.eigvalsh(reference), rtol=1e-10, atol=1e-12)
+
+    def test_incremental_decomposition_is_exact_at_full_rank(self):
+        csd = SRWLowRankCrossSpectralDensity(max_rank=10)
+        for wavefront in self.wavefronts: csd.add(wavefront)
+
+        self.assertEqual(csd.get_rank(), 4)
+
+        eigenvalues = numpy.sort(numpy.linalg.eigvalsh(self.csd))[::-1][:4]
+
+        numpy.testing.assert_allclose(csd.get_occupations(), eigenvalues/numpy.trace(self.csd).real, rtol=1e-8)
+        self.assertAlmostEqual(csd.get_captured_fraction(), 1.0, places=10)
+
+        _, _, intensity = csd.get_intensity()
+        numpy.testing.assert_allclose(intensity, (numpy.diag(self.csd).real[:NX*NY] + numpy.diag(self.csd).real[NX*NY:]).reshape((NX, NY)), rtol=1e-8)
+
+        for direction in [HORIZONTAL, VERTICAL]:
+            numpy.testing.assert_allclose(csd.get_mutual_intensity(direction), _get_cut_reference(self.fields, direction), rtol=1e-8, atol=1e-10)
+
+    def test_truncated_decomposition(self):
+        csd = SRWLowRankCrossSpectralDensity(max_rank=2)
+        for wavefront in self.wavefronts: csd.add(wavefront)
+
+        self.assertEqual(csd.get_rank(), 2)
+        self.assertEqual(csd.get_count(), 4)
+        self.assertLess(csd.get_captured_fraction(), 1.0)
+        self.assertTrue(numpy.all(numpy.diff(csd.get_occupations()) <= 0))
+
+    def test_mode_fields_are_normalized(self):
+        csd = SRWLowRankCrossSpectralDensity(max_rank=10)
+        for wavefront in self.wavefronts: csd.add(wavefront)
+
+        fields, occupations = csd.get_mode_fields()
+
+        self.assertEqual(len(fields), 4)
+        self.assertAlmostEqual(sum(occupations), 1.0, places=10)
+
+        # the weighted sum of the intensities of the modes is the mean intensity
+        intensity = sum([occupation*(numpy.abs(ex)**2 + numpy.abs(ey)**2) for (ex, ey), occupation in zip(fields, occupations)])
+        mean_intensity = numpy.mean([numpy.abs(ex)**2 + numpy.abs(ey)**2 for ex, ey in self.fields], axis=0)
+
+        numpy.testing.assert_allclose(intensity, mean_intensity, rtol=1e-8)
+
+        fields, occupations = csd.get_mode_fields(number_of_modes=2)
+
+        self.assertEqual(len(fields), 2)
+        self.assertEqual(len(occupations), 2)
+
+    def test_different_mesh_is_rejected(self):
+        csd = SRWLowRankCrossSpectralDensity()
+        csd.add(self.wavefronts[0])
+
+        wavefront = self.wavefronts[1].duplicate()
+        wavefront.mesh.xFin = 2e-4
+
+        self.assertRaises(ValueError, csd.add, wavefront)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os, tempfile, unittest
+from array import array
+
+import numpy
+
+from srwpy.srwlib import srwl_uti_save_intens_ascii, SRWLRadMesh
+
+from orangecontrib.srw.util.srw_me_sharding import get_shard_file_name
+from orangecontrib.srw.widgets.native.util.me_monitor import SRWIntensityFileWatcher
+
+def _get_intensity(x, y): return 1e12*(2.0 + 300*x + 500*y) # linear: exact interpolation
+
+def _save_intensity(file_name, mesh, scale=1.0):
+    x, y = numpy.meshgrid(numpy.linspace(mesh.xStart, mesh.xFin, mesh.nx), numpy.linspace(mesh.yStart, mesh.yFin, mesh.ny))
+
+    srwl_uti_save_intens_ascii(array('f', (scale*_get_intensity(x, y)).flatten()), mesh, file_name)
+
+class SRWIntensityFileWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name, "output.dat")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read_snapshot(self, watcher, macro_electrons):
+        self.assertIsNone(watcher.read_snapshot(lambda file_name: macro_electrons[file_name])) # files just written
+
+        return watcher.read_snapshot(lambda file_name: macro_electrons[file_name])
+
+    def test_shards_with_different_mesh(self):
+        # each shard saves on the mesh of its first electron
+        meshes = [SRWLRadMesh(1000.0, 1000.0, 1, -1e-3, 1e-3, 11, -5e-4, 5e-4, 7),
+                  SRWLRadMesh(1000.0, 1000.0, 1, -1.2e-3, 1.1e-3, 13, -6e-4, 5.5e-4, 9)]
+        file_names = [get_shard_file_name(self.file_name, index) for index in range(2)]
+
+        for file_name, mesh, scale in zip(file_names, meshes, [1.0, 2.0]): _save_intensity(file_name, mesh, scale)
+
+        x, y, intensity, macro_electrons = self.read_snapshot(SRWIntensityFileWatcher(self.file_name), dict(zip(file_names, [30, 10])))
+
+        self.assertEqual(macro_electrons, 40)
+        self.assertEqual(intensity.shape, (11, 7))
+        numpy.testing.assert_allclose(intensity, 1.25*_get_intensity(x[:, None], y[None, :]), rtol=1e-5)
+
+    def test_shards_with_nothing_saved_are_ignored(self):
+        file_names = [get_shard_file_name(self.file_name, index) for index in range(3)]
+
+        _save_intensity(file_names[0], SRWLRadMesh(1000.0, 1000.0, 1, -1e-3, 1e-3, 11, -5e-4, 5e-4, 7), 1.0)
+        _save_intensity(file_names[1], SRWLRadMesh(1000.0, 1000.0, 1, -2e-3, 2e-3, 5, -1e-3, 1e-3, 3), 5.0) # left over
+        _save_intensity(file_names[2], SRWLRadMesh(1000.0, 1000.0, 1, -1.1e-3, 1e-3, 11, -5e-4, 5.5e-4, 7), 3.0)
+
+        x, y, intensity, macro_electrons = self.read_snapshot(SRWIntensityFileWatcher(self.file_name), dict(zip(file_names, [10, 0, 10])))
+
+        self.assertEqual(macro_electrons, 20)
+        numpy.testing.assert_allclose(intensity, 2.0*_get_intensity(x[:, None], y[None, :]), rtol=1e-5)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import os, unittest, tempfile
+from array import array
+from copy import deepcopy
+
+import numpy
+
+from srwpy.srwlib import srwl_uti_save_intens_ascii, SRWLRadMesh
+
+from orangecontrib.srw.util import srw_qmc_sampling
+from orangecontrib.srw.util.srw_me_sharding import get_shard_sizes, get_shard_file_name, get_shard_seed, merge_shards
+
+class _Moments(object):
+    def __init__(self):
+        self.x, self.xp, self.y, self.yp, self.gamma = 0.0, 0.0, 0.0, 0.0, 6000.0
+
+class _PartBeam(object):
+    def __init__(self):
+        self.partStatMom1 = _Moments()
+        self.arStatMom2 = [1e-10, 0.0, 1e-11, 1e-12, 0.0, 1e-12, 0.0, 0.0, 0.0, 0.0, 1e-6]
+
+class _Mesh(object):
+    def __init__(self):
+        self.eStart, self.eFin, self.ne = 1000.0, 1000.0, 1
+        self.xStart, self.xFin, self.nx = -1e-3, 1e-3, 3
+        self.yStart, self.yFin, self.ny = -1e-3, 1e-3, 3
+
+class _Wavefront(object):
+    def allocate(self, ne, nx, ny): pass
+
+class _SRW(object):
+    '''
+    records the electrons of the calculations of the script, instead of calculating their fields
+    '''
+    def __init__(self):
+        self.electrons = []
+
+    def CalcElecFieldSR(self, wfr, _, magnetic_field_container, arPrecPar):
+        moments = wfr.partBeam.partStatMom1
+        self.electrons.append((moments.x, moments.xp, moments.y, moments.yp, moments.gamma))
+
+    def PropagElecField(self, wfr, optBL): pass
+
+    def CalcIntFromElecField(self, arI, wfr, *args): pass
+
+def _run_shard_script(index, seed=12345, number_of_macro_electrons=10, directory=None):
+    srwl = _SRW()
+
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        script = srw_qmc_sampling.get_python_code(srw_qmc_sampling.PSEUDO_RANDOM, number_of_macro_electrons, 5, 1, 0.01, 1.0,
+                                                  os.path.join(temporary_directory if directory is None else directory, get_shard_file_name("output.dat", index)),
+                                                  seed=get_shard_seed(seed, index))
+
+        exec(script, {"numpy": numpy, "srwl": srwl, "SRWLWfr": _Wavefront, "part_beam": _PartBeam(), "initial_mesh": _Mesh(),
+                      "magnetic_field_container": None, "optBL": None, "srwl_uti_save_intens_ascii": srwl_uti_save_intens_ascii})
+
+    return numpy.array(srwl.electrons)
+
+def _save_intensity(file_name, mesh, get_intensity):
+    '''
+    saves get_intensity(x, y) on the mesh, as the ME scripts do
+    '''
+    x, y = numpy.meshgrid(numpy.linspace(mesh.xStart, mesh.xFin, mesh.nx), numpy.linspace(mesh.yStart, mesh.yFin, mesh.ny))
+
+    srwl_uti_save_intens_ascii(array('f', get_intensity(x, y).flatten()), mesh, file_name)
+
+class SRWMESharding(unittest.TestCase):
+
+    def test_shard_sizes(self):
+        self.assertEqual(get_shard_sizes(10, 3), [4, 3, 3])
+        self.assertEqual(get_shard_sizes(2, 5), [1, 1])
+
+    def test_shards_draw_different_electrons(self):
+        electrons_0 = _run_shard_script(0)
+        electrons_1 = _run_shard_script(1)
+
+        self.assertEqual(electrons_0.shape, (10, 5))
+        self.assertFalse(numpy.any(numpy.all(numpy.isclose(electrons_0[:, None, :4], electrons_1[None, :, :4], rtol=0, atol=0), axis=2)))
+
+    def test_shard_script_is_reproducible(self):
+        numpy.testing.assert_array_equal(_run_shard_script(0), _run_shard_script(0))
+
+    def test_shard_output_is_replaced(self):
+        with tempfile.TemporaryDirectory() as directory:
+            _run_shard_script(0, directory=directory)
+
+            self.assertEqual(os.listdir(directory), [get_shard_file_name("output.dat", 0)])
+            self.assertEqual(numpy.loadtxt(os.path.join(directory, get_shard_file_name("output.dat", 0)), comments="#").size, 9)
+
+    def test_merge_shards(self):
+        with tempfile.TemporaryDirectory() as directory:
+            mesh = SRWLRadMesh(1000.0, 1000.0, 1, -1e-3, 1e-3, 4, -5e-4, 5e-4, 3)
+            file_names = [os.path.join(directory, "shard_" + str(index) + ".dat") for index in range(2)]
+
+            for file_name, value in zip(file_names, [1.0, 4.0]):
+                _save_intensity(file_name, mesh, lambda x, y: numpy.full(x.shape, value))
+
+            merged_file_name = os.path.join(directory, "merged.dat")
+            merge_shards(file_names, [3, 1], merged_file_name)
+
+            numpy.testing.assert_allclose(numpy.loadtxt(merged_file_name, comments="#"), numpy.full(12, 1.75))
+
+    def test_merge_shards_with_different_mesh(self):
+        # with the semi-analytical treatment of the quadratic phase each shard has the mesh of its first electron
+        meshes = [SRWLRadMesh(1000.0, 1000.0, 1, -1e-3, 1e-3, 11, -5e-4, 5e-4, 7),
+                  SRWLRadMesh(1000.0, 1000.0, 1, -1.2e-3, 1.1e-3, 13, -6e-4, 5.5e-4, 9)]
+
+        def get_intensity(x, y): return 1e12*(2.0 + 300*x + 500*y) # linear: exact interpolation
+
+        with tempfile.TemporaryDirectory() as directory:
+            file_names = [os.path.join(directory, "shard_" + str(index) + ".dat") for index in range(2)]
+
+            for file_name, mesh, scale in zip(file_names, meshes, [1.0, 2.0]):
+                _save_intensity(file_name, mesh, lambda x, y: scale*get_intensity(x, y))
+
+            merged_file_name = os.path.join(directory, "merged.dat")
+            merge_shards(file_names, [3, 1], merged_file_name)
+
+            with open(merged_file_name, "r") as file: header = [line for line in file if line.startswith("#")]
+            with open(file_names[0], "r") as file: self.assertEqual(header, [line for line in file if line.startswith("#")])
+
+            x, y = numpy.meshgrid(numpy.linspace(-1e-3, 1e-3, 11), numpy.linspace(-5e-4, 5e-4, 7))
+
+            numpy.testing.assert_allclose(numpy.loadtxt(merged_file_name, comments="#"), 1.25*get_intensity(x, y).flatten(), rtol=1e-5)
+
+    def test_merge_shards_with_different_number_of_values(self):
+        with tempfile.TemporaryDirectory() as directory:
+            mesh = SRWLRadMesh(1000.0, 1000.0, 1, -1e-3, 1e-3, 4, -5e-4, 5e-4, 3)
+            file_names = [os.path.join(directory, "shard_" + str(index) + ".dat") for index in range(2)]
+
+            for file_name in file_names: _save_intensity(file_name, mesh, lambda x, y: numpy.ones(x.shape))
+
+            with open(file_names[1], "a") as file: file.write("1.0\n") # not a complete snapshot
+
+            self.assertRaises(ValueError, merge_shards, file_names, [1, 1], os.path.join(directory, "merged.dat"))
+
+if __name__ == "__main__":
+    unittest.main()
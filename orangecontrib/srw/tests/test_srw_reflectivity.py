@@ -0,0 +1,167 @@
+import os, tempfile, unittest
+from array import array
+
+import numpy
+
+from wofrysrw.beamline.optical_elements.mirrors.srw_mirror import ScaleType
+
+from orangecontrib.srw.util.srw_reflectivity import get_reflectivity_table, write_reflectivity_file, read_reflectivity_file, \
+    is_binary_file, SRWReflectivityTableCache, SRWReflectivityInterpolator
+
+ENERGIES = numpy.array([100.0, 1000.0, 10000.0])
+ANGLES = numpy.array([0.001, 0.003])
+
+def _get_components():
+    '''
+    :return: sigma and pi reflectivities (energies, angles), different at each point
+    '''
+    sigma = numpy.outer(numpy.arange(1, 4), numpy.ones(2))*0.1 + numpy.outer(numpy.ones(3), numpy.arange(2))*0.01
+    return [sigma, sigma + 0.5]
+
+class SRWReflectivityTableTest(unittest.TestCase):
+
+    def test_table_layout(self):
+        components = _get_components()
+        table = get_reflectivity_table(components)
+
+        self.assertEqual(table.size, 2*3*2*2)
+
+        # energy is the inner loop, then grazing angle, then polarization component, (re, im) for each point
+        for component in range(2):
+            for angle in range(2):
+                for energy in range(3):
+                    index = 2*(energy + 3*(angle + 2*component))
+
+                    self.assertEqual(table[index], components[component][energy, angle])
+                    self.assertEqual(table[index + 1], 0.0)
+
+    def test_single_component(self):
+        numpy.testing.assert_array_equal(get_reflectivity_table(_get_components()[0]), get_reflectivity_table(_get_components()[:1]))
+
+    def test_text_and_binary_files(self):
+        table = get_reflectivity_table(_get_components())
+
+        with tempfile.TemporaryDirectory() as directory:
+            for binary in [False, True]:
+                file_name = os.path.join(directory, "reflectivity_" + str(binary) + ".dat")
+
+                write_reflectivity_file(file_name, table, binary=binary)
+
+                self.assertEqual(is_binary_file(file_name), binary)
+                numpy.testing.assert_allclose(read_reflectivity_file(file_name), table, rtol=1e-7)
+
+class SRWReflectivityTableCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name, "reflectivity.dat")
+        self.table = get_reflectivity_table(_get_components())
+
+        write_reflectivity_file(self.file_name, self.table)
+
+        self.cache = SRWReflectivityTableCache()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_table_is_parsed_once(self):
+        table = self.cache.get_table(self.file_name)
+
+        numpy.testing.assert_allclose(table, self.table)
+        self.assertIs(self.cache.get_table(self.file_name), table)
+
+    def test_srw_data(self):
+        srw_data = self.cache.get_srw_data(self.file_name)
+
+        self.assertIsInstance(srw_data, array)
+        self.assertEqual(srw_data.typecode, 'd')
+        numpy.testing.assert_allclose(numpy.frombuffer(srw_data, dtype=numpy.float64), self.table)
+        self.assertIs(self.cache.get_srw_data(self.file_name), srw_data)
+
+    def test_new_version_of_the_file(self):
+        version = self.cache.get_version(self.file_name)
+        self.cache.get_table(self.file_name)
+
+        table = numpy.concatenate((self.table, self.table))
+        write_reflectivity_file(self.file_name, table)
+
+        self.assertNotEqual(self.cache.get_version(self.file_name), version)
+        numpy.testing.assert_allclose(self.cache.get_table(self.file_name), table)
+
+    def test_put_table(self):
+        table = self.table*0.5
+
+        write_reflectivity_file(self.file_name, table, binary=True)
+        self.cache.put_table(self.file_name, table)
+
+        numpy.testing.assert_array_equal(self.cache.get_table(self.file_name), table)
+
+    def test_maximum_number_of_tables(self):
+        cache = SRWReflectivityTableCache(max_tables=1)
+
+        other_file_name = os.path.join(self.directory.name, "other.dat")
+        write_reflectivity_file(other_file_name, self.table)
+
+        table = cache.get_table(self.file_name)
+        cache.get_table(other_file_name)
+
+        self.assertIsNot(cache.get_table(self.file_name), table)
+
+class SRWReflectivityInterpolatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.components = _get_components()
+        self.table = get_reflectivity_table(self.components)
+
+    def get_interpolator(self, energy_scale_type=ScaleType.LINEAR):
+        return SRWReflectivityInterpolator(self.table, 3, 2, 2,
+                                           ENERGIES[0], ENERGIES[-1], energy_scale_type,
+                                           ANGLES[0], ANGLES[-1], ScaleType.LINEAR)
+
+    def test_wrong_number_of_values(self):
+        self.assertRaises(ValueError, SRWReflectivityInterpolator, self.table[:-2], 3, 2, 2, ENERGIES[0], ENERGIES[-1])
+
+    def test_values_at_the_mesh_points(self):
+        interpolator = self.get_interpolator(ScaleType.LOGARITHMIC)
+
+        for energy_index, energy in enumerate(ENERGIES):
+            for angle_index, angle in enumerate(ANGLES):
+                numpy.testing.assert_allclose(interpolator.interpolate(energy, angle),
+                                              [component[energy_index, angle_index] for component in self.components])
+
+    def test_bilinear_interpolation(self):
+        interpolator = self.get_interpolator(ScaleType.LINEAR)
+
+        energy = 0.5*(ENERGIES[0] + ENERGIES[-1]) # at half the linear mesh: second point
+        angle = 0.5*(ANGLES[0] + ANGLES[1])
+
+        expected = [0.5*(component[1, 0] + component[1, 1]) for component in self.components]
+
+        numpy.testing.assert_allclose(interpolator.interpolate(energy, angle), expected)
+
+    def test_logarithmic_scale(self):
+        interpolator = self.get_interpolator(ScaleType.LOGARITHMIC)
+
+        energy = numpy.sqrt(ENERGIES[0]*ENERGIES[1]) # halfway between the first two points, in logarithmic scale
+
+        numpy.testing.assert_allclose(interpolator.interpolate(energy, ANGLES[0]),
+                                      [0.5*(component[0, 0] + component[1, 0]) for component in self.components])
+
+    def test_values_outside_the_mesh(self):
+        interpolator = self.get_interpolator()
+
+        self.assertFalse(interpolator.is_in_mesh(50000.0, ANGLES[0]))
+        self.assertTrue(interpolator.is_in_mesh(ENERGIES[1], ANGLES[1]))
+
+        numpy.testing.assert_allclose(interpolator.interpolate(50000.0, 1.0), [component[-1, -1] for component in self.components])
+
+    def test_arrays(self):
+        interpolator = self.get_interpolator(ScaleType.LOGARITHMIC) # the energies are the points of the logarithmic mesh
+
+        reflectivity = interpolator.interpolate(ENERGIES, ANGLES[0])
+
+        self.assertEqual(reflectivity.shape, (2, 3))
+        numpy.testing.assert_allclose(reflectivity[0], self.components[0][:, 0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import os, tempfile, unittest
+
+import numpy
+import h5py
+
+from orangecontrib.srw.util.srw_running_statistics import SRWRunningStatistics
+
+class SRWRunningStatisticsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.values = numpy.random.default_rng(0).normal(loc=1e12, scale=1e10, size=(20, 4, 3))
+
+        self.statistics = SRWRunningStatistics()
+        for values in self.values: self.statistics.add(values)
+
+    def test_statistics_of_the_sequence(self):
+        self.assertEqual(self.statistics.get_count(), 20)
+        self.assertEqual(self.statistics.get_shape(), (4, 3))
+
+        numpy.testing.assert_allclose(self.statistics.get_mean(), numpy.mean(self.values, axis=0), rtol=1e-12)
+        numpy.testing.assert_allclose(self.statistics.get_sum(), numpy.sum(self.values, axis=0), rtol=1e-12)
+        numpy.testing.assert_allclose(self.statistics.get_variance(), numpy.var(self.values, axis=0, ddof=1), rtol=1e-8)
+        numpy.testing.assert_allclose(self.statistics.get_standard_error(), numpy.std(self.values, axis=0, ddof=1)/numpy.sqrt(20), rtol=1e-8)
+
+    def test_variance_of_a_single_array(self):
+        statistics = SRWRunningStatistics()
+
+        self.assertIsNone(statistics.get_variance())
+
+        statistics.add(self.values[0])
+
+        numpy.testing.assert_array_equal(statistics.get_variance(), numpy.zeros((4, 3)))
+
+    def test_different_shape_is_rejected(self):
+        self.assertRaises(ValueError, self.statistics.add, numpy.zeros((3, 4)))
+
+    def test_reset(self):
+        self.statistics.reset()
+
+        self.assertEqual(self.statistics.get_count(), 0)
+        self.assertIsNone(self.statistics.get_mean())
+
+    def test_save_to_hdf5(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "statistics.h5")
+
+            self.statistics.save_to_hdf5(file_name, attributes={"variable": "energy"})
+
+            self.assertFalse(os.path.exists(file_name + ".tmp"))
+
+            with h5py.File(file_name, "r") as file:
+                self.assertEqual(file.attrs["count"], 20)
+                self.assertEqual(file.attrs["variable"], "energy")
+
+                numpy.testing.assert_array_equal(file["mean"][()], self.statistics.get_mean())
+                numpy.testing.assert_array_equal(file["variance"][()], self.statistics.get_variance())
+
+    def test_save_without_data(self):
+        self.assertRaises(ValueError, SRWRunningStatistics().save_to_hdf5, "statistics.h5")
+
+if __name__ == "__main__":
+    unittest.main()
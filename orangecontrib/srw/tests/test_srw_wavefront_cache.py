@@ -0,0 +1,38 @@
+import os, time, tempfile, unittest
+
+from orangecontrib.srw.util.srw_wavefront_cache import get_signature
+
+class _MagneticStructure(object):
+    def __init__(self, file_name, comment_character="#"):
+        self._name = "Undulator"
+        self.file_name = file_name
+        self.comment_character = comment_character
+
+class SignatureTest(unittest.TestCase):
+
+    def setUp(self):
+        file_descriptor, self.file_name = tempfile.mkstemp(suffix=".dat")
+        with os.fdopen(file_descriptor, "w") as file: file.write("1 2 3\n")
+
+    def tearDown(self):
+        os.remove(self.file_name)
+
+    def test_name_is_ignored(self):
+        renamed = _MagneticStructure(self.file_name)
+        renamed._name = "Other"
+
+        self.assertEqual(get_signature(_MagneticStructure(self.file_name)), get_signature(renamed))
+
+    def test_file_name_is_considered(self):
+        self.assertNotEqual(get_signature(_MagneticStructure(self.file_name)), get_signature(_MagneticStructure(self.file_name + ".other")))
+
+    def test_file_content_is_considered(self):
+        signature = get_signature(_MagneticStructure(self.file_name))
+
+        with open(self.file_name, "w") as file: file.write("1 2 3 4\n")
+        os.utime(self.file_name, ns=(time.time_ns(), time.time_ns() + 10**9))
+
+        self.assertNotEqual(signature, get_signature(_MagneticStructure(self.file_name)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+from collections import OrderedDict
+
+from wofry.propagator.propagator import PropagationParameters
+from wofrysrw.beamline.srw_beamline import SRWBeamline
+
+from wofrysrw.propagator.wavefront2D.srw_wavefront import SRWWavefront
+
+from orangecontrib.srw.util.srw_hdf5 import save_wfr_2_hdf5, load_hdf5_2_wfr
+from orangecontrib.srw.util.srw_profiling import get_mesh_info
+from orangecontrib.srw.util.srw_settings import get_global_setting, set_global_setting
+
+class SRWPropagationStep(object):
+    '''
+    A beamline element with its wavefront propagation parameters, linked to the upstream step: the chain of steps
+    describes the beamline up to an element in whole beamline mode. Steps are created anew every time an element is
+    recalculated, so their identity marks an unchanged beamline prefix.
+    '''
+    NO_CHECKPOINT = 0
+    IN_MEMORY = 1
+    HDF5 = 2
+
+    def __init__(self, beamline_element, previous_step=None, owner=None, checkpoint=NO_CHECKPOINT, checkpoint_file_name=None):
+        self.beamline_element = beamline_element
+        self.previous_step = previous_step
+        self.owner = owner
+        self.wavefront_propagation_parameters = []
+        self.checkpoint = checkpoint
+        self.checkpoint_file_name = checkpoint_file_name
+
+    # same signature of SRWBeamline, to be used in set_additional_parameters
+    def append_wavefront_propagation_parameters(self, wavefront_propagation_parameters, wavefront_propagation_optional_parameters=None, where=None):
+        self.wavefront_propagation_parameters.append((wavefront_propagation_parameters, wavefront_propagation_optional_parameters, where))
+
+    def get_steps(self):
+        steps = []
+        step = self
+        while not step is None:
+            steps.insert(0, step)
+            step = step.previous_step
+
+        return steps
+
+def get_segment_beamline(steps):
+    beamline = SRWBeamline(light_source=None)
+
+    for step in steps:
+        beamline.append_beamline_element(step.beamline_element)
+        for parameters, optional_parameters, where in step.wavefront_propagation_parameters:
+            beamline.append_wavefront_propagation_parameters(parameters, optional_parameters, where)
+
+    return beamline
+
+def propagate_segment(propagator, handler_name, wavefront, steps):
+    propagation_parameters = PropagationParameters(wavefront=wavefront.duplicate(),
+                                                   propagation_elements=None)
+    propagation_parameters.set_additional_parameters("working_beamline", get_segment_beamline(steps))
+
+    return propagator.do_propagation(propagation_parameters=propagation_parameters, handler_name=handler_name)
+
+class SRWCheckpoint(object):
+    def __init__(self, source_wavefront, step, wavefront=None, file_name=None, pinned=False):
+        self.source_wavefront = source_wavefront
+        self.step = step
+        self.wavefront = wavefront
+        self.file_name = file_name
+        self.pinned = pinned
+        self.memory = 0.0 if wavefront is None else get_mesh_info(wavefront)[3]/1024 # GB
+
+    def get_wavefront(self):
+        if self.wavefront is None: return SRWWavefront.decorateSRWWF(load_hdf5_2_wfr(self.file_name, "wfr"))
+        else: return self.wavefront
+
+class SRWCheckpointStore(object):
+    '''
+    Process-wide store of intermediate wavefronts of whole beamline propagations, keyed by the source
+    wavefront and by the last propagated step. All the wavefronts kept in memory count against the memory
+    limit (a global setting): beyond it the checkpoints are evicted least recently used first, the ones
+    requested by the user on an element (pinned) only after all the others. Checkpoints in HDF5 files take
+    no memory and are always kept.
+    '''
+    __instance = None
+
+    DEFAULT_MAX_MEMORY = 2.0
+
+    @classmethod
+    def Instance(cls):
+        if cls.__instance is None: cls.__instance = SRWCheckpointStore(max_memory=get_global_setting("checkpoints_max_memory", SRWCheckpointStore.DEFAULT_MAX_MEMORY))
+
+        return cls.__instance
+
+    def __init__(self, max_memory=DEFAULT_MAX_MEMORY):
+        self.__checkpoints = OrderedDict()
+        self.__max_memory = max_memory # GB
+
+    def get_max_memory(self):
+        return self.__max_memory
+
+    def set_max_memory(self, max_memory):
+        self.__max_memory = max_memory
+        set_global_setting("checkpoints_max_memory", max_memory)
+
+        self.__evict()
+
+    def get_memory(self):
+        return sum([checkpoint.memory for checkpoint in self.__checkpoints.values()])
+
+    def clear(self):
+        self.__checkpoints.clear()
+
+    def store_checkpoint(self, source_wavefront, step, wavefront):
+        # checkpoints of previous calculations of the same element are obsolete
+        if not step.owner is None:
+            for key in [key for key, checkpoint in self.__checkpoints.items() if checkpoint.step.owner == step.owner]:
+                del self.__checkpoints[key]
+
+        if step.checkpoint == SRWPropagationStep.HDF5:
+            save_wfr_2_hdf5(wavefront, step.checkpoint_file_name, subgroupname="wfr", intensity=False, phase=False, overwrite=True)
+
+            checkpoint = SRWCheckpoint(source_wavefront, step, file_name=step.checkpoint_file_name, pinned=True)
+        else:
+            checkpoint = SRWCheckpoint(source_wavefront, step, wavefront=wavefront, pinned=step.checkpoint == SRWPropagationStep.IN_MEMORY)
+
+            if checkpoint.memory > self.__max_memory:
+                if checkpoint.pinned: print("Checkpoint not stored: its wavefront ({0:.3g} GB) exceeds the memory for intermediate wavefronts ({1:.3g} GB)".format(checkpoint.memory, self.__max_memory))
+
+                return
+
+        self.__checkpoints[id(step)] = checkpoint
+        self.__checkpoints.move_to_end(id(step))
+        self.__evict()
+
+    def get_checkpoint(self, source_wavefront, step):
+        checkpoint = self.__checkpoints.get(id(step), None)
+
+        if checkpoint is None or not checkpoint.source_wavefront is source_wavefront or not checkpoint.step is step: return None
+
+        self.__checkpoints.move_to_end(id(step))
+
+        return checkpoint.get_wavefront()
+
+    def find_last_checkpoint(self, source_wavefront, steps):
+        '''
+        :return: number of steps already propagated and the corresponding wavefront (None if nothing is stored)
+        '''
+        for index in range(len(steps)-1, -1, -1):
+            wavefront = self.get_checkpoint(source_wavefront, steps[index])
+
+            if not wavefront is None: return index+1, wavefront
+
+        return 0, None
+
+    def __evict(self):
+        for pinned in [False, True]:
+            for key in [key for key, checkpoint in self.__checkpoints.items() if checkpoint.pinned == pinned and checkpoint.memory > 0]:
+                if self.get_memory() <= self.__max_memory: return
+
+                if pinned: print("Checkpoint of " + str(self.__checkpoints[key].step.beamline_element.get_optical_element().name) + " evicted: memory for intermediate wavefronts exceeded")
+
+                del self.__checkpoints[key]
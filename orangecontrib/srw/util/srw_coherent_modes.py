@@ -0,0 +1,136 @@
+'''
+Coherent mode representation of a Gaussian-Schell model (GSM) source: the partially coherent beam is the incoherent
+sum of Hermite-Gaussian modes, with weights decreasing geometrically with the mode order (A. Starikov, E. Wolf,
+J. Opt. Soc. Am. 72 (1982) 923).
+
+In each direction the GSM source has rms size sigma (intensity) and coherence length xi, given by the ratio
+between the emittance of the beam and the coherent emittance lambda/4pi:
+
+    xi = 2 sigma / sqrt((epsilon/epsilon_r)^2 - 1),  epsilon = epsilon_e + epsilon_r
+'''
+import numpy
+import scipy.constants as codata
+from scipy.interpolate import RegularGridInterpolator
+
+from orangecontrib.srw.util.srw_util import SRWPlot
+from orangecontrib.srw.util.srw_parallel import propagate_wavefronts
+
+m2ev = codata.c * codata.h / codata.e
+
+def get_coherence_length(sigma, electron_beam_emittance, photon_energy):
+    coherent_emittance = m2ev/photon_energy/(4*numpy.pi)
+    ratio = (electron_beam_emittance + coherent_emittance)/coherent_emittance
+
+    return numpy.inf if ratio <= 1.0 else 2*sigma/numpy.sqrt(ratio**2 - 1)
+
+def get_mode_parameters(sigma, coherence_length):
+    '''
+    :return: rms size of the intensity of the fundamental mode, ratio between the weights of consecutive modes
+    '''
+    if numpy.isinf(coherence_length): return sigma, 0.0
+
+    a = 1/(4*sigma**2)
+    b = 1/(2*coherence_length**2)
+    c = numpy.sqrt(a**2 + 2*a*b)
+
+    return 1/(2*numpy.sqrt(c)), b/(a + b + c)
+
+def get_coherent_modes(sigma_x, sigma_y, electron_beam_emittance_x, electron_beam_emittance_y, photon_energy, number_of_modes):
+    '''
+    :return: rms sizes of the fundamental mode (x, y), list of (order x, order y, weight) of the most intense modes,
+             at most number_of_modes, by decreasing weight. The weights of all the modes sum to 1.
+    '''
+    mode_sigma_x, kappa_x = get_mode_parameters(sigma_x, get_coherence_length(sigma_x, electron_beam_emittance_x, photon_energy))
+    mode_sigma_y, kappa_y = get_mode_parameters(sigma_y, get_coherence_length(sigma_y, electron_beam_emittance_y, photon_energy))
+
+    orders = numpy.arange(number_of_modes)
+    weights = numpy.outer((1 - kappa_x)*kappa_x**orders, (1 - kappa_y)*kappa_y**orders)
+
+    modes = []
+    for index in numpy.argsort(weights, axis=None)[::-1][:number_of_modes]:
+        order_x, order_y = numpy.unravel_index(index, weights.shape)
+
+        if weights[order_x, order_y] > 0: modes.append((int(order_x), int(order_y), float(weights[order_x, order_y])))
+
+    return mode_sigma_x, mode_sigma_y, modes
+
+class SRWCoherentModes(object):
+    '''
+    Wavefronts of the coherent modes of a source and their weights
+    '''
+    def __init__(self, wavefronts=None, weights=None, number_of_processes=1):
+        self.__wavefronts = [] if wavefronts is None else wavefronts
+        self.__weights = [] if weights is None else weights
+        self.__number_of_processes = number_of_processes
+        self.__intensity_ticket = None
+
+    def get_number_of_modes(self):
+        return len(self.__wavefronts)
+
+    def get_wavefronts(self):
+        return self.__wavefronts
+
+    def get_weights(self):
+        return self.__weights
+
+    def get_number_of_processes(self):
+        return self.__number_of_processes
+
+    def get_captured_fraction(self):
+        return sum(self.__weights)
+
+    def propagate(self, get_propagation_parameters, handler_name):
+        '''
+        :param get_propagation_parameters: function (wavefront) -> PropagationParameters
+        :return: the propagated modes, calculated in parallel
+        '''
+        wavefronts = propagate_wavefronts([get_propagation_parameters(wavefront) for wavefront in self.__wavefronts],
+                                          handler_name, self.__number_of_processes)
+
+        return SRWCoherentModes(wavefronts, self.__weights, self.__number_of_processes)
+
+    def get_intensity(self):
+        '''
+        :return: h, v, weighted sum of the intensities of the modes, normalized to the captured fraction. If propagation
+                 resized the meshes of the modes differently, the intensities are interpolated on a mesh covering all
+                 of them, with the largest number of points among the modes (zero outside the mesh of each mode).
+        '''
+        intensities = [self.__get_intensity(wavefront)[1:] for wavefront in self.__wavefronts]
+
+        h, v = self.__get_union_mesh([h_mode for h_mode, _, _ in intensities], [v_mode for _, v_mode, _ in intensities])
+        hh, vv = None, None
+
+        total_intensity = numpy.zeros((h.size, v.size))
+
+        for (h_mode, v_mode, intensity_mode), weight in zip(intensities, self.__weights):
+            if not (h_mode.shape == h.shape and v_mode.shape == v.shape and numpy.allclose(h_mode, h) and numpy.allclose(v_mode, v)):
+                if hh is None: hh, vv = numpy.meshgrid(h, v, indexing="ij")
+
+                intensity_mode = RegularGridInterpolator((h_mode, v_mode), intensity_mode, bounds_error=False, fill_value=0.0)((hh, vv))
+
+            total_intensity += weight*intensity_mode
+
+        return h, v, total_intensity/self.get_captured_fraction()
+
+    @classmethod
+    def __get_union_mesh(cls, hs, vs):
+        def get_axis(coordinates):
+            if all([axis.shape == coordinates[0].shape and numpy.allclose(axis, coordinates[0]) for axis in coordinates[1:]]): return coordinates[0]
+
+            return numpy.linspace(min([axis[0] for axis in coordinates]), max([axis[-1] for axis in coordinates]), max([axis.size for axis in coordinates]))
+
+        return get_axis(hs), get_axis(vs)
+
+    def get_intensity_ticket(self):
+        if self.__intensity_ticket is None:
+            h, v, intensity = self.get_intensity()
+
+            self.__intensity_ticket = SRWPlot.get_ticket_2D(h*1000, v*1000, intensity)
+
+        return self.__intensity_ticket
+
+    @classmethod
+    def __get_intensity(cls, wavefront):
+        e, h, v, intensity = wavefront.get_intensity(multi_electron=False)
+
+        return e, h, v, intensity[int(e.size/2)]
@@ -0,0 +1,233 @@
+'''
+Cross-spectral density (mutual intensity) accumulated from the electric fields of a sequence of wavefronts, e.g. the
+single-electron wavefronts of a Monte Carlo loop: W(r1, r2) = <E(r1) E*(r2)>, summed over the polarization components.
+
+- 1D cuts (horizontal and vertical, through the center of the mesh): dense (n x n) matrices
+- 2D: low-rank decomposition W = U diag(lambda) U^H, updated incrementally with each field (M. Brand, Linear Algebra
+  Appl. 415 (2006) 20) and truncated to a maximum rank, so that memory stays (nx*ny x rank). The columns of U are the
+  coherent modes, lambda their occupations.
+
+All fields are taken at the central photon energy of the wavefronts.
+'''
+import array
+import numpy
+
+HORIZONTAL = 0
+VERTICAL = 1
+
+def get_fields(srw_wavefront):
+    '''
+    :return: h, v, fields Ex and Ey as complex arrays (nx, ny), at the central photon energy
+    '''
+    mesh = srw_wavefront.mesh
+
+    h = numpy.linspace(mesh.xStart, mesh.xFin, mesh.nx)
+    v = numpy.linspace(mesh.yStart, mesh.yFin, mesh.ny)
+    energy_index = int(mesh.ne/2)
+
+    # SRW field layout: [y][x][energy][re, im]
+    def get_field(srw_array):
+        data = numpy.frombuffer(srw_array, dtype=numpy.dtype(srw_array.typecode)).reshape((mesh.ny, mesh.nx, mesh.ne, 2))
+        data = data[:, :, energy_index, :].astype(numpy.float64)
+
+        return (data[:, :, 0] + 1j*data[:, :, 1]).T
+
+    return h, v, get_field(srw_wavefront.arEx), get_field(srw_wavefront.arEy)
+
+def set_fields(srw_wavefront, ex, ey):
+    '''
+    Replaces the fields of a wavefront with a single photon energy with the complex arrays (nx, ny)
+    '''
+    mesh = srw_wavefront.mesh
+
+    if mesh.ne != 1: raise ValueError("Wavefront must have a single photon energy")
+
+    for name, field in [["arEx", ex], ["arEy", ey]]:
+        typecode = getattr(srw_wavefront, name).typecode
+
+        data = numpy.empty((mesh.ny, mesh.nx, 1, 2), dtype=numpy.dtype(typecode))
+        data[:, :, 0, 0] = field.real.T
+        data[:, :, 0, 1] = field.imag.T
+
+        setattr(srw_wavefront, name, array.array(typecode, data.tobytes()))
+
+    return srw_wavefront
+
+def _check_mesh(h, v, other_h, other_v):
+    if not (h.shape == other_h.shape and v.shape == other_v.shape and numpy.allclose(h, other_h) and numpy.allclose(v, other_v)):
+        raise ValueError("Mesh of the received wavefront is different from the accumulated one")
+
+class SRWCrossSpectralDensityCuts(object):
+    '''
+    Dense mutual intensity of the horizontal and vertical cuts through the center of the mesh
+    '''
+    def __init__(self):
+        self.__count = 0
+        self.__h = None
+        self.__v = None
+        self.__csd = [None, None]
+
+    def get_count(self):
+        return self.__count
+
+    def add(self, srw_wavefront):
+        h, v, ex, ey = get_fields(srw_wavefront)
+
+        if self.__count == 0:
+            self.__h, self.__v = h, v
+            self.__csd = [numpy.zeros((h.size, h.size), dtype=complex), numpy.zeros((v.size, v.size), dtype=complex)]
+        else:
+            _check_mesh(self.__h, self.__v, h, v)
+
+        for direction, cuts in [[HORIZONTAL, [ex[:, int(v.size/2)], ey[:, int(v.size/2)]]],
+                                [VERTICAL,   [ex[int(h.size/2), :], ey[int(h.size/2), :]]]]:
+            for cut in cuts: self.__csd[direction] += numpy.outer(cut, cut.conj())
+
+        self.__count += 1
+
+    def get_coordinates(self, direction):
+        return self.__h if direction == HORIZONTAL else self.__v
+
+    def get_mutual_intensity(self, direction):
+        return None if self.__count == 0 else self.__csd[direction]/self.__count
+
+class SRWLowRankCrossSpectralDensity(object):
+    '''
+    2D cross-spectral density as incoherent sum of at most max_rank coherent modes
+    '''
+    def __init__(self, max_rank=50):
+        self.__max_rank = max_rank
+        self.__count = 0
+        self.__h = None
+        self.__v = None
+        self.__modes = None         # orthonormal columns, [Ex; Ey] stacked: (2*nx*ny, rank)
+        self.__singular_values = None
+        self.__total_power = 0.0    # trace of the sum of E E^H, not affected by the truncation
+
+    def get_count(self):
+        return self.__count
+
+    def get_rank(self):
+        return 0 if self.__singular_values is None else self.__singular_values.size
+
+    def add(self, srw_wavefront):
+        h, v, ex, ey = get_fields(srw_wavefront)
+
+        if self.__count == 0: self.__h, self.__v = h, v
+        else: _check_mesh(self.__h, self.__v, h, v)
+
+        field = numpy.concatenate((ex.ravel(), ey.ravel()))
+        power = numpy.vdot(field, field).real
+
+        self.__count += 1
+        self.__total_power += power
+
+        if power == 0.0: return
+
+        if self.__modes is None:
+            self.__modes = (field/numpy.sqrt(power)).reshape((field.size, 1))
+            self.__singular_values = numpy.array([numpy.sqrt(power)])
+        else:
+            # [U S, e] = [U, q] K, with K = [[S, p], [0, rho]]: only the SVD of the small matrix K is needed
+            projection = self.__modes.conj().T @ field
+            residual = field - self.__modes @ projection
+            rho = numpy.linalg.norm(residual)
+
+            rank = self.__singular_values.size
+
+            k = numpy.zeros((rank + 1, rank + 1), dtype=complex)
+            k[:rank, :rank] = numpy.diag(self.__singular_values)
+            k[:rank, rank] = projection
+            k[rank, rank] = rho
+
+            u_k, s_k, _ = numpy.linalg.svd(k)
+
+            new_rank = min(rank + 1, self.__max_rank)
+
+            if rho > 1e-12*numpy.sqrt(power):
+                self.__modes = numpy.hstack((self.__modes, (residual/rho).reshape((field.size, 1)))) @ u_k[:, :new_rank]
+            else:
+                new_rank = min(rank, new_rank)
+                self.__modes = self.__modes @ u_k[:rank, :new_rank]
+
+            self.__singular_values = s_k[:new_rank]
+
+    def get_coordinates(self):
+        return self.__h, self.__v
+
+    def get_occupations(self):
+        '''
+        :return: eigenvalues of the cross-spectral density, normalized to its trace (by decreasing value)
+        '''
+        return None if self.__singular_values is None else self.__singular_values**2/self.__total_power
+
+    def get_captured_fraction(self):
+        return 0.0 if self.__singular_values is None else float(numpy.sum(self.get_occupations()))
+
+    def __get_mode_fields(self, index):
+        nx, ny = self.__h.size, self.__v.size
+
+        mode = self.__modes[:, index]
+
+        return mode[:nx*ny].reshape((nx, ny)), mode[nx*ny:].reshape((nx, ny))
+
+    def get_intensity(self):
+        '''
+        :return: h, v, mean intensity of the accumulated wavefronts, as sum of the intensities of the modes
+        '''
+        if self.__modes is None: return None
+
+        weights = self.__singular_values**2/self.__count
+        nx, ny = self.__h.size, self.__v.size
+
+        intensity = (numpy.abs(self.__modes)**2 @ weights)
+
+        return self.__h, self.__v, (intensity[:nx*ny] + intensity[nx*ny:]).reshape((nx, ny))
+
+    def get_mutual_intensity(self, direction):
+        '''
+        :return: mutual intensity of the cut through the center of the mesh
+        '''
+        if self.__modes is None: return None
+
+        weights = self.__singular_values**2/self.__count
+        nx, ny = self.__h.size, self.__v.size
+
+        mutual_intensity = 0.0
+
+        for component in [self.__modes[:nx*ny], self.__modes[nx*ny:]]:
+            component = component.reshape((nx, ny, weights.size))
+            cuts = component[:, int(ny/2), :] if direction == HORIZONTAL else component[int(nx/2), :, :]
+
+            mutual_intensity = mutual_intensity + (cuts*weights) @ cuts.conj().T
+
+        return mutual_intensity
+
+    def get_mode_fields(self, number_of_modes=None):
+        '''
+        :return: fields (Ex, Ey) of the most occupied modes, scaled to the power of the mean wavefront, and their
+                 occupations: the weighted sum of their intensities is the mean intensity (captured by the modes)
+        '''
+        if self.__modes is None: raise ValueError("No wavefronts accumulated")
+
+        number_of_modes = self.get_rank() if number_of_modes is None else min(number_of_modes, self.get_rank())
+        amplitude = numpy.sqrt(self.__total_power/self.__count)
+
+        fields = []
+        for index in range(number_of_modes):
+            ex, ey = self.__get_mode_fields(index)
+
+            fields.append((amplitude*ex, amplitude*ey))
+
+        return fields, [float(occupation) for occupation in self.get_occupations()[:number_of_modes]]
+
+    def get_coherent_modes(self, reference_wavefront, number_of_modes=None, number_of_processes=1):
+        '''
+        :param reference_wavefront: an accumulated wavefront, with a single photon energy, duplicated for each mode
+        :return: SRWCoherentModes with the most occupied modes, with the same power of the mean wavefront
+        '''
+        from orangecontrib.srw.util.srw_coherent_modes import SRWCoherentModes # it needs the GUI and the parallel calculations
+
+        fields, occupations = self.get_mode_fields(number_of_modes)
+
+        return SRWCoherentModes([set_fields(reference_wavefront.duplicate(), ex, ey) for ex, ey in fields], occupations, number_of_processes)
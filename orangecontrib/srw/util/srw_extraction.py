@@ -0,0 +1,96 @@
+import numpy
+
+from wofrysrw.propagator.wavefront2D.srw_wavefront import PolarizationComponent
+
+from orangecontrib.srw.util.srw_util import SRWPlot
+from orangecontrib.srw.util.srw_me_convolution import get_intensity_estimate
+
+class SRWWavefrontExtraction(object):
+    """
+    Memoized extraction of plottable quantities from a SRW wavefront, at the central photon energy.
+
+    Single electron intensities and phases of the linear polarization components are derived from one
+    decoding of the electric field arrays (Ex, Ey), instead of one SRW extraction call per component.
+    """
+
+    def __init__(self, srw_wavefront):
+        self.__srw_wavefront = srw_wavefront
+        self.__fields = None
+        self.__tickets = {}
+
+    def get_srw_wavefront(self):
+        return self.__srw_wavefront
+
+    def get_intensity_ticket(self, polarization_component=PolarizationComponent.TOTAL, multi_electron=False):
+        key = ("intensity", polarization_component, multi_electron)
+
+        if not key in self.__tickets:
+            if not multi_electron and polarization_component in (PolarizationComponent.LINEAR_HORIZONTAL,
+                                                                 PolarizationComponent.LINEAR_VERTICAL,
+                                                                 PolarizationComponent.TOTAL):
+                h, v, ex, ey = self.__get_fields()
+
+                if polarization_component == PolarizationComponent.LINEAR_HORIZONTAL: intensity = self.__square_modulus(ex)
+                elif polarization_component == PolarizationComponent.LINEAR_VERTICAL: intensity = self.__square_modulus(ey)
+                else: intensity = self.__square_modulus(ex) + self.__square_modulus(ey)
+
+                self.__tickets[key] = SRWPlot.get_ticket_2D(h*1000, v*1000, intensity)
+            else:
+                e, h, v, i = self.__srw_wavefront.get_intensity(multi_electron=multi_electron,
+                                                                polarization_component_to_be_extracted=polarization_component)
+
+                self.__tickets[key] = SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)])
+
+        return self.__tickets[key]
+
+    def get_intensity_estimate_ticket(self, sigma_h, sigma_v, energy_spread=0.0, polarization_component=PolarizationComponent.TOTAL):
+        key = ("intensity_estimate", sigma_h, sigma_v, energy_spread, polarization_component)
+
+        if not key in self.__tickets:
+            h, v, intensity = get_intensity_estimate(self.__srw_wavefront, sigma_h, sigma_v, energy_spread, polarization_component)
+
+            self.__tickets[key] = SRWPlot.get_ticket_2D(h*1000, v*1000, intensity)
+
+        return self.__tickets[key]
+
+    def get_phase_ticket(self, polarization_component=None):
+        key = ("phase", polarization_component)
+
+        if not key in self.__tickets:
+            if polarization_component in (PolarizationComponent.LINEAR_HORIZONTAL, PolarizationComponent.LINEAR_VERTICAL):
+                h, v, ex, ey = self.__get_fields()
+
+                field = ex if polarization_component == PolarizationComponent.LINEAR_HORIZONTAL else ey
+
+                self.__tickets[key] = SRWPlot.get_ticket_2D(h*1000, v*1000, numpy.arctan2(field.imag, field.real))
+            else:
+                # the phase of the total field is defined by SRW: delegated as it is
+                if polarization_component is None: e, h, v, i = self.__srw_wavefront.get_phase()
+                else: e, h, v, i = self.__srw_wavefront.get_phase(polarization_component_to_be_extracted=polarization_component)
+
+                self.__tickets[key] = SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)])
+
+        return self.__tickets[key]
+
+    @classmethod
+    def __square_modulus(cls, field):
+        return field.real**2 + field.imag**2
+
+    def __get_fields(self):
+        if self.__fields is None:
+            mesh = self.__srw_wavefront.mesh
+
+            h = numpy.linspace(mesh.xStart, mesh.xFin, mesh.nx)
+            v = numpy.linspace(mesh.yStart, mesh.yFin, mesh.ny)
+            energy_index = int(mesh.ne/2)
+
+            # SRW field layout: [y][x][energy][re, im]
+            def get_field(srw_array):
+                data = numpy.frombuffer(srw_array, dtype=numpy.dtype(srw_array.typecode)).reshape((mesh.ny, mesh.nx, mesh.ne, 2))
+                data = data[:, :, energy_index, :].astype(numpy.float64)
+
+                return (data[:, :, 0] + 1j*data[:, :, 1]).T
+
+            self.__fields = h, v, get_field(self.__srw_wavefront.arEx), get_field(self.__srw_wavefront.arEy)
+
+        return self.__fields
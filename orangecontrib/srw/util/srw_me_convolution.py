@@ -0,0 +1,72 @@
+'''
+Fast estimate of the multi-electron intensity at any plane of the beamline: the single electron intensity is
+convolved (FFT) with the distribution of the electron beam projected on the plane, and optionally with the
+spread of photon energies due to the electron energy spread.
+
+The estimate neglects the variation of the single electron wavefront with the electron position and angle,
+it is accurate when the coherent fraction is small or the plane is an image of the source.
+'''
+import numpy
+from scipy.signal import fftconvolve
+
+from wofrysrw.propagator.wavefront2D.srw_wavefront import PolarizationComponent
+
+def get_electron_beam_moments(electron_beam):
+    '''
+    :return: (<x²>, <xx'>, <x'²>), (<y²>, <yy'>, <y'²>) of the electron beam
+    '''
+    return electron_beam.get_moments_horizontal(dispersion=False), electron_beam.get_moments_vertical(dispersion=False)
+
+def get_projected_sigma(moments, a, b):
+    '''
+    rms size of the electron beam projected on a plane where the displacement of the radiation is a*x + b*x'
+    (drift of length L: a=1, b=L; image with magnification M: a=M, b=0)
+    '''
+    moment_xx, moment_xxp, moment_xpxp = moments
+
+    return numpy.sqrt(max(0.0, a**2*moment_xx + 2*a*b*moment_xxp + b**2*moment_xpxp))
+
+def get_gaussian_kernel(step, sigma, points):
+    # kernel on the mesh steps, +/- 4 sigma wide but not larger than the mesh
+    half_width = min(int(numpy.ceil(4*sigma/step)), points - 1)
+    coordinates = numpy.arange(-half_width, half_width + 1)*step
+
+    kernel = numpy.exp(-0.5*(coordinates/sigma)**2)
+
+    return kernel/kernel.sum()
+
+def convolve_with_gaussian(coordinates, intensity, sigma, axis):
+    '''
+    convolution along axis with a normalized gaussian, on the same (uniform) mesh: negligible sigmas are ignored
+    '''
+    if len(coordinates) < 2 or sigma <= 0.0: return intensity
+
+    step = abs(coordinates[1] - coordinates[0])
+
+    if step == 0.0 or sigma < 0.1*step: return intensity
+
+    shape = [1]*intensity.ndim
+    shape[axis] = -1
+
+    return fftconvolve(intensity, get_gaussian_kernel(step, sigma, len(coordinates)).reshape(shape), mode="same", axes=axis)
+
+def get_intensity_estimate(srw_wavefront, sigma_h, sigma_v, energy_spread=0.0, polarization_component=PolarizationComponent.TOTAL):
+    '''
+    :param sigma_h, sigma_v: rms sizes of the projected electron beam on the plane of the wavefront [m]
+    :param energy_spread: relative rms electron energy spread, effective if the wavefront has more than one photon energy
+    :return: h, v, estimated multi-electron intensity at the central photon energy
+    '''
+    e, h, v, intensity = srw_wavefront.get_intensity(multi_electron=False, polarization_component_to_be_extracted=polarization_component)
+
+    intensity = numpy.array(intensity, dtype=numpy.float64)
+
+    # photon energy ~ gamma²: relative rms spread of the photon energies twice the electron one
+    if energy_spread > 0.0 and e.size > 1: intensity = convolve_with_gaussian(e, intensity, 2*energy_spread*e[int(e.size/2)], axis=0)
+
+    intensity = intensity[int(e.size/2)]
+
+    intensity = convolve_with_gaussian(h, intensity, sigma_h, axis=0)
+    intensity = convolve_with_gaussian(v, intensity, sigma_v, axis=1)
+
+    # FFT round-off
+    return h, v, numpy.maximum(intensity, 0.0)
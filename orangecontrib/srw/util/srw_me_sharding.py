@@ -0,0 +1,106 @@
+'''
+Multi-electron calculations split in independent local processes (shards), without MPI: each shard propagates
+part of the macro-electrons with its own random seed and output file, the partial results (average intensity per
+macro-electron) are then merged, weighted by the number of macro-electrons of each shard.
+
+The electrons of the shards are sampled explicitly (srw_qmc_sampling.get_python_code), each shard with its own
+generator: srwl_wfr_emit_prop_multi_e reseeds its generator with the MPI rank, so that without MPI all the shards
+would propagate the same electrons.
+
+Each shard saves its intensity on the mesh of its first propagated electron: with the semi-analytical treatment of
+the quadratic phase SRW moves the propagated mesh for each electron, so the shards are interpolated on the mesh of the
+first one when they are merged.
+'''
+import os
+
+import numpy
+from scipy.interpolate import RegularGridInterpolator
+
+def get_shard_sizes(number_of_macro_electrons, number_of_shards):
+    '''
+    :return: number of macro-electrons of each shard, differing at most by 1 and summing to the total
+    '''
+    number_of_shards = max(1, min(number_of_shards, number_of_macro_electrons))
+
+    shard_size, remainder = divmod(number_of_macro_electrons, number_of_shards)
+
+    return [shard_size + (1 if index < remainder else 0) for index in range(number_of_shards)]
+
+def get_shard_file_name(file_name, index):
+    root, extension = os.path.splitext(file_name)
+
+    return root + "_shard_" + str(index) + extension
+
+def get_shard_seed(seed, index):
+    return (seed + 1000003*index) % (2**32)
+
+def read_ascii_file(file_name):
+    '''
+    :return: header lines (starting with #), values of the SRW ASCII file
+    '''
+    with open(file_name, "r") as file: header = [line for line in file if line.startswith("#")]
+
+    return header, numpy.loadtxt(file_name, comments="#", ndmin=2)
+
+def get_mesh(header):
+    '''
+    :return: mesh (e0, e1, ne, x0, x1, nx, y0, y1, ny) of the header of an SRW ASCII file
+    '''
+    values = [float(line.replace("#", "").split()[0]) for line in header[1:10]]
+
+    return tuple([int(value) if index in [2, 5, 8] else value for index, value in enumerate(values)])
+
+def get_mesh_coordinates(mesh):
+    '''
+    :return: vertical, horizontal coordinates of the mesh (axes of the intensity as saved by SRW, at a single photon energy)
+    '''
+    return numpy.linspace(mesh[6], mesh[7], mesh[8]), numpy.linspace(mesh[3], mesh[4], mesh[5])
+
+def is_same_mesh(coordinates, other_coordinates):
+    return all([axis.shape == other_axis.shape and numpy.allclose(axis, other_axis, rtol=1e-9, atol=0.0) for axis, other_axis in zip(coordinates, other_coordinates)])
+
+def resample_intensity(intensity, coordinates, result_coordinates):
+    '''
+    :param coordinates, result_coordinates: coordinates of each axis of the intensity and of the result
+    :return: intensity linearly interpolated on the result coordinates, 0 outside its mesh
+    '''
+    if is_same_mesh(coordinates, result_coordinates): return intensity
+
+    interpolator = RegularGridInterpolator(coordinates, intensity, bounds_error=False, fill_value=0.0)
+
+    return interpolator(tuple(numpy.meshgrid(*result_coordinates, indexing="ij")))
+
+def merge_shards(file_names, weights, output_file_name):
+    '''
+    Weighted average of the SRW ASCII files of the shards, written with the header of the first one: shards with a
+    different mesh are interpolated on the mesh of the first one
+
+    :param weights: number of macro-electrons of each shard
+    '''
+    if len(file_names) != len(weights): raise ValueError("Number of files and weights are different")
+
+    header, merged_values = read_ascii_file(file_names[0])
+    mesh = get_mesh(header)
+    merged_values = merged_values.flatten()*weights[0]
+
+    for file_name, weight in zip(file_names[1:], weights[1:]):
+        shard_header, values = read_ascii_file(file_name)
+        shard_mesh = get_mesh(shard_header)
+        values = values.flatten()
+
+        if shard_mesh != mesh:
+            # single intensity at a single photon energy: (ny, nx) values
+            if mesh[2] != 1 or shard_mesh[2] != 1 or merged_values.size != mesh[5]*mesh[8] or values.size != shard_mesh[5]*shard_mesh[8]:
+                raise ValueError("File " + file_name + " is not compatible with " + file_names[0] + " (different mesh, not a single intensity at a single photon energy)")
+
+            values = resample_intensity(values.reshape((shard_mesh[8], shard_mesh[5])), get_mesh_coordinates(shard_mesh), get_mesh_coordinates(mesh)).flatten()
+        elif values.shape != merged_values.shape:
+            raise ValueError("File " + file_name + " is not compatible with " + file_names[0] + " (different number of values)")
+
+        merged_values += values*weight
+
+    merged_values /= numpy.sum(weights)
+
+    with open(output_file_name, "w") as file:
+        file.writelines(header)
+        numpy.savetxt(file, merged_values, fmt="%.6e")
@@ -0,0 +1,116 @@
+import numpy
+
+# hc [eV m]
+EV_TO_M = 1.239841984e-06
+
+# SRW keeps input and output field (plus FFT buffers) alive during a propagation step
+PEAK_MEMORY_FACTOR = 2.5
+
+class SRWMeshStage(object):
+    '''
+    propagation parameters of a single step (drift before, optical element or drift after)
+    '''
+    def __init__(self,
+                 name="",
+                 distance=0.0,
+                 auto_resize=False,
+                 relative_precision=1.0,
+                 semianalytical_treatment=False,
+                 horizontal_range_factor=1.0,
+                 horizontal_resolution_factor=1.0,
+                 vertical_range_factor=1.0,
+                 vertical_resolution_factor=1.0):
+        self.name = name
+        self.distance = distance
+        self.auto_resize = auto_resize
+        self.relative_precision = relative_precision
+        self.semianalytical_treatment = semianalytical_treatment
+        self.horizontal_range_factor = horizontal_range_factor
+        self.horizontal_resolution_factor = horizontal_resolution_factor
+        self.vertical_range_factor = vertical_range_factor
+        self.vertical_resolution_factor = vertical_resolution_factor
+
+class SRWMeshEstimate(object):
+    def __init__(self, name, nx, ny, ne, x_range, y_range, quadratic_phase_limited=False):
+        self.name = name
+        self.nx = nx
+        self.ny = ny
+        self.ne = ne
+        self.x_range = x_range
+        self.y_range = y_range
+        self.quadratic_phase_limited = quadratic_phase_limited # the number of points is set by the sampling of the quadratic phase term
+        self.memory = get_wavefront_memory(nx, ny, ne)
+
+    def __str__(self):
+        return "{0}: {1} x {2} points, {3:.3g} GB{4}".format(self.name, self.nx, self.ny, self.memory, " (set by the quadratic phase term)" if self.quadratic_phase_limited else "")
+
+def get_wavefront_memory(nx, ny, ne, bytes_per_float=4):
+    '''
+    Memory of the electric field of a SRW wavefront [GB]: Ex and Ey, complex
+    '''
+    return 2*2*float(nx)*ny*ne*bytes_per_float/1024**3
+
+def _propagate_axis(n, x_range, radius, wavelength, distance, auto_resize, relative_precision, semianalytical_treatment, range_factor, resolution_factor):
+    n_out = n*range_factor*resolution_factor
+    x_range_out = x_range*range_factor
+
+    if distance != 0.0:
+        if radius != 0.0: x_range_out *= max(1.0, abs((radius + distance)/radius))
+        radius = radius + distance
+
+    quadratic_phase_limited = False
+
+    if auto_resize:
+        if semianalytical_treatment or radius == 0.0:
+            n_out *= max(1.0, relative_precision)
+        else:
+            # sampling of the quadratic phase term exp(i pi x^2/(lambda R)) over the whole range
+            n_phase = relative_precision*x_range_out**2/(wavelength*abs(radius))
+
+            quadratic_phase_limited = n_phase > n_out
+            n_out = max(n_out, n_phase)
+
+    return int(numpy.ceil(n_out)), x_range_out, radius, quadratic_phase_limited
+
+def estimate_propagation_mesh(nx, ny, ne, photon_energy, x_range, y_range, Rx, Ry, stages):
+    '''
+    Fast analytic estimate of the mesh after each propagation step, from the incoming mesh and radii:
+    range/resolution factors are applied exactly, auto-resizing is approximated with the sampling
+    needed by the quadratic phase term (when not treated semi-analytically).
+
+    :return: list of SRWMeshEstimate, the first is the incoming wavefront
+    '''
+    wavelength = EV_TO_M/photon_energy if photon_energy > 0 else 1e-10
+
+    estimates = [SRWMeshEstimate("Input", nx, ny, ne, x_range, y_range)]
+
+    for stage in stages:
+        nx, x_range, Rx, x_limited = _propagate_axis(nx, x_range, Rx, wavelength, stage.distance, stage.auto_resize, stage.relative_precision,
+                                          stage.semianalytical_treatment, stage.horizontal_range_factor, stage.horizontal_resolution_factor)
+        ny, y_range, Ry, y_limited = _propagate_axis(ny, y_range, Ry, wavelength, stage.distance, stage.auto_resize, stage.relative_precision,
+                                          stage.semianalytical_treatment, stage.vertical_range_factor, stage.vertical_resolution_factor)
+
+        estimates.append(SRWMeshEstimate(stage.name, nx, ny, ne, x_range, y_range, x_limited or y_limited))
+
+    return estimates
+
+def get_peak_memory(estimates):
+    return PEAK_MEMORY_FACTOR*max([estimate.memory for estimate in estimates])
+
+def is_quadratic_phase_limited(estimates):
+    '''
+    :return: True if the largest mesh is set by the sampling of the quadratic phase term: it does not depend on the
+             resolution modification factors
+    '''
+    return max(estimates, key=lambda estimate: estimate.memory).quadratic_phase_limited
+
+def get_reduction_factor(estimates, memory_budget):
+    '''
+    factor to be applied to the resolution modification factors (both directions) to fit the budget, None if the
+    largest mesh is set by the quadratic phase term (no reduction of the resolution factors can fit the budget)
+    '''
+    peak_memory = get_peak_memory(estimates)
+
+    if peak_memory <= memory_budget: return 1.0
+    elif is_quadratic_phase_limited(estimates): return None
+    else: return numpy.sqrt(memory_budget/peak_memory)
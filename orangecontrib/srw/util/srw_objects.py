@@ -8,6 +8,9 @@ class SRWData(object):
 
         self.__srw_beamline = srw_beamline
         self.__srw_wavefront = srw_wavefront
+        self.__propagation_profile = None
+        self.__propagation_step = None
+        self.__coherent_modes = None
 
     def get_srw_beamline(self):
         return self.__srw_beamline
@@ -25,6 +28,24 @@ class SRWData(object):
     def set_working_srw_beamline(self, working_srw_beamline):
         self.__working_srw_beamline = working_srw_beamline
 
+    def get_propagation_profile(self):
+        return self.__propagation_profile
+
+    def set_propagation_profile(self, propagation_profile):
+        self.__propagation_profile = propagation_profile
+
+    def get_propagation_step(self):
+        return self.__propagation_step
+
+    def set_propagation_step(self, propagation_step):
+        self.__propagation_step = propagation_step
+
+    def get_coherent_modes(self):
+        return self.__coherent_modes
+
+    def set_coherent_modes(self, coherent_modes):
+        self.__coherent_modes = coherent_modes
+
 class SRWErrorProfileData:
        NONE = "None"
 
@@ -57,7 +78,8 @@ class SRWReflectivityData:
                  energy_scale_type=ScaleType.LINEAR,
                  angle_start=0.0,
                  angle_end=0.0,
-                 angle_scale_type=ScaleType.LINEAR):
+                 angle_scale_type=ScaleType.LINEAR,
+                 reflectivity_table=None):
 
         self.reflectivity_data_file = reflectivity_data_file
         self.energies_number   = energies_number
@@ -69,6 +91,7 @@ class SRWReflectivityData:
         self.angle_start       = angle_start
         self.angle_end         = angle_end
         self.angle_scale_type  = angle_scale_type
+        self.reflectivity_table = reflectivity_table # content of the file, in memory (flat numpy array)
 
 class SRWPreProcessorData:
 
@@ -0,0 +1,271 @@
+import os, array
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+from orangecontrib.srw.util import srw_trajectory_cache
+
+def get_number_of_processes(number_of_tasks, max_processes=None):
+    if max_processes is None or max_processes <= 0: max_processes = os.cpu_count() or 1
+
+    return max(1, min(number_of_tasks, max_processes))
+
+__process_pool = None
+__process_pool_size = 0
+
+def get_process_pool(number_of_processes):
+    '''
+    :return: the pool of local processes, kept alive between calls so that the per-process caches (trajectories,
+             propagators) are reused: it is recreated only if more processes are needed or if it is broken
+    '''
+    global __process_pool, __process_pool_size
+
+    if __process_pool is None or __process_pool_size < number_of_processes or getattr(__process_pool, "_broken", False):
+        shutdown_process_pool()
+
+        # spawn: forking the GUI process (Qt) is not safe
+        __process_pool = ProcessPoolExecutor(max_workers=number_of_processes, mp_context=multiprocessing.get_context("spawn"))
+        __process_pool_size = number_of_processes
+
+    return __process_pool
+
+def shutdown_process_pool():
+    global __process_pool, __process_pool_size
+
+    if not __process_pool is None: __process_pool.shutdown(wait=False)
+
+    __process_pool = None
+    __process_pool_size = 0
+
+def run_tasks_in_parallel(tasks, max_processes=None):
+    '''
+    Runs the tasks, list of (function, arguments), in a pool of local processes, returning the results
+    in the same order. Everything must be picklable. With one process the tasks run in this process.
+    '''
+    if len(tasks) == 1 or max_processes == 1: return [function(*arguments) for function, arguments in tasks]
+
+    pool = get_process_pool(get_number_of_processes(len(tasks), max_processes))
+
+    futures = [pool.submit(function, *arguments) for function, arguments in tasks]
+
+    try:
+        return [future.result() for future in futures]
+    except BaseException:
+        for future in futures: future.cancel()
+
+        raise
+
+def run_in_parallel(function, arguments_list, max_processes=None):
+    return run_tasks_in_parallel([(function, arguments) for arguments in arguments_list], max_processes)
+
+def split_range(start, end, points, number_of_chunks):
+    '''
+    Splits the grid numpy.linspace(start, end, points) in contiguous chunks
+
+    :return: list of (start, end, points) of each chunk, the union being the original grid
+    '''
+    grid = numpy.linspace(start, end, points)
+
+    return [(chunk[0], chunk[-1], len(chunk)) for chunk in numpy.array_split(grid, min(number_of_chunks, points)) if len(chunk) > 0]
+
+def split_integer_range(first, last, number_of_chunks):
+    '''
+    :return: list of (first, last) of contiguous chunks of the integers first..last (included)
+    '''
+    values = numpy.arange(first, last + 1)
+
+    return [(int(chunk[0]), int(chunk[-1])) for chunk in numpy.array_split(values, min(number_of_chunks, len(values))) if len(chunk) > 0]
+
+#########################################################################################
+#
+# WAVEFRONT CALCULATION IN PHOTON ENERGY CHUNKS
+#
+#########################################################################################
+
+def _get_SRW_Wavefront(srw_source, wavefront_parameters, use_trajectory_cache=False):
+    # the trajectory is cached in each process
+    return srw_trajectory_cache.get_SRW_Wavefront(srw_source, wavefront_parameters, use_trajectory_cache)
+
+def calculate_wavefront_in_energy_chunks(srw_source, get_wavefront_parameters, photon_energy_min, photon_energy_max, photon_energy_points, number_of_chunks, use_trajectory_cache=False):
+    '''
+    Calculates the wavefront of the source over the photon energy grid, one chunk of energies per process.
+
+    :param get_wavefront_parameters: function (photon_energy_min, photon_energy_max, photon_energy_points) -> WavefrontParameters
+    :return: the merged wavefront, as calculated serially
+    '''
+    chunks = split_range(photon_energy_min, photon_energy_max, photon_energy_points, number_of_chunks)
+
+    if len(chunks) <= 1:
+        return _get_SRW_Wavefront(srw_source, get_wavefront_parameters(photon_energy_min, photon_energy_max, photon_energy_points), use_trajectory_cache)
+
+    wavefronts = run_in_parallel(_get_SRW_Wavefront, [(srw_source, get_wavefront_parameters(*chunk), use_trajectory_cache) for chunk in chunks], max_processes=number_of_chunks)
+
+    try:
+        return merge_wavefronts_in_energy(wavefronts)
+    except ValueError as error: # automatic adjustment of the mesh gave different meshes
+        print("Energy chunks not mergeable (" + str(error) + "): serial calculation")
+
+        return _get_SRW_Wavefront(srw_source, get_wavefront_parameters(photon_energy_min, photon_energy_max, photon_energy_points), use_trajectory_cache)
+
+def _to_numpy(srw_array):
+    return numpy.frombuffer(srw_array, dtype=numpy.dtype(srw_array.typecode))
+
+def merge_wavefronts_in_energy(wavefronts):
+    '''
+    Merges wavefronts with the same transverse mesh and contiguous photon energy ranges: the first wavefront
+    is modified and returned.
+    '''
+    merged_wavefront = wavefronts[0]
+    mesh = merged_wavefront.mesh
+
+    for wavefront in wavefronts[1:]:
+        if wavefront.mesh.nx != mesh.nx or wavefront.mesh.ny != mesh.ny or \
+                not numpy.allclose([wavefront.mesh.xStart, wavefront.mesh.xFin, wavefront.mesh.yStart, wavefront.mesh.yFin],
+                                   [mesh.xStart, mesh.xFin, mesh.yStart, mesh.yFin]):
+            raise ValueError("transverse meshes are different")
+
+    # SRW field layout: [y][x][energy][re, im]
+    for name in ["arEx", "arEy"]:
+        typecode = getattr(merged_wavefront, name).typecode
+        fields = [_to_numpy(getattr(wavefront, name)).reshape((mesh.ny, mesh.nx, wavefront.mesh.ne, 2)) for wavefront in wavefronts]
+
+        setattr(merged_wavefront, name, array.array(typecode, numpy.concatenate(fields, axis=2).tobytes()))
+
+    # statistical moments: 11 values per photon energy
+    for name in ["arMomX", "arMomY"]:
+        if hasattr(merged_wavefront, name) and all([len(getattr(wavefront, name)) == 11*wavefront.mesh.ne for wavefront in wavefronts]):
+            typecode = getattr(merged_wavefront, name).typecode
+
+            setattr(merged_wavefront, name, array.array(typecode, numpy.concatenate([_to_numpy(getattr(wavefront, name)) for wavefront in wavefronts]).tobytes()))
+
+    mesh.ne = sum([wavefront.mesh.ne for wavefront in wavefronts])
+    mesh.eFin = wavefronts[-1].mesh.eFin
+
+    return merged_wavefront
+
+#########################################################################################
+#
+# SPECTRA
+#
+#########################################################################################
+
+def get_flux(srw_source, wavefront_parameters, multi_electron, polarization_component_to_be_extracted, use_trajectory_cache=False):
+    return _get_SRW_Wavefront(srw_source, wavefront_parameters, use_trajectory_cache).get_flux(multi_electron=multi_electron,
+                                                                         polarization_component_to_be_extracted=polarization_component_to_be_extracted)
+
+def get_undulator_flux(srw_source, wavefront_parameters, flux_precision_parameters):
+    return srw_source.get_undulator_flux(source_wavefront_parameters=wavefront_parameters,
+                                         flux_precision_parameters=flux_precision_parameters)
+
+#########################################################################################
+#
+# POWER DENSITY IN STRIPS
+#
+#########################################################################################
+
+def _get_power_density(srw_source, wavefront_parameters, power_density_precision_parameters, use_trajectory_cache=False):
+    return srw_trajectory_cache.get_power_density(srw_source, wavefront_parameters, power_density_precision_parameters, use_trajectory_cache)
+
+def calculate_power_density_in_strips(srw_source, get_wavefront_parameters, power_density_precision_parameters, v_slit_gap, v_slit_points, number_of_strips, use_trajectory_cache=False):
+    '''
+    Power density is calculated pointwise: the observation mesh is split in horizontal strips (contiguous ranges of
+    vertical points), calculated in parallel processes and stitched together.
+
+    :param get_wavefront_parameters: function (v_position, v_slit_gap, v_slit_points) -> WavefrontParameters
+    :return: h, v, power density, as calculated serially
+    '''
+    strips = split_range(-0.5*v_slit_gap, 0.5*v_slit_gap, v_slit_points, min(number_of_strips, v_slit_points//2)) # at least 2 points per strip
+
+    if len(strips) <= 1:
+        return _get_power_density(srw_source, get_wavefront_parameters(0.0, v_slit_gap, v_slit_points), power_density_precision_parameters, use_trajectory_cache)
+
+    results = run_in_parallel(_get_power_density,
+                              [(srw_source, get_wavefront_parameters(0.5*(v_start + v_end), v_end - v_start, points), power_density_precision_parameters, use_trajectory_cache)
+                               for v_start, v_end, points in strips],
+                              max_processes=number_of_strips)
+
+    h = results[0][0]
+    v = numpy.concatenate([result[1] for result in results])
+
+    # the stitched mesh must be the one of the whole observation plane, whatever the length unit of the output
+    v_expected = numpy.linspace(-0.5*v_slit_gap, 0.5*v_slit_gap, v_slit_points)
+    if not (numpy.allclose(v, v_expected, rtol=1e-6, atol=1e-12) or numpy.allclose(v, v_expected*1e3, rtol=1e-6, atol=1e-9)):
+        print("Power density strips not mergeable: serial calculation")
+
+        return _get_power_density(srw_source, get_wavefront_parameters(0.0, v_slit_gap, v_slit_points), power_density_precision_parameters, use_trajectory_cache)
+
+    # power density is [h, v] (SRWLightSource.get_power_density): the strips are stacked along v
+    return h, v, numpy.concatenate([result[2] for result in results], axis=1)
+
+#########################################################################################
+#
+# ENERGY INTEGRATED INTENSITY (STREAMING)
+#
+#########################################################################################
+
+def _get_energy_integrated_intensity(srw_source, wavefront_parameters, use_trajectory_cache=False):
+    _, h, v, intensity = _get_SRW_Wavefront(srw_source, wavefront_parameters, use_trajectory_cache).get_intensity(multi_electron=True)
+
+    return h, v, intensity.sum(axis=0)
+
+def calculate_energy_integrated_intensity(srw_source, get_wavefront_parameters, photon_energy_min, photon_energy_max, photon_energy_points, chunk_points, number_of_processes, use_trajectory_cache=False):
+    '''
+    Sum over the photon energy grid of the multi-electron intensity, calculated in chunks of at most chunk_points
+    energies: each process holds one chunk at a time and only the partial sums are returned.
+
+    :param get_wavefront_parameters: function (photon_energy_min, photon_energy_max, photon_energy_points) -> WavefrontParameters
+    :return: h, v, integrated intensity
+    '''
+    chunks = split_range(photon_energy_min, photon_energy_max, photon_energy_points, int(numpy.ceil(photon_energy_points/max(1, chunk_points))))
+
+    results = run_in_parallel(_get_energy_integrated_intensity,
+                              [(srw_source, get_wavefront_parameters(*chunk), use_trajectory_cache) for chunk in chunks],
+                              max_processes=number_of_processes)
+
+    h, v, integrated_intensity = results[0]
+
+    for h_chunk, v_chunk, intensity in results[1:]:
+        if h_chunk.shape != h.shape or v_chunk.shape != v.shape or not (numpy.allclose(h_chunk, h) and numpy.allclose(v_chunk, v)):
+            raise ValueError("Energy chunks calculated on different meshes: set the sampling factor for adjusting nx/ny to 0")
+
+        integrated_intensity = integrated_intensity + intensity
+
+    return h, v, integrated_intensity
+
+#########################################################################################
+#
+# WAVEFRONTS OF SEVERAL SOURCES AND THEIR PROPAGATION
+#
+#########################################################################################
+
+def calculate_wavefronts(srw_sources, wavefront_parameters, number_of_processes):
+    return run_in_parallel(_get_SRW_Wavefront, [(srw_source, wavefront_parameters) for srw_source in srw_sources], max_processes=number_of_processes)
+
+def _initialize_propagator():
+    # the GUI is not imported by the worker processes: same initialization of the propagators
+    from wofry.propagator.propagator import PropagationManager, WavefrontDimension
+    from wofrysrw.propagator.propagators2D.srw_fresnel_native import FresnelSRWNative, SRW_APPLICATION
+    from wofrysrw.propagator.propagators2D.srw_fresnel_wofry import FresnelSRWWofry
+    from wofrysrw.propagator.propagators2D.srw_propagation_mode import SRWPropagationMode
+
+    propagation_manager = PropagationManager.Instance()
+
+    if not propagation_manager.is_initialized(SRW_APPLICATION):
+        if not propagation_manager.has_propagator(FresnelSRWNative.HANDLER_NAME, WavefrontDimension.TWO): propagation_manager.add_propagator(FresnelSRWNative())
+        if not propagation_manager.has_propagator(FresnelSRWWofry.HANDLER_NAME, WavefrontDimension.TWO): propagation_manager.add_propagator(FresnelSRWWofry())
+
+        propagation_manager.set_propagation_mode(SRW_APPLICATION, SRWPropagationMode.STEP_BY_STEP)
+
+        propagation_manager.set_initialized(True)
+
+    return propagation_manager
+
+def _propagate_wavefront(propagation_parameters, handler_name):
+    return _initialize_propagator().do_propagation(propagation_parameters=propagation_parameters, handler_name=handler_name)
+
+def propagate_wavefronts(propagation_parameters_list, handler_name, number_of_processes):
+    '''
+    Propagates independent wavefronts (step by step), one per process.
+    '''
+    return run_in_parallel(_propagate_wavefront, [(propagation_parameters, handler_name) for propagation_parameters in propagation_parameters_list], max_processes=number_of_processes)
@@ -0,0 +1,136 @@
+'''
+Fast analytic (numpy) estimates of the radiation of undulators and bending magnets, from the formulas of
+the X-ray Data Booklet (K.J. Kim, sections 2.1/2.2): approximate, to be used as a preview of the SRW calculation.
+'''
+import numpy
+import scipy.constants as codata
+from scipy.special import jv, kv
+
+m2ev = codata.c * codata.h / codata.e
+
+def get_gamma(electron_energy_in_GeV):
+    return 1e9*electron_energy_in_GeV / (codata.m_e *  codata.c**2 / codata.e)
+
+def get_electron_beam_sigmas_from_twiss(emittance, beta, alpha, eta, etap, energy_spread):
+    '''
+    :return: rms size and divergence
+    '''
+    gamma = (1 + alpha**2)/beta if beta > 0 else 0.0
+
+    return numpy.sqrt(emittance*beta + (eta*energy_spread)**2), numpy.sqrt(emittance*gamma + (etap*energy_spread)**2)
+
+#########################################################################################
+#
+# UNDULATOR
+#
+#########################################################################################
+
+def get_undulator_resonance_energy(electron_energy_in_GeV, K, period_length, harmonic=1):
+    return harmonic*2*get_gamma(electron_energy_in_GeV)**2*m2ev/(period_length*(1 + 0.5*K**2))
+
+def get_undulator_F(K, harmonic):
+    '''
+    on axis function F_n(K) of a planar undulator (0 for even harmonics)
+    '''
+    harmonic = numpy.asarray(harmonic)
+    Y = harmonic*K**2/(4*(1 + 0.5*K**2))
+
+    return (harmonic*K/(1 + 0.5*K**2))**2*(jv((harmonic - 1)/2, Y) - jv((harmonic + 1)/2, Y))**2*(harmonic % 2)
+
+def get_undulator_on_axis_flux_density(electron_energy_in_GeV, current, K, number_of_periods, harmonic):
+    '''
+    peak on axis angular flux density [ph/s/mrad²/0.1%bw] (zero emittance)
+    '''
+    return 1.744e14*number_of_periods**2*electron_energy_in_GeV**2*current*get_undulator_F(K, harmonic)
+
+def get_undulator_central_cone_flux(current, K, number_of_periods, harmonic):
+    '''
+    flux in the central cone [ph/s/0.1%bw]
+    '''
+    harmonic = numpy.asarray(harmonic)
+
+    return 1.431e14*number_of_periods*current*(1 + 0.5*K**2)*get_undulator_F(K, harmonic)/harmonic
+
+def get_undulator_photon_beam_sizes(photon_energy, period_length, number_of_periods, sigma_x, sigma_xp, sigma_y, sigma_yp):
+    '''
+    rms size and divergence of the central cone, convoluted with the electron beam
+
+    :return: Sx, Sx', Sy, Sy' [m, rad]
+    '''
+    wavelength = m2ev/photon_energy
+    length = period_length*number_of_periods
+
+    sigma_r = numpy.sqrt(2*wavelength*length)/(4*numpy.pi)
+    sigma_rp = numpy.sqrt(wavelength/(2*length))
+
+    return numpy.sqrt(sigma_x**2 + sigma_r**2), numpy.sqrt(sigma_xp**2 + sigma_rp**2), \
+           numpy.sqrt(sigma_y**2 + sigma_r**2), numpy.sqrt(sigma_yp**2 + sigma_rp**2)
+
+def get_undulator_on_axis_spectrum(electron_energy_in_GeV, current, K, period_length, number_of_periods, max_harmonic, points_per_line=20):
+    '''
+    on axis spectrum (zero emittance, no energy spread): sum of the lines of the harmonics, each with the
+    sinc² shape of a finite number of periods
+
+    :return: photon energy [eV], angular flux density [ph/s/mrad²/0.1%bw]
+    '''
+    first_harmonic_energy = get_undulator_resonance_energy(electron_energy_in_GeV, K, period_length)
+
+    harmonics = numpy.arange(1, max_harmonic + 1)[:, numpy.newaxis]
+    harmonic_energies = harmonics*first_harmonic_energy
+
+    # the line width is ~E1/N: sampled with points_per_line points
+    points = min(int(points_per_line*number_of_periods*(max_harmonic + 1)), 200000)
+    energy = numpy.linspace(0.5*first_harmonic_energy, (max_harmonic + 0.5)*first_harmonic_energy, points)
+
+    line_shapes = numpy.sinc(number_of_periods*harmonics*(energy[numpy.newaxis, :] - harmonic_energies)/harmonic_energies)**2
+
+    return energy, numpy.sum(get_undulator_on_axis_flux_density(electron_energy_in_GeV, current, K, number_of_periods, harmonics)*line_shapes, axis=0)
+
+#########################################################################################
+#
+# BENDING MAGNET
+#
+#########################################################################################
+
+_T = numpy.logspace(-8, numpy.log10(60.0), 4000)
+_K53 = kv(5.0/3.0, _T)
+_K53_INTEGRAL = numpy.concatenate([numpy.cumsum((0.5*(_K53[1:] + _K53[:-1])*numpy.diff(_T))[::-1])[::-1], [0.0]])
+
+def get_G1(y):
+    '''
+    universal function y*integral_y^inf K_5/3
+    '''
+    y = numpy.asarray(y, dtype=float)
+
+    return y*numpy.interp(y, _T, _K53_INTEGRAL, right=0.0)
+
+def get_H2(y):
+    '''
+    universal function y² K_2/3(y/2)²
+    '''
+    y = numpy.asarray(y, dtype=float)
+
+    return y**2*kv(2.0/3.0, 0.5*y)**2
+
+def get_critical_energy(electron_energy_in_GeV, magnetic_field):
+    return 665.0*electron_energy_in_GeV**2*magnetic_field # eV
+
+def get_bending_magnet_spectrum(electron_energy_in_GeV, current, magnetic_field, photon_energy):
+    '''
+    :return: flux integrated vertically [ph/s/mrad/0.1%bw], on axis angular flux density [ph/s/mrad²/0.1%bw]
+    '''
+    y = photon_energy/get_critical_energy(electron_energy_in_GeV, magnetic_field)
+
+    return 2.457e13*electron_energy_in_GeV*current*get_G1(y), 1.327e13*electron_energy_in_GeV**2*current*get_H2(y)
+
+def get_bending_magnet_power_density(electron_energy_in_GeV, current, magnetic_field, distance, vertical_position):
+    '''
+    power density vs vertical position [W/mm²] at distance [m], integrated over the photon energies
+
+    :return: power density, linear power density [W/mrad]
+    '''
+    X = get_gamma(electron_energy_in_GeV)*numpy.asarray(vertical_position)/distance
+
+    angular_power_density = 5.42*electron_energy_in_GeV**4*magnetic_field*current*(1 + X**2)**-2.5*(1 + 5*X**2/(7*(1 + X**2))) # W/mrad²
+
+    return angular_power_density/distance**2, 4.22*electron_energy_in_GeV**3*magnetic_field*current
@@ -0,0 +1,135 @@
+import time, sys, json, csv
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+class SRWProfileRecord(object):
+    FIELDS = ["element_name",
+              "widget_name",
+              "propagation_mode",
+              "wall_time",
+              "propagation_time",
+              "nx_before",
+              "ny_before",
+              "nx_after",
+              "ny_after",
+              "ne",
+              "wavefront_memory_before",
+              "wavefront_memory_after",
+              "peak_resident_memory"]
+
+    def __init__(self, element_name="", widget_name="", propagation_mode=""):
+        self.element_name = element_name
+        self.widget_name = widget_name
+        self.propagation_mode = propagation_mode
+        self.wall_time = 0.0
+        self.propagation_time = 0.0 # inside the propagator (SRW), without the preparation of the element
+        self.nx_before = 0
+        self.ny_before = 0
+        self.nx_after = 0
+        self.ny_after = 0
+        self.ne = 0
+        self.wavefront_memory_before = 0.0 # MB
+        self.wavefront_memory_after = 0.0  # MB
+        self.peak_resident_memory = None   # MB, high-water mark of the process at the end of the element
+
+    def set_mesh_before(self, srw_wavefront):
+        self.nx_before, self.ny_before, self.ne, self.wavefront_memory_before = get_mesh_info(srw_wavefront)
+
+    def set_mesh_after(self, srw_wavefront):
+        self.nx_after, self.ny_after, self.ne, self.wavefront_memory_after = get_mesh_info(srw_wavefront)
+
+    def to_dictionary(self):
+        return {field: getattr(self, field) for field in SRWProfileRecord.FIELDS}
+
+class SRWPropagationProfile(object):
+    def __init__(self, records=None):
+        self.__records = [] if records is None else records
+
+    def get_records(self):
+        return self.__records
+
+    def add_record(self, record):
+        self.__records.append(record)
+
+    def duplicate(self):
+        return SRWPropagationProfile(records=list(self.__records))
+
+    def get_total_wall_time(self):
+        return sum([record.wall_time for record in self.__records])
+
+    def save_as_json(self, file_name):
+        with open(file_name, "w") as file:
+            json.dump([record.to_dictionary() for record in self.__records], file, indent=2)
+
+    def save_as_csv(self, file_name):
+        with open(file_name, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=SRWProfileRecord.FIELDS)
+            writer.writeheader()
+            for record in self.__records: writer.writerow(record.to_dictionary())
+
+def get_mesh_info(srw_wavefront):
+    if srw_wavefront is None: return 0, 0, 0, 0.0
+
+    mesh = srw_wavefront.mesh
+
+    # Ex and Ey, complex as 2 floats
+    memory = 2*mesh.nx*mesh.ny*mesh.ne*2*srw_wavefront.arEx.itemsize/1024**2 if hasattr(srw_wavefront.arEx, "itemsize") else 0.0
+
+    return mesh.nx, mesh.ny, mesh.ne, memory
+
+def get_peak_resident_memory():
+    if resource is None: return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return peak/1024**2 if sys.platform == "darwin" else peak/1024 # bytes on macOS, kB on Linux
+
+@contextmanager
+def profile_propagation(record):
+    '''
+    measures the wall time of the block and the peak resident memory at its end
+    '''
+    t0 = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.wall_time = time.perf_counter() - t0
+        record.peak_resident_memory = get_peak_resident_memory()
+
+@contextmanager
+def time_propagation(record):
+    '''
+    adds the wall time of the block to the propagation time of the record
+    '''
+    t0 = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.propagation_time += time.perf_counter() - t0
+
+class SRWProfiledPropagator(object):
+    '''
+    Wraps the propagation manager: each propagation is timed and the mesh is recorded around it, i.e. before the
+    first resizing done by SRW (the wavefront handed to the propagator) and after the last one (the wavefront
+    returned), without altering SRW.
+    '''
+    def __init__(self, propagator, record):
+        self.__propagator = propagator
+        self.__record = record
+        self.__first_propagation = True
+
+    def do_propagation(self, propagation_parameters, handler_name):
+        if self.__first_propagation:
+            self.__record.set_mesh_before(propagation_parameters.get_wavefront())
+            self.__first_propagation = False
+
+        with time_propagation(self.__record):
+            wavefront = self.__propagator.do_propagation(propagation_parameters=propagation_parameters, handler_name=handler_name)
+
+        self.__record.set_mesh_after(wavefront)
+
+        return wavefront
@@ -0,0 +1,228 @@
+'''
+Low-discrepancy (quasi-Monte Carlo) sampling of the electron beam phase space (x, x', y, y', energy) for
+multi-electron calculations: scrambled Sobol or Halton points are mapped to gaussian coordinates through the inverse
+normal CDF and the second order moments of the beam. The error of QMC integration of smooth quantities decreases
+almost like 1/N, instead of 1/sqrt(N) of pseudo-random sampling.
+'''
+import hashlib
+import numpy
+from scipy.stats import qmc, norm
+
+PSEUDO_RANDOM = 0
+SOBOL = 1
+HALTON = 2
+
+METHODS = ["Pseudo-random (SRW)", "Scrambled Sobol", "Scrambled Halton"]
+
+def get_standard_normal_samples(method, number_of_samples, dimension=5, seed=0):
+    if method == PSEUDO_RANDOM:
+        return numpy.random.default_rng(seed).standard_normal((number_of_samples, dimension))
+    elif method == SOBOL:
+        sampler = qmc.Sobol(d=dimension, scramble=True, seed=seed)
+    elif method == HALTON:
+        sampler = qmc.Halton(d=dimension, scramble=True, seed=seed)
+    else:
+        raise ValueError("Sampling method not recognized")
+
+    return norm.ppf(numpy.clip(sampler.random(number_of_samples), 1e-12, 1 - 1e-12))
+
+def get_phase_space_plane(z1, z2, moment_xx, moment_xxp, moment_xpxp):
+    '''
+    :return: x, x' with the given second order moments, from two independent standard normal variables
+    '''
+    if moment_xx <= 0.0: return numpy.zeros_like(z1), numpy.sqrt(max(0.0, moment_xpxp))*z2
+
+    sigma = numpy.sqrt(moment_xx)
+
+    return sigma*z1, (moment_xxp/sigma)*z1 + numpy.sqrt(max(0.0, moment_xpxp - moment_xxp**2/moment_xx))*z2
+
+def get_macro_electron_samples(method, number_of_samples, moments_x, moments_y, energy_spread, seed=0):
+    '''
+    :param moments_x, moments_y: (<x²>, <xx'>, <x'²>), (<y²>, <yy'>, <y'²>)
+    :return: array (number_of_samples, 5) of deviations from the centroid: x, x', y, y', relative energy
+    '''
+    z = get_standard_normal_samples(method, number_of_samples, 5, seed)
+
+    samples = numpy.zeros((number_of_samples, 5))
+    samples[:, 0], samples[:, 1] = get_phase_space_plane(z[:, 0], z[:, 1], *moments_x)
+    samples[:, 2], samples[:, 3] = get_phase_space_plane(z[:, 2], z[:, 3], *moments_y)
+    samples[:, 4] = energy_spread*z[:, 4]
+
+    return samples
+
+#########################################################################################
+#
+# BENCHMARK
+#
+#########################################################################################
+
+def benchmark_sampling(moments_x, moments_y, energy_spread, counts, repetitions=10, points=41, seed=0):
+    '''
+    Accuracy versus number of macro-electrons of the sampling methods, on a model of the multi-electron intensity with
+    analytic solution: each electron gives a gaussian spot, of width proportional to its energy, centred on its
+    position after a drift where size and divergence contribute equally.
+
+    :return: {method: relative rms error of the intensity for each count, averaged over the repetitions}
+    '''
+    def get_plane(moments):
+        moment_xx, moment_xxp, moment_xpxp = moments
+        distance = numpy.sqrt(moment_xx/moment_xpxp) if moment_xpxp > 0 else 0.0
+        projected_sigma = numpy.sqrt(max(moment_xx + 2*distance*moment_xxp + distance**2*moment_xpxp, 1e-30))
+
+        return distance, 0.5*projected_sigma, numpy.linspace(-4, 4, points)*numpy.sqrt(1.25)*projected_sigma
+
+    distance_x, width_x, coordinates_x = get_plane(moments_x)
+    distance_y, width_y, coordinates_y = get_plane(moments_y)
+
+    # exact: convolution of the spot with the projected beam, averaged over the (gaussian) spread of the width
+    exact_intensity = numpy.outer(*[_get_exact_profile(coordinates, width, moments, distance, energy_spread)
+                                    for coordinates, width, moments, distance in [(coordinates_x, width_x, moments_x, distance_x),
+                                                                                   (coordinates_y, width_y, moments_y, distance_y)]])
+    normalization = numpy.sqrt(numpy.mean(exact_intensity**2))
+
+    errors = {}
+    for method in [PSEUDO_RANDOM, SOBOL, HALTON]:
+        errors[method] = []
+
+        for count in counts:
+            error = 0.0
+            for repetition in range(repetitions):
+                samples = get_macro_electron_samples(method, count, moments_x, moments_y, energy_spread, seed=seed + repetition)
+                scale = 1 + samples[:, 4]
+
+                spot_x = _get_gaussian(coordinates_x[None, :] - (samples[:, 0] + distance_x*samples[:, 1])[:, None], (width_x*scale)[:, None])
+                spot_y = _get_gaussian(coordinates_y[None, :] - (samples[:, 2] + distance_y*samples[:, 3])[:, None], (width_y*scale)[:, None])
+
+                intensity = numpy.dot(spot_x.T, spot_y)/count
+
+                error += numpy.sqrt(numpy.mean((intensity - exact_intensity)**2))/normalization
+
+            errors[method].append(error/repetitions)
+
+    return errors
+
+def _get_gaussian(x, sigma):
+    return numpy.exp(-0.5*(x/sigma)**2)/(numpy.sqrt(2*numpy.pi)*sigma)
+
+def _get_exact_profile(coordinates, width, moments, distance, energy_spread, quadrature_points=41):
+    moment_xx, moment_xxp, moment_xpxp = moments
+    projected_variance = moment_xx + 2*distance*moment_xxp + distance**2*moment_xpxp
+
+    nodes, weights = numpy.polynomial.hermite_e.hermegauss(quadrature_points)
+    weights = weights/weights.sum()
+
+    return sum([weight*_get_gaussian(coordinates, numpy.sqrt(projected_variance + (width*(1 + energy_spread*node))**2)) for node, weight in zip(nodes, weights)])
+
+#########################################################################################
+#
+# SCRIPT
+#
+#########################################################################################
+
+def get_python_code(method, nMacroElec, nMacroElecSavePer, srCalcMeth, srCalcPrec, sampFactNxNyForProp, strIntPropME_OutFileName, seed=0, checkpoint=False, beamline_code=""):
+    '''
+    :param checkpoint: if True, the accumulated intensity, the number of processed macro-electrons and the state of the
+                       random generator are saved at each saving period, and a new run resumes from them
+    :param beamline_code: the script preceding this code (source and beamline): its hash is part of the signature of
+                          the checkpoint, so that a checkpoint of a different beamline is not resumed
+    :return: multi-electron propagation with explicit sampling of the electrons, to replace the call of
+             srwl_wfr_emit_prop_multi_e in the script generated by the beamline (uses part_beam,
+             magnetic_field_container, initial_mesh, optBL)
+    '''
+    text_code  = "\n\n####################################################\n# MULTI ELECTRON PROPAGATION (" + METHODS[method].replace(" (SRW)", "") + " sampling" + (", resumable" if checkpoint else "") + ")\n\n"
+    text_code += "import os, json, warnings\n"
+    text_code += "from copy import deepcopy\n"
+    text_code += "from array import array\n"
+    text_code += "from scipy.stats import qmc, norm\n"
+    text_code += "from scipy.interpolate import RegularGridInterpolator\n\n"
+    text_code += "nMacroElec = " + str(nMacroElec) + "\n"
+    text_code += "nMacroElecSavePer = " + str(nMacroElecSavePer) + "\n"
+    text_code += "strIntPropME_OutFileName = '" + str(strIntPropME_OutFileName) + "'\n"
+    text_code += "checkpoint_file_name = strIntPropME_OutFileName + '.checkpoint.npz'\n"
+    text_code += "use_checkpoint = " + str(checkpoint == True) + "\n"
+    text_code += "arPrecPar = [" + str(srCalcMeth) + ", " + str(srCalcPrec) + ", 0, 0, 50000, 1, " + str(sampFactNxNyForProp) + "]\n\n"
+    text_code += "if initial_mesh.ne != 1: raise ValueError('Explicit sampling of the electrons needs a single photon energy')\n\n"
+    text_code += "def get_phase_space_plane(z1, z2, moment_xx, moment_xxp, moment_xpxp):\n"
+    text_code += "    if moment_xx <= 0.0: return 0.0, numpy.sqrt(max(0.0, moment_xpxp))*z2\n"
+    text_code += "    sigma = numpy.sqrt(moment_xx)\n"
+    text_code += "    return sigma*z1, (moment_xxp/sigma)*z1 + numpy.sqrt(max(0.0, moment_xpxp - moment_xxp**2/moment_xx))*z2\n\n"
+    text_code += "def get_mesh_coordinates(mesh):\n"
+    text_code += "    return numpy.linspace(mesh.yStart, mesh.yFin, mesh.ny), numpy.linspace(mesh.xStart, mesh.xFin, mesh.nx)\n\n"
+    text_code += "def resample(intensity, mesh, result_mesh):\n"
+    text_code += "    if (mesh.nx, mesh.ny, mesh.xStart, mesh.xFin, mesh.yStart, mesh.yFin) == (result_mesh.nx, result_mesh.ny, result_mesh.xStart, result_mesh.xFin, result_mesh.yStart, result_mesh.yFin): return intensity\n"
+    text_code += "    interpolator = RegularGridInterpolator(get_mesh_coordinates(mesh), intensity, bounds_error=False, fill_value=0.0)\n"
+    text_code += "    return interpolator(tuple(numpy.meshgrid(*get_mesh_coordinates(result_mesh), indexing='ij')))\n\n"
+
+    if method == PSEUDO_RANDOM:
+        text_code += "rng = numpy.random.default_rng(" + str(seed) + ")\n\n"
+        text_code += "def get_next_z(): return rng.standard_normal(5)\n"
+        text_code += "def get_rng_state(processed): return json.dumps(rng.bit_generator.state)\n"
+        text_code += "def set_rng_state(rng_state, processed): rng.bit_generator.state = json.loads(rng_state)\n\n"
+    else:
+        text_code += "# points are drawn one by one: any prefix of the sequence is low-discrepancy, nMacroElec = 2^m is optimal for Sobol\n"
+        text_code += "warnings.filterwarnings('ignore', message='The balance properties of Sobol')\n"
+        text_code += "sampler = " + ("qmc.Sobol" if method == SOBOL else "qmc.Halton") + "(d=5, scramble=True, seed=" + str(seed) + ")\n\n"
+        text_code += "def get_next_z(): return norm.ppf(numpy.clip(sampler.random(1)[0], 1e-12, 1 - 1e-12))\n"
+        text_code += "def get_rng_state(processed): return json.dumps({'index': processed})\n"
+        text_code += "def set_rng_state(rng_state, processed): sampler.fast_forward(json.loads(rng_state)['index'])\n\n"
+
+    calculation_hash = hashlib.sha1((beamline_code + repr([srCalcMeth, srCalcPrec, sampFactNxNyForProp])).encode("utf-8")).hexdigest()
+
+    text_code += "# the checkpoint is valid for the same source, beamline, calculation parameters, sampling and initial mesh\n"
+    text_code += "signature = json.dumps(['" + calculation_hash + "', '" + METHODS[method] + "', " + str(seed) + ", nMacroElec, [initial_mesh.eStart, initial_mesh.eFin, initial_mesh.ne, initial_mesh.xStart, initial_mesh.xFin, initial_mesh.nx, initial_mesh.yStart, initial_mesh.yFin, initial_mesh.ny]])\n\n"
+    text_code += "def save_checkpoint(processed):\n"
+    text_code += "    temporary_file_name = checkpoint_file_name + '.tmp.npz'\n"
+    text_code += "    numpy.savez(temporary_file_name, signature=signature, processed=processed, intensity_sum=intensity_sum, rng_state=get_rng_state(processed),\n"
+    text_code += "                result_mesh=numpy.array([result_mesh.eStart, result_mesh.eFin, result_mesh.ne, result_mesh.xStart, result_mesh.xFin, result_mesh.nx, result_mesh.yStart, result_mesh.yFin, result_mesh.ny]))\n"
+    text_code += "    os.replace(temporary_file_name, checkpoint_file_name) # atomic: a valid checkpoint always exists\n\n"
+    text_code += "mom1 = deepcopy(part_beam.partStatMom1)\n"
+    text_code += "mom2 = part_beam.arStatMom2\n\n"
+    text_code += "elec_beam = deepcopy(part_beam)\n"
+    text_code += "intensity_sum = None\n"
+    text_code += "first = 0\n\n"
+    text_code += "if use_checkpoint and os.path.exists(checkpoint_file_name):\n"
+    text_code += "    checkpoint = numpy.load(checkpoint_file_name)\n"
+    text_code += "    if str(checkpoint['signature']) == signature:\n"
+    text_code += "        first = int(checkpoint['processed'])\n"
+    text_code += "        intensity_sum = numpy.array(checkpoint['intensity_sum'])\n"
+    text_code += "        result_mesh = deepcopy(initial_mesh)\n"
+    text_code += "        result_mesh.eStart, result_mesh.eFin, ne, result_mesh.xStart, result_mesh.xFin, nx, result_mesh.yStart, result_mesh.yFin, ny = checkpoint['result_mesh']\n"
+    text_code += "        result_mesh.ne, result_mesh.nx, result_mesh.ny = int(ne), int(nx), int(ny)\n"
+    text_code += "        set_rng_state(str(checkpoint['rng_state']), first)\n"
+    text_code += "        print('Resuming from checkpoint', checkpoint_file_name, ':', first, 'macro-electrons already processed')\n"
+    text_code += "    else:\n"
+    text_code += "        print('Checkpoint', checkpoint_file_name, 'belongs to a different calculation: starting from the beginning')\n\n"
+    text_code += "for i in range(first, nMacroElec):\n"
+    text_code += "    z = get_next_z()\n"
+    text_code += "    dx, dxp = get_phase_space_plane(z[0], z[1], mom2[0], mom2[1], mom2[2])\n"
+    text_code += "    dy, dyp = get_phase_space_plane(z[2], z[3], mom2[3], mom2[4], mom2[5])\n\n"
+    text_code += "    elec_beam.partStatMom1.x = mom1.x + dx\n"
+    text_code += "    elec_beam.partStatMom1.xp = mom1.xp + dxp\n"
+    text_code += "    elec_beam.partStatMom1.y = mom1.y + dy\n"
+    text_code += "    elec_beam.partStatMom1.yp = mom1.yp + dyp\n"
+    text_code += "    elec_beam.partStatMom1.gamma = mom1.gamma*(1 + numpy.sqrt(mom2[10])*z[4])\n\n"
+    text_code += "    wfr = SRWLWfr()\n"
+    text_code += "    wfr.allocate(initial_mesh.ne, initial_mesh.nx, initial_mesh.ny)\n"
+    text_code += "    wfr.mesh = deepcopy(initial_mesh)\n"
+    text_code += "    wfr.partBeam = elec_beam\n\n"
+    text_code += "    srwl.CalcElecFieldSR(wfr, 0, magnetic_field_container, arPrecPar)\n"
+    text_code += "    srwl.PropagElecField(wfr, optBL)\n\n"
+    text_code += "    arI = array('f', [0]*wfr.mesh.nx*wfr.mesh.ny)\n"
+    text_code += "    srwl.CalcIntFromElecField(arI, wfr, 6, 0, 3, wfr.mesh.eStart, 0, 0)\n"
+    text_code += "    intensity = numpy.array(arI, dtype=numpy.float64).reshape((wfr.mesh.ny, wfr.mesh.nx))\n\n"
+    text_code += "    if intensity_sum is None:\n"
+    text_code += "        result_mesh = deepcopy(wfr.mesh)\n"
+    text_code += "        intensity_sum = intensity\n"
+    text_code += "    else:\n"
+    text_code += "        intensity_sum += resample(intensity, wfr.mesh, result_mesh)\n\n"
+    text_code += "    # the process can be killed at any time (stop, convergence): the output file always holds a complete snapshot, saved\n"
+    text_code += "    # before the electron is printed, so that the printed electrons are saved up to the last multiple of the periodicity\n"
+    text_code += "    if (i + 1) % nMacroElecSavePer == 0 or i + 1 == nMacroElec:\n"
+    text_code += "        temporary_file_name = strIntPropME_OutFileName + '.tmp'\n"
+    text_code += "        srwl_uti_save_intens_ascii(array('f', (intensity_sum/(i + 1)).flatten()), result_mesh, temporary_file_name)\n"
+    text_code += "        os.replace(temporary_file_name, strIntPropME_OutFileName) # atomic\n"
+    text_code += "        if use_checkpoint: save_checkpoint(i + 1)\n\n"
+    text_code += "    print('i=', i, 'Electron Coord.: x=', elec_beam.partStatMom1.x, 'x\\'=', elec_beam.partStatMom1.xp, 'y=', elec_beam.partStatMom1.y, 'y\\'=', elec_beam.partStatMom1.yp, 'gamma=', elec_beam.partStatMom1.gamma)\n\n"
+    text_code += "if use_checkpoint and os.path.exists(checkpoint_file_name): os.remove(checkpoint_file_name) # calculation completed\n"
+
+    return text_code
@@ -0,0 +1,174 @@
+'''
+Reflectivity tables of the mirrors, in the layout of SRW (SRWLOptMir.set_reflect): one complex value (re, im) per
+point, photon energy is the inner loop, then grazing angle, then polarization component (sigma, pi).
+
+Tables are written in the SRW text format (one number per line) or in a compact binary format (NumPy .npy, float32),
+recognized by its magic string when read. Parsed tables are cached for the whole process, keyed by path, modification
+time and size of the file, and can be interpolated (bilinear vs photon energy and grazing angle) on their mesh.
+'''
+import os, array
+from collections import OrderedDict
+
+import numpy
+
+from wofrysrw.beamline.optical_elements.mirrors.srw_mirror import ScaleType
+
+BINARY_MAGIC = b"\x93NUMPY"
+
+def get_reflectivity_table(components):
+    '''
+    :param components: list of reflectivities (real) of each polarization component, arrays (energies, angles)
+    :return: flat array of the table, imaginary parts are zero
+    '''
+    components = numpy.asarray(components, dtype=numpy.float64)
+    if components.ndim == 2: components = components[numpy.newaxis, :, :]
+
+    table = numpy.zeros(components.shape[:1] + components.shape[2:0:-1] + (2,))
+    table[..., 0] = components.transpose((0, 2, 1)) # (components, angles, energies)
+
+    return table.ravel()
+
+def write_reflectivity_file(file_name, table, binary=False):
+    if binary:
+        with open(file_name, "wb") as file: numpy.save(file, numpy.asarray(table, dtype=numpy.float32))
+    else:
+        numpy.savetxt(file_name, table, fmt="%.10g")
+
+def is_binary_file(file_name):
+    with open(file_name, "rb") as file: return file.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+def read_reflectivity_file(file_name):
+    '''
+    :return: flat array of the table, from a text or a binary file
+    '''
+    if is_binary_file(file_name): return numpy.load(file_name).astype(numpy.float64).ravel()
+    else: return numpy.loadtxt(file_name, dtype=numpy.float64).ravel()
+
+class SRWReflectivityTableCache(object):
+    '''
+    Parsed reflectivity tables (flat numpy arrays) and the arrays handed to SRW, parsed once per version of the file
+    '''
+    __instance = None
+
+    @classmethod
+    def Instance(cls):
+        if cls.__instance is None: cls.__instance = SRWReflectivityTableCache()
+
+        return cls.__instance
+
+    def __init__(self, max_tables=20):
+        self.__max_tables = max_tables
+        self.__tables = OrderedDict()
+
+    def clear(self):
+        self.__tables.clear()
+
+    @classmethod
+    def __get_key(cls, file_name):
+        stat = os.stat(file_name)
+
+        return os.path.abspath(file_name), stat.st_mtime_ns, stat.st_size
+
+    def __get_entry(self, file_name):
+        key = self.__get_key(file_name)
+
+        if key in self.__tables:
+            self.__tables.move_to_end(key)
+        else:
+            self.__put_entry(key, read_reflectivity_file(file_name))
+
+        return self.__tables[key]
+
+    def __put_entry(self, key, table):
+        # older versions of the same file are obsolete
+        for old_key in [old_key for old_key in self.__tables.keys() if old_key[0] == key[0]]: del self.__tables[old_key]
+
+        self.__tables[key] = {"table" : table, "srw_data" : None}
+
+        while len(self.__tables) > self.__max_tables: self.__tables.popitem(last=False)
+
+    def put_table(self, file_name, table):
+        '''
+        Registers the table of a file just written, so that it is not parsed again
+        '''
+        self.__put_entry(self.__get_key(file_name), numpy.asarray(table, dtype=numpy.float64).ravel())
+
+    def get_version(self, file_name):
+        '''
+        :return: key of the current version of the file (path, modification time, size)
+        '''
+        return self.__get_key(file_name)
+
+    def get_table(self, file_name):
+        return self.__get_entry(file_name)["table"]
+
+    def get_srw_data(self, file_name):
+        '''
+        :return: the table as array('d'), the type expected by SRW: shared by all the calls, not to be modified
+        '''
+        entry = self.__get_entry(file_name)
+
+        if entry["srw_data"] is None: entry["srw_data"] = array.array('d', numpy.ascontiguousarray(entry["table"], dtype=numpy.float64).tobytes())
+
+        return entry["srw_data"]
+
+class SRWReflectivityInterpolator(object):
+    '''
+    Bilinear interpolation of a reflectivity table vs photon energy and grazing angle, on its linear or logarithmic
+    mesh: values outside the mesh are the ones at its boundaries
+    '''
+    def __init__(self, table, energies_number, angles_number, components_number,
+                 energy_start, energy_end, energy_scale_type=ScaleType.LINEAR,
+                 angle_start=0.0, angle_end=0.0, angle_scale_type=ScaleType.LINEAR):
+        if len(table) != 2*energies_number*angles_number*components_number:
+            raise ValueError("Reflectivity table has " + str(len(table)) + " values, " + str(2*energies_number*angles_number*components_number) + " expected")
+
+        self.__values = numpy.asarray(table).reshape((components_number, angles_number, energies_number, 2))
+
+        self.__energy_mesh = energy_start, energy_end, energies_number, energy_scale_type
+        self.__angle_mesh = angle_start, angle_end, angles_number, angle_scale_type
+
+    @classmethod
+    def __get_indexes(cls, values, start, end, number, scale_type):
+        '''
+        :return: index of the lower mesh point, weight of the upper one
+        '''
+        values = numpy.asarray(values, dtype=numpy.float64)
+
+        if number == 1 or end == start: return numpy.zeros(values.shape, dtype=int), numpy.zeros(values.shape)
+
+        if scale_type == ScaleType.LOGARITHMIC: values, start, end = numpy.log(values), numpy.log(start), numpy.log(end)
+
+        position = numpy.clip((values - start)/(end - start)*(number - 1), 0, number - 1)
+        index = numpy.minimum(numpy.floor(position).astype(int), number - 2)
+
+        return index, position - index
+
+    def is_in_mesh(self, energy, angle):
+        energy_start, energy_end, _, _ = self.__energy_mesh
+        angle_start, angle_end, _, _ = self.__angle_mesh
+
+        return numpy.logical_and(numpy.logical_and(energy >= min(energy_start, energy_end), energy <= max(energy_start, energy_end)),
+                                 numpy.logical_and(angle >= min(angle_start, angle_end), angle <= max(angle_start, angle_end)))
+
+    def interpolate(self, energy, angle):
+        '''
+        :param energy: photon energies [eV], array or scalar
+        :param angle: grazing angles [rad], array or scalar, broadcastable with energy
+        :return: complex reflectivity, array (components, shape of energy and angle)
+        '''
+        energy, angle = numpy.broadcast_arrays(numpy.asarray(energy, dtype=numpy.float64), numpy.asarray(angle, dtype=numpy.float64))
+
+        energy_index, energy_weight = self.__get_indexes(energy, *self.__energy_mesh)
+        angle_index, angle_weight = self.__get_indexes(angle, *self.__angle_mesh)
+
+        energy_next = numpy.minimum(energy_index + 1, self.__values.shape[2] - 1)
+        angle_next = numpy.minimum(angle_index + 1, self.__values.shape[1] - 1)
+
+        def get_value(angle_indexes, energy_indexes):
+            values = self.__values[:, angle_indexes, energy_indexes, :]
+
+            return values[..., 0] + 1j*values[..., 1]
+
+        return (1 - angle_weight)*((1 - energy_weight)*get_value(angle_index, energy_index) + energy_weight*get_value(angle_index, energy_next)) + \
+               angle_weight*((1 - energy_weight)*get_value(angle_next, energy_index) + energy_weight*get_value(angle_next, energy_next))
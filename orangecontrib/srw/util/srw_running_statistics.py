@@ -0,0 +1,87 @@
+'''
+Running statistics (Welford's algorithm) of a sequence of arrays of the same shape, e.g. the intensities of the
+wavefronts of a scan: mean and variance are updated in place, without keeping the received arrays, and can be
+periodically saved to an HDF5 file.
+'''
+import os
+import numpy
+import h5py
+
+class SRWRunningStatistics(object):
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.__count = 0
+        self.__mean = None
+        self.__m2 = None # sum of the squared differences from the mean
+        self.__delta = None
+
+    def get_count(self):
+        return self.__count
+
+    def get_shape(self):
+        return None if self.__mean is None else self.__mean.shape
+
+    def add(self, values):
+        values = numpy.asarray(values, dtype=numpy.float64)
+
+        if self.__mean is None:
+            self.__mean = numpy.zeros(values.shape)
+            self.__m2 = numpy.zeros(values.shape)
+            self.__delta = numpy.empty(values.shape)
+        elif values.shape != self.__mean.shape:
+            raise ValueError("Accumulated Intensity Shape " + str(self.__mean.shape) + " is different from received one " + str(values.shape))
+
+        self.__count += 1
+
+        # in place, no temporary arrays: delta = x - mean_old, mean += delta/n, M2 += delta*(x - mean_new)
+        numpy.subtract(values, self.__mean, out=self.__delta)
+        self.__mean += self.__delta/self.__count
+        self.__delta *= values - self.__mean
+        self.__m2 += self.__delta
+
+    def get_mean(self):
+        return self.__mean
+
+    def get_sum(self):
+        return None if self.__mean is None else self.__mean*self.__count
+
+    def get_variance(self):
+        '''
+        :return: sample variance (unbiased), zero until two arrays have been received
+        '''
+        if self.__mean is None: return None
+        elif self.__count < 2: return numpy.zeros(self.__mean.shape)
+        else: return self.__m2/(self.__count - 1)
+
+    def get_standard_deviation(self):
+        variance = self.get_variance()
+
+        return None if variance is None else numpy.sqrt(variance)
+
+    def get_standard_error(self):
+        standard_deviation = self.get_standard_deviation()
+
+        return None if standard_deviation is None else standard_deviation/numpy.sqrt(self.__count)
+
+    def save_to_hdf5(self, file_name, attributes=None):
+        '''
+        Writes count, mean and variance to a temporary file, then replaces file_name: the file is always complete,
+        even if read while spilling
+        '''
+        if self.__mean is None: raise ValueError("No data accumulated")
+
+        temporary_file_name = file_name + ".tmp"
+
+        with h5py.File(temporary_file_name, "w") as file:
+            file.attrs["count"] = self.__count
+
+            if not attributes is None:
+                for name, value in attributes.items(): file.attrs[name] = value
+
+            file.create_dataset("mean", data=self.__mean)
+            file.create_dataset("variance", data=self.get_variance())
+
+        os.replace(temporary_file_name, file_name)
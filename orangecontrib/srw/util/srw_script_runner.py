@@ -0,0 +1,246 @@
+'''
+Local runner of the generated SRW scripts: each script is written to a temporary file and executed by a child
+Python process, so that long (multi-electron) calculations do not lock OASYS. Jobs are queued and run
+concurrently up to a maximum number (a global setting), their output is streamed back to the widgets.
+'''
+import os, sys, re, time, tempfile
+
+from PyQt5.QtCore import QObject, QProcess, pyqtSignal
+
+from orangecontrib.srw.util.srw_settings import get_global_setting, set_global_setting
+
+class SRWScriptJob(QObject):
+    QUEUED = 0
+    RUNNING = 1
+    FINISHED = 2
+    FAILED = 3
+    CANCELLED = 4
+    STOPPED = 5 # terminated on request, with valid intermediate results (e.g. converged)
+
+    STATES = ["Queued", "Running", "Finished", "Failed", "Cancelled", "Stopped"]
+
+    # lines of srwl_wfr_emit_prop_multi_e reporting the index of the current macro-electron
+    MACRO_ELECTRON_PATTERN = re.compile(r"\bi\s*=\s*(\d+)")
+
+    output_received = pyqtSignal(str)
+    state_changed = pyqtSignal(int)
+
+    def __init__(self, script, name="SRW Script", number_of_macro_electrons=None, working_directory=None, output_file_name=None, max_restarts=0, save_periodicity=None):
+        super().__init__()
+
+        self.__script = script
+        self.__name = name
+        self.__number_of_macro_electrons = number_of_macro_electrons
+        self.__working_directory = os.getcwd() if working_directory is None else working_directory
+        self.__output_file_name = output_file_name
+        self.__max_restarts = max_restarts
+        self.__save_periodicity = save_periodicity
+        self.__restarts = 0
+
+        self.__state = SRWScriptJob.QUEUED
+        self.__process = None
+        self.__file_name = None
+        self.__start_time = None
+        self.__end_time = None
+        self.__macro_electrons = 0
+        self.__exit_code = None
+        self.__partial_line = "" # output not yet terminated by a new line, parsed when complete
+
+    def get_name(self):
+        return self.__name
+
+    def get_output_file_name(self):
+        return None if self.__output_file_name is None else os.path.abspath(os.path.join(self.__working_directory, self.__output_file_name))
+
+    def get_state(self):
+        return self.__state
+
+    def get_state_name(self):
+        return SRWScriptJob.STATES[self.__state]
+
+    def get_exit_code(self):
+        return self.__exit_code
+
+    def is_active(self):
+        return self.__state in (SRWScriptJob.QUEUED, SRWScriptJob.RUNNING)
+
+    def get_elapsed_time(self):
+        if self.__start_time is None: return 0.0
+        elif self.__end_time is None: return time.time() - self.__start_time
+        else: return self.__end_time - self.__start_time
+
+    def get_macro_electrons(self):
+        return self.__macro_electrons
+
+    def get_number_of_macro_electrons(self):
+        return self.__number_of_macro_electrons
+
+    def get_saved_macro_electrons(self):
+        '''
+        :return: number of macro-electrons in the output file: the output is saved every save_periodicity
+                 macro-electrons and at the end of the calculation
+        '''
+        if self.__state == SRWScriptJob.FINISHED and not self.__number_of_macro_electrons is None: return self.__number_of_macro_electrons
+        elif self.__save_periodicity is None: return self.__macro_electrons
+        else: return (self.__macro_electrons // self.__save_periodicity)*self.__save_periodicity
+
+    def get_status(self):
+        elapsed_time = int(self.get_elapsed_time())
+
+        status = self.get_state_name() + ", elapsed {0:02d}:{1:02d}:{2:02d}".format(elapsed_time // 3600, (elapsed_time % 3600) // 60, elapsed_time % 60)
+
+        if self.__macro_electrons > 0:
+            status += ", macro-electrons: " + str(self.__macro_electrons)
+            if not self.__number_of_macro_electrons is None:
+                status += "/" + str(self.__number_of_macro_electrons) + " ({0:.1f}%)".format(100*self.__macro_electrons/self.__number_of_macro_electrons)
+
+        return status
+
+    def start(self):
+        file_descriptor, self.__file_name = tempfile.mkstemp(prefix="srw_script_", suffix=".py")
+
+        with os.fdopen(file_descriptor, "w") as file: file.write(self.__script)
+
+        self.__process = QProcess()
+        self.__process.setProcessChannelMode(QProcess.MergedChannels)
+        self.__process.setWorkingDirectory(self.__working_directory)
+        self.__process.readyReadStandardOutput.connect(self.__read_output)
+        self.__process.finished.connect(self.__process_finished)
+        self.__process.errorOccurred.connect(self.__process_error)
+
+        self.__start_time = time.time()
+        self.__set_state(SRWScriptJob.RUNNING)
+
+        # unbuffered, to stream the output
+        self.__process.start(sys.executable, ["-u", self.__file_name])
+
+    def cancel(self):
+        self.__terminate(SRWScriptJob.CANCELLED)
+
+    def stop(self):
+        self.__terminate(SRWScriptJob.STOPPED)
+
+    def __terminate(self, state):
+        if self.__state == SRWScriptJob.RUNNING:
+            self.__set_state(state)
+            self.__process.kill()
+        elif self.__state == SRWScriptJob.QUEUED:
+            self.__set_state(SRWScriptJob.CANCELLED)
+
+    def __read_output(self):
+        text = bytes(self.__process.readAllStandardOutput()).decode("utf-8", errors="replace")
+
+        # the output arrives in chunks, that can split a line (and its number)
+        lines = self.__partial_line + text
+        end_of_lines = max(lines.rfind("\n"), lines.rfind("\r")) + 1
+
+        self.__parse_lines(lines[:end_of_lines])
+        self.__partial_line = lines[end_of_lines:]
+
+        self.output_received.emit(text)
+
+    def __parse_lines(self, lines):
+        for match in SRWScriptJob.MACRO_ELECTRON_PATTERN.finditer(lines):
+            self.__macro_electrons = max(self.__macro_electrons, int(match.group(1)) + 1)
+
+    def __process_finished(self, exit_code, exit_status):
+        self.__read_output()
+        self.__parse_lines(self.__partial_line)
+        self.__partial_line = ""
+        self.__exit_code = exit_code
+
+        if self.__state == SRWScriptJob.RUNNING:
+            if exit_status == QProcess.NormalExit and exit_code == 0:
+                self.__set_state(SRWScriptJob.FINISHED)
+            elif self.__restarts < self.__max_restarts:
+                # only for resumable scripts (max_restarts > 0), that continue from their last checkpoint
+                self.__restarts += 1
+                self.output_received.emit("\nProcess ended with exit code " + str(exit_code) + ": restarting (" + str(self.__restarts) + "/" + str(self.__max_restarts) + ")\n")
+                self.__process.start(sys.executable, ["-u", self.__file_name])
+            else:
+                self.__set_state(SRWScriptJob.FAILED)
+        else:
+            self.__end_job()
+
+    def __process_error(self, error):
+        if error == QProcess.FailedToStart:
+            self.output_received.emit("\nProcess failed to start: " + self.__process.errorString() + "\n")
+            self.__set_state(SRWScriptJob.FAILED)
+
+    def __set_state(self, state):
+        self.__state = state
+
+        if not self.is_active(): self.__end_job()
+
+        self.state_changed.emit(state)
+
+    def __end_job(self):
+        if self.__end_time is None and not self.__start_time is None: self.__end_time = time.time()
+
+        if not self.__file_name is None:
+            try: os.remove(self.__file_name)
+            except: pass
+
+            self.__file_name = None
+
+class SRWScriptJobRunner(QObject):
+    '''
+    Queue of the script jobs of all the widgets, running at most max_jobs processes at the same time
+    '''
+    __instance = None
+
+    DEFAULT_MAX_JOBS = max(1, (os.cpu_count() or 2) - 1)
+
+    @classmethod
+    def Instance(cls):
+        if cls.__instance is None: cls.__instance = SRWScriptJobRunner(max_jobs=get_global_setting("scripts_max_jobs", SRWScriptJobRunner.DEFAULT_MAX_JOBS))
+
+        return cls.__instance
+
+    def __init__(self, max_jobs=DEFAULT_MAX_JOBS):
+        super().__init__()
+
+        self.__max_jobs = max_jobs
+        self.__jobs = []
+
+    def get_max_jobs(self):
+        return self.__max_jobs
+
+    def set_max_jobs(self, max_jobs):
+        self.__max_jobs = max(1, max_jobs)
+        set_global_setting("scripts_max_jobs", self.__max_jobs)
+
+        self.__start_jobs()
+
+    def get_jobs(self):
+        return self.__jobs
+
+    def get_number_of_running_jobs(self):
+        return len([job for job in self.__jobs if job.get_state() == SRWScriptJob.RUNNING])
+
+    def get_number_of_queued_jobs(self):
+        return len([job for job in self.__jobs if job.get_state() == SRWScriptJob.QUEUED])
+
+    def submit(self, job):
+        job.state_changed.connect(self.__job_state_changed)
+
+        self.__jobs.append(job)
+        self.__start_jobs()
+
+        return job
+
+    def get_jobs_writing(self, file_names):
+        file_names = [os.path.abspath(file_name) for file_name in file_names]
+
+        return [job for job in self.__jobs if job.is_active() and job.get_output_file_name() in file_names]
+
+    def __job_state_changed(self, state):
+        if state != SRWScriptJob.RUNNING:
+            self.__jobs = [job for job in self.__jobs if job.is_active()]
+            self.__start_jobs()
+
+    def __start_jobs(self):
+        for job in [job for job in self.__jobs if job.get_state() == SRWScriptJob.QUEUED]:
+            if self.get_number_of_running_jobs() >= self.__max_jobs: break
+
+            job.start()
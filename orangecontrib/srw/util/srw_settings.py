@@ -0,0 +1,11 @@
+'''
+Settings of the resources shared by all the widgets of the process (e.g. the store of checkpoints, the runner of
+the scripts): a single value for the whole application, persisted with QSettings and not saved with the workflows.
+'''
+from PyQt5.QtCore import QSettings
+
+def get_global_setting(name, default_value):
+    return QSettings().value("srw/" + name, default_value, type=type(default_value))
+
+def set_global_setting(name, value):
+    QSettings().setValue("srw/" + name, value)
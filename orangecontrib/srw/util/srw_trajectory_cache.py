@@ -0,0 +1,136 @@
+from collections import OrderedDict
+
+import numpy
+
+from wofrysrw.util.srw import srwl, SRWLPrtTrj
+from wofrysrw.storage_ring.srw_light_source import SRWLightSource
+from wofrysrw.propagator.wavefront2D.srw_wavefront import SRWWavefront
+
+from orangecontrib.srw.util.srw_wavefront_cache import get_signature
+
+class SRWTrajectoryCache(object):
+    '''
+    In memory cache of electron trajectories, shared by all the widgets of the process and keyed by the signature of the
+    electron beam, of the magnetic structure and of the integration range: field, flux and power density calculations
+    of the same source on different observation meshes integrate the trajectory only once.
+    '''
+    __instance = None
+
+    @classmethod
+    def Instance(cls):
+        if cls.__instance is None: cls.__instance = SRWTrajectoryCache()
+
+        return cls.__instance
+
+    def __init__(self, max_trajectories=20):
+        self.__max_trajectories = max_trajectories
+        self.__trajectories = OrderedDict()
+
+    def set_max_trajectories(self, max_trajectories):
+        self.__max_trajectories = max_trajectories
+
+        self.__evict()
+
+    def clear(self):
+        self.__trajectories.clear()
+
+    def get_trajectory(self, electron_beam, magnetic_structure, start_longitudinal_position, end_longitudinal_position, number_of_points):
+        '''
+        :return: the SRWLPrtTrj of the electron beam (first order moments), or None if the integration limits are
+                 automatic (start >= end): their range is decided by SRW, the trajectory is then calculated by SRW
+        '''
+        if start_longitudinal_position >= end_longitudinal_position: return None
+
+        key = get_signature([electron_beam, magnetic_structure, start_longitudinal_position, end_longitudinal_position, int(number_of_points)])
+
+        if key in self.__trajectories:
+            self.__trajectories.move_to_end(key)
+        else:
+            self.__trajectories[key] = calculate_trajectory(electron_beam, magnetic_structure, start_longitudinal_position, end_longitudinal_position, number_of_points)
+            self.__evict()
+
+        return self.__trajectories[key]
+
+    def __evict(self):
+        while len(self.__trajectories) > self.__max_trajectories: self.__trajectories.popitem(last=False)
+
+def calculate_trajectory(electron_beam, magnetic_structure, start_longitudinal_position, end_longitudinal_position, number_of_points):
+    particle = electron_beam.to_SRWLPartBeam().partStatMom1
+
+    trajectory = SRWLPrtTrj()
+    trajectory.partInitCond = particle
+    trajectory.allocate(int(number_of_points), True)
+    trajectory.ctStart = start_longitudinal_position - particle.z
+    trajectory.ctEnd = end_longitudinal_position - particle.z
+
+    return srwl.CalcPartTraj(trajectory, magnetic_structure.get_SRWLMagFldC(), [1])
+
+def is_trajectory_based(srw_source):
+    # sources with a specific calculation (e.g. gaussian) are not based on an electron trajectory
+    return type(srw_source).get_SRW_Wavefront is SRWLightSource.get_SRW_Wavefront and not srw_source.get_electron_beam() is None
+
+#########################################################################################
+#
+# CALCULATIONS WITH CACHED TRAJECTORY (as SRWLightSource, passing the trajectory to SRW)
+#
+# Opt-in: by default, and whenever the trajectory cannot be precomputed, the calculation
+# of wofrysrw is used. The source object is not updated (its wavefront parameters are the
+# ones of its last calculation by wofrysrw): to be used with transient sources only.
+#
+#########################################################################################
+
+def get_SRW_Wavefront(srw_source, wavefront_parameters, use_trajectory_cache=False):
+    if not use_trajectory_cache or not is_trajectory_based(srw_source): return srw_source.get_SRW_Wavefront(source_wavefront_parameters=wavefront_parameters)
+
+    precision_parameters = wavefront_parameters._wavefront_precision_parameters
+
+    trajectory = SRWTrajectoryCache.Instance().get_trajectory(srw_source.get_electron_beam(),
+                                                              srw_source.get_magnetic_structure(),
+                                                              precision_parameters._start_integration_longitudinal_position,
+                                                              precision_parameters._end_integration_longitudinal_position,
+                                                              precision_parameters._number_of_points_for_trajectory_calculation)
+
+    if trajectory is None: return srw_source.get_SRW_Wavefront(source_wavefront_parameters=wavefront_parameters)
+
+    mesh = wavefront_parameters.to_SRWRadMesh()
+
+    wavefront = SRWWavefront()
+    wavefront.allocate(mesh.ne, mesh.nx, mesh.ny)
+    wavefront.mesh = mesh
+    wavefront.partBeam = srw_source.get_electron_beam().to_SRWLPartBeam()
+    wavefront.unitElFld = wavefront_parameters._electric_field_units
+
+    srwl.CalcElecFieldSR(wavefront,
+                         trajectory,
+                         srw_source.get_magnetic_structure().get_SRWLMagFldC(),
+                         precision_parameters.to_SRW_array())
+
+    return wavefront
+
+def get_power_density(srw_source, wavefront_parameters, power_density_precision_parameters, use_trajectory_cache=False):
+    if not use_trajectory_cache or not is_trajectory_based(srw_source): return srw_source.get_power_density(source_wavefront_parameters=wavefront_parameters,
+                                                                                power_density_precision_parameters=power_density_precision_parameters)
+
+    trajectory = SRWTrajectoryCache.Instance().get_trajectory(srw_source.get_electron_beam(),
+                                                              srw_source.get_magnetic_structure(),
+                                                              power_density_precision_parameters._initial_longitudinal_position,
+                                                              power_density_precision_parameters._final_longitudinal_position,
+                                                              power_density_precision_parameters._number_of_points_for_trajectory_calculation)
+
+    if trajectory is None: return srw_source.get_power_density(source_wavefront_parameters=wavefront_parameters,
+                                                               power_density_precision_parameters=power_density_precision_parameters)
+
+    stokes = wavefront_parameters.to_SRWLStokes()
+
+    srwl.CalcPowDenSR(stokes,
+                      srw_source.get_electron_beam().to_SRWLPartBeam(),
+                      trajectory,
+                      srw_source.get_magnetic_structure().get_SRWLMagFldC(),
+                      power_density_precision_parameters.to_SRW_array())
+
+    mesh = stokes.mesh
+
+    # SRW layout: [y][x]
+    power_density = numpy.array(stokes.arS[:mesh.nx*mesh.ny]).reshape((mesh.ny, mesh.nx)).T
+
+    return numpy.linspace(mesh.xStart, mesh.xFin, mesh.nx), numpy.linspace(mesh.yStart, mesh.yFin, mesh.ny), power_density
@@ -0,0 +1,86 @@
+'''
+Tuning curves of a planar undulator: peak flux through an aperture and brilliance of the odd harmonics, for a
+sweep of the deflection parameter K. Each point (K, harmonic) of the flux is an independent SRW flux calculation
+(CalcStokesUR), run in parallel processes and cached for the whole process. The brilliance is a property of the
+source, independent of the aperture: it is calculated from the central cone flux.
+'''
+from collections import OrderedDict
+
+import numpy
+
+from orangecontrib.srw.util.srw_parallel import run_in_parallel
+from orangecontrib.srw.util.srw_wavefront_cache import get_signature
+from orangecontrib.srw.util.srw_preview import get_undulator_resonance_energy, get_undulator_central_cone_flux, get_undulator_photon_beam_sizes
+
+class SRWTuningPointsCache(object):
+    '''
+    (photon energy, flux) at the peak of the harmonic, keyed by the signature of the objects of the calculation:
+    points are reused when the K range or the number of harmonics change, for the same electron beam
+    '''
+    __instance = None
+
+    @classmethod
+    def Instance(cls):
+        if cls.__instance is None: cls.__instance = SRWTuningPointsCache()
+
+        return cls.__instance
+
+    def __init__(self, max_points=100000):
+        self.__max_points = max_points
+        self.__points = OrderedDict()
+
+    def clear(self):
+        self.__points.clear()
+
+    def get_key(self, *objects):
+        return get_signature(list(objects))
+
+    def get_point(self, key):
+        if key in self.__points: self.__points.move_to_end(key)
+
+        return self.__points.get(key, None)
+
+    def put_point(self, key, point):
+        self.__points[key] = point
+
+        while len(self.__points) > self.__max_points: self.__points.popitem(last=False)
+
+def get_peak_flux(srw_source, wavefront_parameters, flux_precision_parameters):
+    energy, flux = srw_source.get_undulator_flux(source_wavefront_parameters=wavefront_parameters,
+                                                 flux_precision_parameters=flux_precision_parameters)
+    index = numpy.argmax(flux)
+
+    return energy[index], flux[index]
+
+def calculate_tuning_points(tasks, number_of_processes):
+    '''
+    :param tasks: list of (srw_source, wavefront_parameters, flux_precision_parameters)
+    :return: list of (photon energy, flux) at the peak, in the same order; only the points not in cache are calculated
+    '''
+    points_cache = SRWTuningPointsCache.Instance()
+
+    keys = [points_cache.get_key(*task) for task in tasks]
+    points = [points_cache.get_point(key) for key in keys]
+
+    missing = [index for index, point in enumerate(points) if point is None]
+
+    if len(missing) > 0:
+        for index, point in zip(missing, run_in_parallel(get_peak_flux, [tasks[index] for index in missing], max_processes=number_of_processes)):
+            points[index] = point
+            points_cache.put_point(keys[index], point)
+
+    return points, len(missing)
+
+def get_brilliance(electron_energy_in_GeV, current, K, period_length, number_of_periods, harmonic, sigma_x, sigma_xp, sigma_y, sigma_yp):
+    '''
+    Brilliance of the harmonic at resonance: central cone flux over the phase space area of the central cone convolved
+    with the electron beam (zero energy spread)
+
+    :return: photon energy [eV], brilliance [ph/s/mm²/mrad²/0.1%bw]
+    '''
+    photon_energy = get_undulator_resonance_energy(electron_energy_in_GeV, K, period_length, harmonic)
+    flux = get_undulator_central_cone_flux(current, K, number_of_periods, harmonic)
+
+    Sx, Sxp, Sy, Syp = get_undulator_photon_beam_sizes(photon_energy, period_length, number_of_periods, sigma_x, sigma_xp, sigma_y, sigma_yp)
+
+    return photon_energy, flux/(4*numpy.pi**2*(Sx*1e3)*(Sxp*1e3)*(Sy*1e3)*(Syp*1e3))
@@ -0,0 +1,126 @@
+import os, pickle, hashlib, tempfile
+import numpy
+
+# names of the objects and texts for their display: renaming a widget or an element does not change the signature
+EXCLUDED_ATTRIBUTES = ["name", "_name", "_support_dictionary"]
+
+# attributes containing the name of an input file
+FILE_ATTRIBUTE_SUFFIXES = ("file_name", "filename")
+
+def get_file_signature(file_name):
+    '''
+    :return: name, size and modification time of the file: a file rewritten with different data changes the signature
+    '''
+    if not os.path.isfile(file_name): return repr(file_name)
+
+    stat = os.stat(file_name)
+
+    return repr(file_name) + "@" + str(stat.st_size) + ":" + str(stat.st_mtime_ns)
+
+def get_signature(obj, visited=None):
+    '''
+    Canonical string representation of an object, made of the values of its attributes (recursively), except the
+    names (EXCLUDED_ATTRIBUTES). Input files referenced by the attributes are represented by their size and
+    modification time too.
+    '''
+    if visited is None: visited = set()
+
+    if obj is None or isinstance(obj, (bool, int, float, str)): return repr(obj)
+    elif isinstance(obj, (numpy.integer, numpy.floating)): return repr(obj.item())
+    elif isinstance(obj, numpy.ndarray): return "ndarray" + str(obj.shape) + hashlib.sha1(numpy.ascontiguousarray(obj).tobytes()).hexdigest()
+    elif isinstance(obj, (list, tuple)): return "[" + ",".join([get_signature(item, visited) for item in obj]) + "]"
+    elif isinstance(obj, dict): return "{" + ",".join([str(key) + ":" + get_signature(obj[key], visited) for key in sorted(obj.keys(), key=str)]) + "}"
+    elif id(obj) in visited: return "<cycle>"
+    elif hasattr(obj, "__dict__"):
+        visited.add(id(obj))
+
+        attributes = vars(obj)
+
+        def get_attribute_signature(key):
+            value = attributes[key]
+
+            if isinstance(value, str) and key.lower().endswith(FILE_ATTRIBUTE_SUFFIXES): return get_file_signature(value)
+            else: return get_signature(value, visited)
+
+        return type(obj).__name__ + "(" + ",".join([key + "=" + get_attribute_signature(key) for key in sorted(attributes.keys()) if not key in EXCLUDED_ATTRIBUTES]) + ")"
+    else:
+        return repr(obj)
+
+class SRWWavefrontCache(object):
+    '''
+    Disk cache of calculated wavefronts, keyed by the signature of the objects used for the calculation
+    (light source with electron beam and magnetic structure, wavefront and precision parameters).
+    Least recently used files are removed beyond the maximum size.
+    '''
+    DEFAULT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".oasys", "srw_wavefront_cache")
+    EXTENSION = ".wfr"
+
+    __instance = None
+
+    @classmethod
+    def Instance(cls):
+        if cls.__instance is None: cls.__instance = SRWWavefrontCache()
+
+        return cls.__instance
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_size=2.0):
+        self.__directory = directory
+        self.__max_size = max_size # GB
+
+    def set_directory(self, directory):
+        self.__directory = directory
+
+    def set_max_size(self, max_size):
+        self.__max_size = max_size
+
+    def get_key(self, *objects):
+        return hashlib.sha1(get_signature(list(objects)).encode("utf-8")).hexdigest()
+
+    def get_wavefront(self, key):
+        file_name = self.__get_file_name(key)
+
+        if not os.path.isfile(file_name): return None
+
+        try:
+            with open(file_name, "rb") as file: wavefront = pickle.load(file)
+        except Exception:
+            os.remove(file_name) # corrupted or incompatible
+
+            return None
+
+        os.utime(file_name) # last access, for LRU eviction
+
+        return wavefront
+
+    def put_wavefront(self, key, wavefront):
+        if not os.path.exists(self.__directory): os.makedirs(self.__directory)
+
+        # atomic: a partially written file is never visible
+        file_descriptor, temporary_file_name = tempfile.mkstemp(dir=self.__directory, suffix=".tmp")
+        with os.fdopen(file_descriptor, "wb") as file: pickle.dump(wavefront, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_file_name, self.__get_file_name(key))
+
+        self.__evict()
+
+    def get_size(self):
+        return sum([os.path.getsize(file_name) for file_name in self.__get_files()])/1024**3
+
+    def clear(self):
+        for file_name in self.__get_files(): os.remove(file_name)
+
+    def __get_file_name(self, key):
+        return os.path.join(self.__directory, key + SRWWavefrontCache.EXTENSION)
+
+    def __get_files(self):
+        if not os.path.exists(self.__directory): return []
+
+        return [os.path.join(self.__directory, file_name) for file_name in os.listdir(self.__directory) if file_name.endswith(SRWWavefrontCache.EXTENSION)]
+
+    def __evict(self):
+        files = sorted(self.__get_files(), key=os.path.getmtime)
+        size = sum([os.path.getsize(file_name) for file_name in files])
+
+        while len(files) > 0 and size > self.__max_size*1024**3:
+            file_name = files.pop(0)
+            size -= os.path.getsize(file_name)
+            os.remove(file_name)
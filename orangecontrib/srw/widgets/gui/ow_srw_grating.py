@@ -136,8 +136,8 @@ class OWSRWGrating(OWSRWOpticalElement):
 
         return grating
 
-    def set_additional_parameters(self, beamline_element, propagation_parameters, beamline):
-        grating = beamline.get_beamline_element_at(-1).get_optical_element()
+    def set_additional_parameters(self, beamline_element, propagation_parameters=None, beamline=None):
+        grating = beamline_element.get_optical_element()
 
         orientation_of_the_output_optical_axis_vector_x, \
         orientation_of_the_output_optical_axis_vector_y, \
@@ -15,6 +15,7 @@ from wofrysrw.beamline.optical_elements.mirrors.srw_mirror import ScaleType
 from orangecontrib.srw.util.srw_objects import SRWData, SRWPreProcessorData, SRWErrorProfileData, SRWReflectivityData
 from orangecontrib.srw.widgets.gui.ow_srw_optical_element import OWSRWOpticalElement
 from orangecontrib.srw.util.srw_util import ShowErrorProfileDialog
+from orangecontrib.srw.util.srw_reflectivity import SRWReflectivityTableCache, SRWReflectivityInterpolator
 
 class OWSRWMirror(OWSRWOpticalElement):
 
@@ -47,6 +48,8 @@ class OWSRWMirror(OWSRWOpticalElement):
     reflectivity_angle_end = Setting(0.005)
     reflectivity_angle_scale_type = Setting(0)
 
+    reflectivity_table_key = None # version of the reflectivity table last reported
+
     inputs = [("SRWData", SRWData, "set_input"),
               ("Trigger", TriggerOut, "propagate_new_wavefront"),
               ("PreProcessor Data #1", SRWPreProcessorData, "setPreProcessorData"),
@@ -209,7 +212,19 @@ class OWSRWMirror(OWSRWOpticalElement):
 
 
     def read_reflectivity_data_file(self):
-        return numpy.loadtxt(self.reflectivity_data_file).tolist()
+        return SRWReflectivityTableCache.Instance().get_srw_data(self.reflectivity_data_file)
+
+    def get_reflectivity_interpolator(self):
+        return SRWReflectivityInterpolator(SRWReflectivityTableCache.Instance().get_table(self.reflectivity_data_file),
+                                           energies_number=self.reflectivity_energies_number,
+                                           angles_number=self.reflectivity_angles_number,
+                                           components_number=self.reflectivity_components_number + 1,
+                                           energy_start=self.reflectivity_energy_start,
+                                           energy_end=self.reflectivity_energy_end,
+                                           energy_scale_type=ScaleType.LINEAR if self.reflectivity_energy_scale_type==0 else ScaleType.LOGARITHMIC,
+                                           angle_start=self.reflectivity_angle_start,
+                                           angle_end=self.reflectivity_angle_end,
+                                           angle_scale_type=ScaleType.LINEAR if self.reflectivity_angle_scale_type==0 else ScaleType.LOGARITHMIC)
 
     def get_mirror_instance(self):
         raise NotImplementedError()
@@ -259,6 +274,27 @@ class OWSRWMirror(OWSRWOpticalElement):
             congruence.checkStrictlyPositiveNumber(self.reflectivity_angle_end, "Final Grazing Angle Value")
             congruence.checkGreaterOrEqualThan(self.reflectivity_angle_end, self.reflectivity_angle_start, "Final Grazing Angle Value", "Initial Grazing Angle Value")
 
+            interpolator = self.get_reflectivity_interpolator() # checks the number of values of the table
+
+            # reported once per version of the table and of its mesh, not at every propagation
+            reflectivity_table_key = (SRWReflectivityTableCache.Instance().get_version(self.reflectivity_data_file),
+                                      self.reflectivity_energies_number, self.reflectivity_angles_number, self.reflectivity_components_number,
+                                      self.reflectivity_energy_start, self.reflectivity_energy_end, self.reflectivity_energy_scale_type,
+                                      self.reflectivity_angle_start, self.reflectivity_angle_end, self.reflectivity_angle_scale_type)
+
+            if not self.input_srw_data is None and reflectivity_table_key != self.reflectivity_table_key:
+                self.reflectivity_table_key = reflectivity_table_key
+
+                mesh = self.input_srw_data.get_srw_wavefront().mesh
+                energy = 0.5*(mesh.eStart + mesh.eFin)
+                grazing_angle = numpy.radians(90-self.angle_radial)
+
+                if not interpolator.is_in_mesh(energy, grazing_angle):
+                    print("Warning: photon energy or grazing angle out of the reflectivity table, boundary values are used")
+
+                print("Reflectivity at E = {0:.2f} eV, grazing angle = {1:.4e} rad: ".format(energy, grazing_angle) +
+                      ", ".join(["{0:.4f}".format(reflectivity.real) for reflectivity in interpolator.interpolate(energy, grazing_angle)]))
+
     def setPreProcessorData(self, data):
         if data is not None:
             try:
@@ -292,6 +328,11 @@ class OWSRWMirror(OWSRWOpticalElement):
                     if data.reflectivity_data.reflectivity_data_file != SRWReflectivityData.NONE:
                         self.has_reflectivity=2
                         self.reflectivity_data_file=data.reflectivity_data.reflectivity_data_file
+
+                        # the table in memory is the content of the file, just written: no need to parse it
+                        if not data.reflectivity_data.reflectivity_table is None:
+                            SRWReflectivityTableCache.Instance().put_table(data.reflectivity_data.reflectivity_data_file,
+                                                                           data.reflectivity_data.reflectivity_table)
                         self.reflectivity_energies_number=data.reflectivity_data.energies_number
                         self.reflectivity_angles_number=data.reflectivity_data.angles_number
                         self.reflectivity_components_number=data.reflectivity_data.components_number-1
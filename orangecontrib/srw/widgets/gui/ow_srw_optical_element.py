@@ -26,10 +26,13 @@ from wofrysrw.propagator.propagators2D.srw_fresnel_wofry import FresnelSRWWofry
 from wofrysrw.beamline.optical_elements.srw_optical_element import SRWOpticalElementDisplacement
 
 from orangecontrib.srw.util.srw_objects import SRWData
+from orangecontrib.srw.util.srw_checkpoints import SRWPropagationStep, SRWCheckpointStore, propagate_segment
+from orangecontrib.srw.util.srw_mesh_estimator import SRWMeshStage, estimate_propagation_mesh, get_peak_memory, get_reduction_factor
+from orangecontrib.srw.util.srw_profiling import SRWProfileRecord, SRWPropagationProfile, SRWProfiledPropagator, profile_propagation, time_propagation
+from orangecontrib.srw.util.srw_me_convolution import get_electron_beam_moments, get_projected_sigma
 from orangecontrib.srw.widgets.gui.ow_srw_wavefront_viewer import SRWWavefrontViewer
 from wofrysrw.beamline.optical_elements.srw_optical_element import Orientation
 
-from orangecontrib.srw.util.srw_util import SRWPlot
 
 
 class OWSRWOpticalElement(SRWWavefrontViewer, WidgetDecorator):
@@ -120,6 +123,25 @@ class OWSRWOpticalElement(SRWWavefrontViewer, WidgetDecorator):
     oe_orientation_of_the_horizontal_base_vector_x     = Setting(0.0)
     oe_orientation_of_the_horizontal_base_vector_y     = Setting(0.0)
 
+    check_memory_budget = Setting(0)
+    memory_budget = Setting(8.0)
+
+    whole_beamline_checkpoint = Setting(0)
+    checkpoint_file_name = Setting("checkpoint.h5")
+
+    me_estimate = Setting(0)
+    me_estimate_projection = Setting(0)
+    me_estimate_distance = Setting(10.0)
+    me_estimate_magnification_x = Setting(1.0)
+    me_estimate_magnification_y = Setting(1.0)
+    me_estimate_sigma_x = Setting(1e-5)
+    me_estimate_sigma_y = Setting(1e-5)
+    me_estimate_energy_spread = Setting(1)
+
+    propagation_profile = None
+    coherent_modes = None
+    me_estimate_parameters = None
+
     has_displacement = Setting(0)
     shift_x = Setting(0.0)
     shift_y = Setting(0.0)
@@ -187,6 +209,7 @@ class OWSRWOpticalElement(SRWWavefrontViewer, WidgetDecorator):
         self.tab_bas = oasysgui.createTabPage(self.tabs_setting, "Optical Element")
         self.tab_pro = oasysgui.createTabPage(self.tabs_setting, "Wavefront Propagation")
         if self.has_displacement_tab: self.tab_dis = oasysgui.createTabPage(self.tabs_setting, "Displacement")
+        self.tab_me_estimate = oasysgui.createTabPage(self.tabs_setting, "ME Estimate")
 
         self.coordinates_box = oasysgui.widgetBox(self.tab_bas, "Coordinates", addSpace=True, orientation="vertical")
 
@@ -344,6 +367,31 @@ class OWSRWOpticalElement(SRWWavefrontViewer, WidgetDecorator):
         oasysgui.lineEdit(drift_optional_box, self, "drift_after_orientation_of_the_horizontal_base_vector_x"    , "Orientation of the Horizontal Base vector of the\nOutput Frame in the Incident Beam Frame: X", labelWidth=290, valueType=float, orientation="horizontal")
         oasysgui.lineEdit(drift_optional_box, self, "drift_after_orientation_of_the_horizontal_base_vector_y"    , "Orientation of the Horizontal Base vector of the\nOutput Frame in the Incident Beam Frame: Y", labelWidth=290, valueType=float, orientation="horizontal")
 
+        # MEMORY BUDGET
+
+        self.tab_memory = oasysgui.createTabPage(self.tabs_prop_setting, "Memory")
+
+        gui.comboBox(self.tab_memory, self, "check_memory_budget", label="Check Memory Budget before Propagation",
+                     items=["No", "Yes"], labelWidth=300,
+                     sendSelectedValue=False, orientation="horizontal")
+
+        oasysgui.lineEdit(self.tab_memory, self, "memory_budget", "Memory Budget [GB]", labelWidth=300, valueType=float, orientation="horizontal")
+
+        gui.button(self.tab_memory, self, "Estimate Output Mesh", callback=self.show_mesh_estimate)
+
+        checkpoint_box = oasysgui.widgetBox(self.tab_memory, "Whole Beamline Propagation", addSpace=False, orientation="vertical")
+
+        gui.comboBox(checkpoint_box, self, "whole_beamline_checkpoint", label="Checkpoint after this element",
+                     items=["No", "In Memory", "HDF5 File"], labelWidth=250,
+                     sendSelectedValue=False, orientation="horizontal", callback=self.set_whole_beamline_checkpoint)
+
+        self.checkpoint_file_box = oasysgui.widgetBox(checkpoint_box, "", addSpace=False, orientation="horizontal")
+
+        self.le_checkpoint_file_name = oasysgui.lineEdit(self.checkpoint_file_box, self, "checkpoint_file_name", "File Name", labelWidth=80, valueType=str, orientation="horizontal")
+        gui.button(self.checkpoint_file_box, self, "...", callback=self.select_checkpoint_file)
+
+        self.set_whole_beamline_checkpoint()
+
         #DISPLACEMENTS
 
         if self.has_displacement_tab:
@@ -369,6 +417,74 @@ class OWSRWOpticalElement(SRWWavefrontViewer, WidgetDecorator):
 
             self.set_displacement()
 
+        # MULTI ELECTRON ESTIMATE
+
+        gui.comboBox(self.tab_me_estimate, self, "me_estimate", label="Plot ME intensity estimate (FFT convolution)",
+                     items=["No", "Yes"], labelWidth=300,
+                     sendSelectedValue=False, orientation="horizontal", callback=self.set_me_estimate)
+
+        self.me_estimate_box = oasysgui.widgetBox(self.tab_me_estimate, "Electron Beam Projected on this Plane", addSpace=False, orientation="vertical")
+
+        gui.comboBox(self.me_estimate_box, self, "me_estimate_projection", label="Projection",
+                     items=["Drift from source", "Image of the source", "User defined"], labelWidth=150,
+                     sendSelectedValue=False, orientation="horizontal", callback=self.set_me_estimate)
+
+        self.me_estimate_drift_box = oasysgui.widgetBox(self.me_estimate_box, "", addSpace=False, orientation="vertical", height=60)
+
+        oasysgui.lineEdit(self.me_estimate_drift_box, self, "me_estimate_distance", "Distance from source [m]", labelWidth=260, valueType=float, orientation="horizontal")
+
+        self.me_estimate_image_box = oasysgui.widgetBox(self.me_estimate_box, "", addSpace=False, orientation="vertical", height=60)
+
+        oasysgui.lineEdit(self.me_estimate_image_box, self, "me_estimate_magnification_x", "Magnification H", labelWidth=260, valueType=float, orientation="horizontal")
+        oasysgui.lineEdit(self.me_estimate_image_box, self, "me_estimate_magnification_y", "Magnification V", labelWidth=260, valueType=float, orientation="horizontal")
+
+        self.me_estimate_user_box = oasysgui.widgetBox(self.me_estimate_box, "", addSpace=False, orientation="vertical", height=60)
+
+        oasysgui.lineEdit(self.me_estimate_user_box, self, "me_estimate_sigma_x", "\u03c3x [m]", labelWidth=260, valueType=float, orientation="horizontal")
+        oasysgui.lineEdit(self.me_estimate_user_box, self, "me_estimate_sigma_y", "\u03c3y [m]", labelWidth=260, valueType=float, orientation="horizontal")
+
+        gui.comboBox(self.me_estimate_box, self, "me_estimate_energy_spread", label="Energy spread (wavefronts with several energies)",
+                     items=["No", "Yes"], labelWidth=300,
+                     sendSelectedValue=False, orientation="horizontal")
+
+        self.set_me_estimate()
+
+    def set_me_estimate(self):
+        self.me_estimate_box.setEnabled(self.me_estimate == 1)
+        self.me_estimate_drift_box.setVisible(self.me_estimate_projection == 0)
+        self.me_estimate_image_box.setVisible(self.me_estimate_projection == 1)
+        self.me_estimate_user_box.setVisible(self.me_estimate_projection == 2)
+
+    def get_me_estimate_parameters(self):
+        '''
+        :return: projected rms sizes of the electron beam and relative energy spread, for the FFT convolution
+        '''
+        if self.me_estimate_projection == 2:
+            congruence.checkPositiveNumber(self.me_estimate_sigma_x, "\u03c3x")
+            congruence.checkPositiveNumber(self.me_estimate_sigma_y, "\u03c3y")
+
+        light_source = self.input_srw_data.get_srw_beamline().get_light_source()
+        electron_beam = light_source.get_electron_beam() if hasattr(light_source, "get_electron_beam") else None
+
+        if electron_beam is None:
+            if self.me_estimate_projection == 2: return self.me_estimate_sigma_x, self.me_estimate_sigma_y, 0.0
+            else: raise Exception("ME estimate: the source has no electron beam, use a user defined projection")
+
+        energy_spread = electron_beam.get_value_from_key_name("energy_spread") if self.me_estimate_energy_spread == 1 else 0.0
+
+        if self.me_estimate_projection == 2: return self.me_estimate_sigma_x, self.me_estimate_sigma_y, energy_spread
+
+        moments_x, moments_y = get_electron_beam_moments(electron_beam)
+
+        if self.me_estimate_projection == 0:
+            congruence.checkPositiveNumber(self.me_estimate_distance, "Distance from source")
+
+            return get_projected_sigma(moments_x, 1.0, self.me_estimate_distance), \
+                   get_projected_sigma(moments_y, 1.0, self.me_estimate_distance), energy_spread
+        else:
+            return get_projected_sigma(moments_x, self.me_estimate_magnification_x, 0.0), \
+                   get_projected_sigma(moments_y, self.me_estimate_magnification_y, 0.0), energy_spread
+
     def set_displacement(self):
         self.displacement_box.setVisible(self.has_displacement==1)
         self.displacement_box_empty.setVisible(self.has_displacement==0)
@@ -508,22 +624,51 @@ class OWSRWOpticalElement(SRWWavefrontViewer, WidgetDecorator):
             srw_beamline.append_beamline_element(beamline_element)
             working_srw_beamline.append_beamline_element(beamline_element)
 
+            # in whole beamline mode the final screen propagates all the elements at once: a single record
+            profile_record = SRWProfileRecord(element_name="Whole Beamline" if propagation_mode == SRWPropagationMode.WHOLE_BEAMLINE else optical_element.name,
+                                              widget_name=self.windowTitle(),
+                                              propagation_mode=self.srw_live_propagation_mode)
+            profile_record.set_mesh_before(input_wavefront)
+
             self.progressBarSet(20)
 
             if propagation_mode == SRWPropagationMode.WHOLE_BEAMLINE:
+                if not self.input_srw_data.get_coherent_modes() is None:
+                    raise ValueError("Coherent modes are propagated element by element only: change the propagation mode or the source")
+
+                self.coherent_modes = None
+
                 self.set_additional_parameters(beamline_element, None, srw_beamline)
                 self.set_additional_parameters(beamline_element, None, working_srw_beamline)
 
-                if hasattr(self, "is_final_screen") and self.is_final_screen == 1:
-                    propagation_parameters = PropagationParameters(wavefront=input_wavefront.duplicate(),
-                                                                   propagation_elements = None)
+                if self.whole_beamline_checkpoint == SRWPropagationStep.HDF5: congruence.checkFileName(self.checkpoint_file_name)
 
-                    propagation_parameters.set_additional_parameters("working_beamline", working_srw_beamline)
+                propagation_step = SRWPropagationStep(beamline_element,
+                                                      previous_step=self.input_srw_data.get_propagation_step(),
+                                                      owner=id(self),
+                                                      checkpoint=self.whole_beamline_checkpoint,
+                                                      checkpoint_file_name=self.checkpoint_file_name)
+                self.set_additional_parameters(beamline_element, None, propagation_step)
 
+                if hasattr(self, "is_final_screen") and self.is_final_screen == 1:
                     self.setStatusMessage("Begin Propagation")
 
-                    output_wavefront = propagator.do_propagation(propagation_parameters=propagation_parameters,
-                                                                 handler_name=handler_name)
+                    with profile_propagation(profile_record):
+                        profiled_propagator = SRWProfiledPropagator(propagator, profile_record)
+                        reuse_upstream_propagation = self.is_reuse_upstream_propagation()
+
+                        if reuse_upstream_propagation or \
+                                any([step.checkpoint != SRWPropagationStep.NO_CHECKPOINT for step in propagation_step.get_steps()]):
+                            output_wavefront = self.propagate_steps(profiled_propagator, handler_name, input_wavefront, propagation_step,
+                                                                    checkpoint_all=reuse_upstream_propagation)
+                        else:
+                            propagation_parameters = PropagationParameters(wavefront=input_wavefront.duplicate(),
+                                                                           propagation_elements = None)
+
+                            propagation_parameters.set_additional_parameters("working_beamline", working_srw_beamline)
+
+                            output_wavefront = profiled_propagator.do_propagation(propagation_parameters=propagation_parameters,
+                                                                                  handler_name=handler_name)
                     self.setStatusMessage("Propagation Completed")
 
                     output_srw_data = SRWData(srw_beamline=srw_beamline,
@@ -534,38 +679,63 @@ class OWSRWOpticalElement(SRWWavefrontViewer, WidgetDecorator):
 
                     output_srw_data = SRWData(srw_beamline=srw_beamline,
                                               srw_wavefront=input_wavefront)
+                    output_srw_data.set_propagation_step(propagation_step)
             else:
                 propagation_elements = PropagationElements()
                 propagation_elements.add_beamline_element(beamline_element)
 
+                resolution_reduction_factor = self.check_memory_budget_for_propagation(input_wavefront)
+
                 propagation_parameters = PropagationParameters(wavefront=input_wavefront.duplicate(),
                                                                propagation_elements = propagation_elements)
 
                 self.set_additional_parameters(beamline_element, propagation_parameters, srw_beamline)
+                self.reduce_resolution_at_resizing(propagation_parameters, resolution_reduction_factor)
 
                 self.setStatusMessage("Begin Propagation")
 
-                output_wavefront = propagator.do_propagation(propagation_parameters=propagation_parameters,
-                                                             handler_name=handler_name)
+                input_coherent_modes = self.input_srw_data.get_coherent_modes()
+
+                with profile_propagation(profile_record):
+                    if input_coherent_modes is None:
+                        output_wavefront = SRWProfiledPropagator(propagator, profile_record).do_propagation(propagation_parameters=propagation_parameters,
+                                                                                                           handler_name=handler_name)
+                        self.coherent_modes = None
+                    else:
+                        self.setStatusMessage("Propagating " + str(input_coherent_modes.get_number_of_modes()) + " coherent modes")
+
+                        with time_propagation(profile_record):
+                            self.coherent_modes = input_coherent_modes.propagate(lambda wavefront: self.get_mode_propagation_parameters(wavefront, beamline_element, propagation_elements, resolution_reduction_factor),
+                                                                                 handler_name)
+                        output_wavefront = self.coherent_modes.get_wavefronts()[0]
 
                 self.setStatusMessage("Propagation Completed")
 
                 output_srw_data = SRWData(srw_beamline=srw_beamline,
                                           srw_wavefront=output_wavefront)
+                output_srw_data.set_coherent_modes(self.coherent_modes)
+
+            input_propagation_profile = self.input_srw_data.get_propagation_profile()
+            propagation_profile = SRWPropagationProfile() if input_propagation_profile is None else input_propagation_profile.duplicate()
+
+            if not output_wavefront is None:
+                profile_record.set_mesh_after(output_wavefront)
+                propagation_profile.add_record(profile_record)
+
+            output_srw_data.set_propagation_profile(propagation_profile)
+            self.propagation_profile = propagation_profile
 
             self.progressBarSet(50)
 
             if not output_wavefront is None:
                 output_wavefront.setScanningData(self.input_srw_data.get_srw_wavefront().scanned_variable_data)
 
+                self.me_estimate_parameters = self.get_me_estimate_parameters() if self.me_estimate == 1 else None
+
                 self.output_wavefront = output_wavefront
                 self.initializeTabs()
 
-                tickets = []
-
-                self.run_calculation_for_plots(tickets=tickets, progress_bar_value=50)
-
-                self.plot_results(tickets, 80)
+                self.plot_output_wavefront(50)
 
             self.progressBarFinished()
             self.setStatusMessage("")
@@ -582,6 +752,161 @@ class OWSRWOpticalElement(SRWWavefrontViewer, WidgetDecorator):
 
             if self.IS_DEVELOP: raise e
 
+    def get_mode_propagation_parameters(self, wavefront, beamline_element, propagation_elements, resolution_reduction_factor=1.0):
+        propagation_parameters = PropagationParameters(wavefront=wavefront.duplicate(),
+                                                       propagation_elements = propagation_elements)
+
+        self.set_additional_parameters(beamline_element, propagation_parameters)
+        self.reduce_resolution_at_resizing(propagation_parameters, resolution_reduction_factor)
+
+        return propagation_parameters
+
+    def set_whole_beamline_checkpoint(self):
+        self.checkpoint_file_box.setVisible(self.whole_beamline_checkpoint == SRWPropagationStep.HDF5)
+
+    def select_checkpoint_file(self):
+        self.le_checkpoint_file_name.setText(oasysgui.selectFileFromDialog(self, self.checkpoint_file_name, "Checkpoint File"))
+
+    def is_reuse_upstream_propagation(self):
+        return False
+
+    def propagate_steps(self, propagator, handler_name, source_wavefront, last_step, checkpoint_all=True):
+        '''
+        Whole beamline propagation resuming from the last stored checkpoint of the beamline. The beamline is propagated
+        in segments ending at the elements with a checkpoint requested by the user or, if checkpoint_all, at every
+        element: in this case propagations sharing the same upstream elements (e.g. several final screens) resume
+        from the last common element instead of the source.
+        '''
+        checkpoint_store = SRWCheckpointStore.Instance()
+
+        steps = last_step.get_steps()
+
+        start_index, wavefront = checkpoint_store.find_last_checkpoint(source_wavefront, steps)
+
+        if wavefront is None: wavefront = source_wavefront
+        else: self.setStatusMessage("Resuming propagation after element " + str(start_index) + " of " + str(len(steps)))
+
+        segment_start = start_index
+        for index in range(start_index, len(steps)):
+            if index == len(steps) - 1 or checkpoint_all or steps[index].checkpoint != SRWPropagationStep.NO_CHECKPOINT:
+                wavefront = propagate_segment(propagator, handler_name, wavefront, steps[segment_start:index+1])
+                segment_start = index + 1
+
+                if index < len(steps) - 1 or steps[index].checkpoint != SRWPropagationStep.NO_CHECKPOINT:
+                    checkpoint_store.store_checkpoint(source_wavefront, steps[index], wavefront)
+
+        return wavefront
+
+    def get_mesh_stages(self, resolution_reduction_factor=1.0):
+        stages = []
+
+        if self.p != 0.0:
+            stages.append(SRWMeshStage(name="Drift Space Before",
+                                       distance=self.p,
+                                       auto_resize=self.drift_before_auto_resize_before_propagation==1 or self.drift_before_auto_resize_after_propagation==1,
+                                       relative_precision=self.drift_before_relative_precision_for_propagation_with_autoresizing,
+                                       semianalytical_treatment=self.drift_before_allow_semianalytical_treatment_of_quadratic_phase_term!=0,
+                                       horizontal_range_factor=self.drift_before_horizontal_range_modification_factor_at_resizing,
+                                       horizontal_resolution_factor=self.drift_before_horizontal_resolution_modification_factor_at_resizing*resolution_reduction_factor,
+                                       vertical_range_factor=self.drift_before_vertical_range_modification_factor_at_resizing,
+                                       vertical_resolution_factor=self.drift_before_vertical_resolution_modification_factor_at_resizing*resolution_reduction_factor))
+        if self.has_oe_wavefront_propagation_parameters_tab:
+            stages.append(SRWMeshStage(name="Optical Element",
+                                       auto_resize=self.oe_auto_resize_before_propagation==1 or self.oe_auto_resize_after_propagation==1,
+                                       relative_precision=self.oe_relative_precision_for_propagation_with_autoresizing,
+                                       semianalytical_treatment=self.oe_allow_semianalytical_treatment_of_quadratic_phase_term!=0,
+                                       horizontal_range_factor=self.oe_horizontal_range_modification_factor_at_resizing,
+                                       horizontal_resolution_factor=self.oe_horizontal_resolution_modification_factor_at_resizing*resolution_reduction_factor,
+                                       vertical_range_factor=self.oe_vertical_range_modification_factor_at_resizing,
+                                       vertical_resolution_factor=self.oe_vertical_resolution_modification_factor_at_resizing*resolution_reduction_factor))
+        if self.q != 0.0:
+            stages.append(SRWMeshStage(name="Drift Space After",
+                                       distance=self.q,
+                                       auto_resize=self.drift_auto_resize_before_propagation==1 or self.drift_auto_resize_after_propagation==1,
+                                       relative_precision=self.drift_relative_precision_for_propagation_with_autoresizing,
+                                       semianalytical_treatment=self.drift_allow_semianalytical_treatment_of_quadratic_phase_term!=0,
+                                       horizontal_range_factor=self.drift_horizontal_range_modification_factor_at_resizing,
+                                       horizontal_resolution_factor=self.drift_horizontal_resolution_modification_factor_at_resizing*resolution_reduction_factor,
+                                       vertical_range_factor=self.drift_vertical_range_modification_factor_at_resizing,
+                                       vertical_resolution_factor=self.drift_vertical_resolution_modification_factor_at_resizing*resolution_reduction_factor))
+
+        return stages
+
+    def estimate_mesh(self, input_wavefront, resolution_reduction_factor=1.0):
+        mesh = input_wavefront.mesh
+
+        return estimate_propagation_mesh(nx=mesh.nx,
+                                         ny=mesh.ny,
+                                         ne=mesh.ne,
+                                         photon_energy=0.5*(mesh.eStart + mesh.eFin),
+                                         x_range=mesh.xFin - mesh.xStart,
+                                         y_range=mesh.yFin - mesh.yStart,
+                                         Rx=input_wavefront.Rx,
+                                         Ry=input_wavefront.Ry,
+                                         stages=self.get_mesh_stages(resolution_reduction_factor))
+
+    def show_mesh_estimate(self):
+        try:
+            if self.input_srw_data is None: raise Exception("No Input Data")
+
+            estimates = self.estimate_mesh(self.input_srw_data.get_srw_wavefront())
+
+            QMessageBox.information(self, "Estimated Mesh",
+                                    "\n".join([str(estimate) for estimate in estimates]) + \
+                                    "\n\nEstimated peak memory: {0:.3g} GB (budget: {1:.3g} GB)".format(get_peak_memory(estimates), self.memory_budget),
+                                    QMessageBox.Ok)
+        except Exception as exception:
+            QMessageBox.critical(self, "Error", str(exception), QMessageBox.Ok)
+
+            if self.IS_DEVELOP: raise exception
+
+    def check_memory_budget_for_propagation(self, input_wavefront):
+        '''
+        :return: factor reducing the resolution modification factors of this propagation only, to fit the memory budget
+        '''
+        if self.check_memory_budget == 1:
+            congruence.checkStrictlyPositiveNumber(self.memory_budget, "Memory Budget")
+
+            estimates = self.estimate_mesh(input_wavefront)
+            peak_memory = get_peak_memory(estimates)
+
+            if peak_memory > self.memory_budget:
+                reduction_factor = get_reduction_factor(estimates, self.memory_budget)
+
+                if reduction_factor is None:
+                    raise Exception("Estimated peak memory ({0:.3g} GB) exceeds the budget ({1:.3g} GB)\n\n".format(peak_memory, self.memory_budget) +
+                                    "\n".join([str(estimate) for estimate in estimates]) +
+                                    "\n\nThe largest mesh is set by the sampling of the quadratic phase term, not by the resolution modification factors: " +
+                                    "allow the semi-analytical treatment of the quadratic phase term or reduce the relative precision for propagation with autoresizing")
+
+                if ConfirmDialog.confirmed(parent=self, message="Estimated peak memory ({0:.3g} GB) exceeds the budget ({1:.3g} GB)\n\n".format(peak_memory, self.memory_budget) +
+                                                                "\n".join([str(estimate) for estimate in estimates]) +
+                                                                "\n\nReduce all the resolution modification factors by {0:.3g} for this propagation and continue?".format(reduction_factor)):
+                    peak_memory = get_peak_memory(self.estimate_mesh(input_wavefront, reduction_factor))
+
+                    if peak_memory > self.memory_budget:
+                        raise Exception("Estimated peak memory ({0:.3g} GB) still exceeds the budget: reduce the relative precision for propagation with autoresizing or use a quadratic term propagator".format(peak_memory))
+
+                    return reduction_factor
+                else:
+                    raise Exception("Propagation aborted: estimated peak memory ({0:.3g} GB) exceeds the budget ({1:.3g} GB)".format(peak_memory, self.memory_budget))
+
+        return 1.0
+
+    def reduce_resolution_at_resizing(self, propagation_parameters, reduction_factor):
+        '''
+        Applies the reduction to the wavefront propagation parameters of this propagation, the settings are unchanged
+        '''
+        if reduction_factor == 1.0: return
+
+        for name in ["srw_drift_before_wavefront_propagation_parameters", "srw_oe_wavefront_propagation_parameters", "srw_drift_after_wavefront_propagation_parameters"]:
+            if propagation_parameters.has_additional_parameter(name):
+                wavefront_propagation_parameters = propagation_parameters.get_additional_parameter(name)
+
+                if not wavefront_propagation_parameters is None:
+                    wavefront_propagation_parameters._horizontal_resolution_modification_factor_at_resizing *= reduction_factor
+                    wavefront_propagation_parameters._vertical_resolution_modification_factor_at_resizing *= reduction_factor
+
     def set_additional_parameters(self, beamline_element, propagation_parameters=None, beamline=None):
         from wofrysrw.beamline.srw_beamline import Where
 
@@ -723,39 +1048,40 @@ class OWSRWOpticalElement(SRWWavefrontViewer, WidgetDecorator):
             if self.is_automatic_run:
                 self.propagate_wavefront()
 
-    def run_calculation_for_plots(self, tickets, progress_bar_value):
-        if self.view_type==2:
-            e, h, v, i = self.output_wavefront.get_intensity(multi_electron=False, polarization_component_to_be_extracted=PolarizationComponent.LINEAR_HORIZONTAL)
-
-            tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)]))
-
-            self.progressBarSet(progress_bar_value)
-
-            e, h, v, i = self.output_wavefront.get_intensity(multi_electron=False, polarization_component_to_be_extracted=PolarizationComponent.LINEAR_VERTICAL)
-
-            tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)]))
-
-            e, h, v, i = self.output_wavefront.get_phase(polarization_component_to_be_extracted=PolarizationComponent.LINEAR_HORIZONTAL)
-
-            tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)]))
-
-            self.progressBarSet(progress_bar_value + 10)
+    def is_lazy_plotting(self):
+        return True
 
-            e, h, v, i = self.output_wavefront.get_phase(polarization_component_to_be_extracted=PolarizationComponent.LINEAR_VERTICAL)
+    def get_ticket_calculators(self):
+        return self.get_single_electron_ticket_calculators() + self.get_additional_ticket_calculators()
 
-            tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)]))
+    def get_single_electron_ticket_calculators(self):
+        if self.view_type==2:
+            return [lambda extraction: extraction.get_intensity_ticket(PolarizationComponent.LINEAR_HORIZONTAL),
+                    lambda extraction: extraction.get_intensity_ticket(PolarizationComponent.LINEAR_VERTICAL),
+                    lambda extraction: extraction.get_phase_ticket(PolarizationComponent.LINEAR_HORIZONTAL),
+                    lambda extraction: extraction.get_phase_ticket(PolarizationComponent.LINEAR_VERTICAL)]
         elif self.view_type==1:
-            e, h, v, i = self.output_wavefront.get_intensity(multi_electron=False)
+            return [lambda extraction: extraction.get_intensity_ticket(),
+                    lambda extraction: extraction.get_phase_ticket()]
+        else:
+            return []
 
-            tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)]))
+    def has_coherent_modes(self):
+        return not self.coherent_modes is None
 
-            self.progressBarSet(progress_bar_value)
+    def has_me_estimate(self):
+        return not self.me_estimate_parameters is None
 
-            e, h, v, i = self.output_wavefront.get_phase()
+    def get_additional_ticket_calculators(self):
+        '''
+        plots added after the specific ones of the element: ME estimate, coherent modes
+        '''
+        ticket_calculators = []
 
-            tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)]))
+        if self.has_me_estimate(): ticket_calculators.append(lambda extraction: extraction.get_intensity_estimate_ticket(*self.me_estimate_parameters))
+        if self.has_coherent_modes(): ticket_calculators.append(lambda extraction: self.coherent_modes.get_intensity_ticket())
 
-            self.progressBarSet(progress_bar_value + 10)
+        return ticket_calculators
 
     def receive_syned_data(self, data):
         if not data is None:
@@ -825,46 +1151,46 @@ class OWSRWOpticalElement(SRWWavefrontViewer, WidgetDecorator):
 
     def getVariablesToPlot(self):
         if self.view_type == 2:
-            return [[1, 2], [1, 2], [1, 2], [1, 2]]
+            variables = [[1, 2], [1, 2], [1, 2], [1, 2]]
         else:
-            return [[1, 2], [1, 2]]
+            variables = [[1, 2], [1, 2]]
+
+        return variables + [[1, 2]]*len(self.get_additional_titles())
 
     def getTitles(self, with_um=False):
         if self.view_type == 2:
-            if with_um: return ["Intensity SE \u03c0 [ph/s/.1%bw/mm\u00b2]",
-                                "Intensity SE \u03c3 [ph/s/.1%bw/mm\u00b2]",
-                                "Phase SE \u03c0 [rad]",
-                                "Phase SE \u03c3 [rad]"]
-            else: return ["Intensity SE \u03c0",
-                          "Intensity SE \u03c3",
-                          "Phase SE \u03c0",
-                          "Phase SE \u03c3"]
+            if with_um: titles = ["Intensity SE \u03c0 [ph/s/.1%bw/mm\u00b2]",
+                                  "Intensity SE \u03c3 [ph/s/.1%bw/mm\u00b2]",
+                                  "Phase SE \u03c0 [rad]",
+                                  "Phase SE \u03c3 [rad]"]
+            else: titles = ["Intensity SE \u03c0",
+                            "Intensity SE \u03c3",
+                            "Phase SE \u03c0",
+                            "Phase SE \u03c3"]
         else:
-            if with_um: return ["Intensity SE [ph/s/.1%bw/mm\u00b2]",
-                                "Phase SE [rad]"]
-            else: return ["Intensity SE",
-                          "Phase SE"]
+            if with_um: titles = ["Intensity SE [ph/s/.1%bw/mm\u00b2]",
+                                  "Phase SE [rad]"]
+            else: titles = ["Intensity SE",
+                            "Phase SE"]
+
+        return titles + self.get_additional_titles(with_um)
+
+    def get_additional_titles(self, with_um=False):
+        titles = []
+
+        if self.has_me_estimate(): titles.append("Intensity ME (FFT Estimate) [ph/s/.1%bw/mm\u00b2]" if with_um else "Intensity ME (FFT Estimate)")
+        if self.has_coherent_modes(): titles.append("Intensity (Coherent Modes) [ph/s/.1%bw/mm\u00b2]" if with_um else "Intensity (Coherent Modes)")
+
+        return titles
 
     def getXTitles(self):
-        if self.view_type == 2:
-            return ["X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]"]
-        else:
-            return ["X [\u03bcm]", "X [\u03bcm]"]
+        return ["X [\u03bcm]"]*len(self.getVariablesToPlot())
 
     def getYTitles(self):
-        if self.view_type == 2:
-            return ["Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]"]
-        else:
-            return ["Y [\u03bcm]", "Y [\u03bcm]"]
+        return ["Y [\u03bcm]"]*len(self.getVariablesToPlot())
 
     def getXUM(self):
-        if self.view_type == 2:
-            return ["X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]"]
-        else:
-            return ["X [\u03bcm]", "X [\u03bcm]"]
+        return ["X [\u03bcm]"]*len(self.getVariablesToPlot())
 
     def getYUM(self):
-        if self.view_type == 2:
-            return ["Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]"]
-        else:
-            return ["Y [\u03bcm]", "Y [\u03bcm]"]
+        return ["Y [\u03bcm]"]*len(self.getVariablesToPlot())
@@ -0,0 +1,144 @@
+import os
+
+from PyQt5 import QtGui, QtWidgets
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QFileDialog, QLabel
+
+from orangewidget import gui
+from oasys.widgets import gui as oasysgui
+from oasys.widgets import congruence
+
+from orangecontrib.srw.util.srw_script_runner import SRWScriptJob, SRWScriptJobRunner
+
+class SRWScriptJobsWidget(object):
+    '''
+    Mixin of the widgets running their python script in child processes (SRWScriptJobRunner): buttons, jobs, their
+    status and output. The widget needs a pythonScript and a shadow_output text area and implements create_jobs.
+    '''
+    max_concurrent_jobs = SRWScriptJobRunner.DEFAULT_MAX_JOBS # global setting of the runner, shared by all the script widgets
+
+    def create_jobs_box(self, parent):
+        button_box = oasysgui.widgetBox(parent, "", addSpace=True, orientation="horizontal")
+
+        gui.button(button_box, self, "Run Script", callback=self.execute_script, height=40)
+        gui.button(button_box, self, "Cancel", callback=self.cancel_script, height=40)
+        gui.button(button_box, self, "Save Script to File", callback=self.save_script, height=40)
+
+        job_box = oasysgui.widgetBox(parent, "", addSpace=False, orientation="horizontal")
+
+        self.max_concurrent_jobs = SRWScriptJobRunner.Instance().get_max_jobs()
+
+        oasysgui.lineEdit(job_box, self, "max_concurrent_jobs", "Max Concurrent Jobs\n(all the scripts)", labelWidth=150, valueType=int, orientation="horizontal",
+                          callback=self.set_max_concurrent_jobs)
+
+        self.job_status = QLabel("No job")
+        job_box.layout().addWidget(self.job_status)
+
+        self.jobs = []
+
+        self.job_timer = QTimer(self)
+        self.job_timer.timeout.connect(self.update_job_status)
+
+    def set_max_concurrent_jobs(self):
+        job_runner = SRWScriptJobRunner.Instance()
+
+        try:
+            congruence.checkStrictlyPositiveNumber(self.max_concurrent_jobs, "Max Concurrent Jobs")
+
+            job_runner.set_max_jobs(self.max_concurrent_jobs)
+        except Exception as e:
+            self.max_concurrent_jobs = job_runner.get_max_jobs()
+
+            QtWidgets.QMessageBox.critical(self, "Error", str(e), QtWidgets.QMessageBox.Ok)
+
+            if self.IS_DEVELOP: raise e
+
+    def create_jobs(self):
+        '''
+        :return: list of SRWScriptJob to be submitted
+        '''
+        raise NotImplementedError()
+
+    def jobs_ended(self):
+        pass
+
+    def execute_script(self):
+        if self.is_running():
+            QtWidgets.QMessageBox.critical(self, "Error", "A script is already running: cancel it or wait for its completion", QtWidgets.QMessageBox.Ok)
+        else:
+            try:
+                job_runner = SRWScriptJobRunner.Instance()
+
+                # the limit may have been changed by another widget
+                self.max_concurrent_jobs = job_runner.get_max_jobs()
+
+                self.shadow_output.setText("")
+
+                self.jobs = self.create_jobs()
+
+                for job in self.jobs:
+                    job.output_received.connect(self.writeStdOut)
+                    job.state_changed.connect(self.update_job_status)
+
+                    job_runner.submit(job)
+
+                self.update_job_status()
+                self.job_timer.start(1000)
+            except Exception as e:
+                QtWidgets.QMessageBox.critical(self, "Error", str(e), QtWidgets.QMessageBox.Ok)
+
+                if self.IS_DEVELOP: raise e
+
+    def is_running(self):
+        return len([job for job in self.jobs if job.is_active()]) > 0
+
+    def cancel_script(self):
+        for job in self.jobs: job.cancel()
+
+    def onDeleteWidget(self):
+        self.cancel_script()
+
+        super().onDeleteWidget()
+
+    def get_jobs_status(self):
+        if len(self.jobs) == 1: return self.jobs[0].get_status()
+
+        macro_electrons = sum([job.get_macro_electrons() for job in self.jobs])
+        number_of_macro_electrons = sum([job.get_number_of_macro_electrons() or 0 for job in self.jobs])
+        states = [job.get_state() for job in self.jobs]
+
+        return "Processes: " + str(states.count(SRWScriptJob.RUNNING)) + " running, " + str(states.count(SRWScriptJob.QUEUED)) + " queued, " + \
+               str(states.count(SRWScriptJob.FINISHED)) + " finished, elapsed {0:.0f} s, macro-electrons: {1}/{2}".format(max([job.get_elapsed_time() for job in self.jobs]),
+                                                                                                                         macro_electrons, number_of_macro_electrons)
+
+    def update_job_status(self, state=None):
+        if len(self.jobs) > 0:
+            self.job_status.setText(self.get_jobs_status())
+
+            if not self.is_running() and self.job_timer.isActive():
+                self.job_timer.stop()
+
+                for job in self.jobs:
+                    if job.get_state() != SRWScriptJob.FINISHED: self.writeStdOut("\n" + job.get_name() + ": " + job.get_state_name() + "\n")
+
+                self.jobs_ended()
+
+    def writeStdOut(self, text):
+        cursor = self.shadow_output.textCursor()
+        cursor.movePosition(QtGui.QTextCursor.End)
+        cursor.insertText(text)
+        self.shadow_output.setTextCursor(cursor)
+        self.shadow_output.ensureCursorVisible()
+
+    def save_script(self):
+        file_name = QFileDialog.getSaveFileName(self, "Save File to Disk", os.getcwd(), filter='*.py')[0]
+
+        if not file_name is None:
+            if not file_name.strip() == "":
+                file = open(file_name, "w")
+                file.write(str(self.pythonScript.toPlainText()))
+                file.close()
+
+                QtWidgets.QMessageBox.information(self, "QMessageBox.information()",
+                                              "File " + file_name + " written to disk",
+                                              QtWidgets.QMessageBox.Ok)
@@ -3,7 +3,7 @@ __author__ = 'labx'
 import os, sys, numpy
 
 from PyQt5.QtGui import QPalette, QColor, QFont
-from PyQt5.QtWidgets import QMessageBox
+from PyQt5.QtWidgets import QMessageBox, QFileDialog
 from orangewidget import gui
 from orangewidget import widget
 from orangewidget.settings import Setting
@@ -22,8 +22,10 @@ from wofrysrw.propagator.wavefront2D.srw_wavefront import WavefrontParameters, W
 from wofrysrw.storage_ring.srw_electron_beam import SRWElectronBeam
 from wofrysrw.beamline.srw_beamline import SRWBeamline
 
-from orangecontrib.srw.util.srw_util import SRWPlot
 from orangecontrib.srw.util.srw_objects import SRWData
+from orangecontrib.srw.util.srw_preview import get_electron_beam_sigmas_from_twiss
+from orangecontrib.srw.util.srw_wavefront_cache import SRWWavefrontCache
+from orangecontrib.srw.util.srw_profiling import SRWProfileRecord, SRWPropagationProfile, profile_propagation, time_propagation
 from orangecontrib.srw.widgets.gui.ow_srw_wavefront_viewer import SRWWavefrontViewer
 
 class OWSRWSource(SRWWavefrontViewer, WidgetDecorator):
@@ -46,6 +48,8 @@ class OWSRWSource(SRWWavefrontViewer, WidgetDecorator):
 
     source_name = None
 
+    propagation_profile = None
+
     electron_energy_in_GeV = Setting(2.0)
     electron_energy_spread = Setting(0.0007)
     ring_current = Setting(0.4)
@@ -96,6 +100,12 @@ class OWSRWSource(SRWWavefrontViewer, WidgetDecorator):
     wf_use_terminating_terms = Setting(1)
     wf_sampling_factor_for_adjusting_nx_ny = Setting(0.0)
 
+    use_wavefront_cache = Setting(0)
+    wavefront_cache_directory = Setting(SRWWavefrontCache.DEFAULT_DIRECTORY)
+    wavefront_cache_max_size = Setting(2.0)
+
+    preview_automatic = Setting(1)
+
     TABS_AREA_HEIGHT = 618
     CONTROL_AREA_WIDTH = 405
 
@@ -140,8 +150,8 @@ class OWSRWSource(SRWWavefrontViewer, WidgetDecorator):
         left_box_1 = oasysgui.widgetBox(self.tab_source, "Electron Beam Parameters", addSpace=True, orientation="vertical", height=380)
 
         oasysgui.lineEdit(left_box_1, self, "electron_energy_in_GeV", "Energy [GeV]", labelWidth=260, valueType=float, orientation="horizontal", callback=self.callback_electron_energy)
-        oasysgui.lineEdit(left_box_1, self, "electron_energy_spread", "Energy Spread", labelWidth=260, valueType=float, orientation="horizontal")
-        oasysgui.lineEdit(left_box_1, self, "ring_current", "Ring Current [A]", labelWidth=260, valueType=float, orientation="horizontal")
+        oasysgui.lineEdit(left_box_1, self, "electron_energy_spread", "Energy Spread", labelWidth=260, valueType=float, orientation="horizontal", callback=self.update_preview)
+        oasysgui.lineEdit(left_box_1, self, "ring_current", "Ring Current [A]", labelWidth=260, valueType=float, orientation="horizontal", callback=self.update_preview)
 
         tab_electron = oasysgui.tabWidget(left_box_1)
 
@@ -159,21 +169,21 @@ class OWSRWSource(SRWWavefrontViewer, WidgetDecorator):
 
         gui.separator(self.left_box_2_1)
 
-        oasysgui.lineEdit(self.left_box_2_1, self, "moment_xx", "\u03c3x\u22c5\u03c3x   [m\u00b2]", labelWidth=200, valueType=float, orientation="horizontal")
+        oasysgui.lineEdit(self.left_box_2_1, self, "moment_xx", "\u03c3x\u22c5\u03c3x   [m\u00b2]", labelWidth=200, valueType=float, orientation="horizontal", callback=self.update_preview)
         oasysgui.lineEdit(self.left_box_2_1, self, "moment_xxp", "\u03c3x\u22c5\u03c3x'  [m\u22c5rad]", labelWidth=200, valueType=float, orientation="horizontal")
-        oasysgui.lineEdit(self.left_box_2_1, self, "moment_xpxp", "\u03c3x'\u22c5\u03c3x' [rad\u00b2]", labelWidth=200, valueType=float, orientation="horizontal")
-        oasysgui.lineEdit(self.left_box_2_1, self, "moment_yy", "\u03c3y\u22c5\u03c3y   [m\u00b2]", labelWidth=200, valueType=float, orientation="horizontal")
+        oasysgui.lineEdit(self.left_box_2_1, self, "moment_xpxp", "\u03c3x'\u22c5\u03c3x' [rad\u00b2]", labelWidth=200, valueType=float, orientation="horizontal", callback=self.update_preview)
+        oasysgui.lineEdit(self.left_box_2_1, self, "moment_yy", "\u03c3y\u22c5\u03c3y   [m\u00b2]", labelWidth=200, valueType=float, orientation="horizontal", callback=self.update_preview)
         oasysgui.lineEdit(self.left_box_2_1, self, "moment_yyp", "\u03c3y\u22c5\u03c3y'  [m\u22c5rad]", labelWidth=200, valueType=float, orientation="horizontal")
-        oasysgui.lineEdit(self.left_box_2_1, self, "moment_ypyp", "\u03c3y'\u22c5\u03c3y' [rad\u00b2]", labelWidth=200, valueType=float, orientation="horizontal")
+        oasysgui.lineEdit(self.left_box_2_1, self, "moment_ypyp", "\u03c3y'\u22c5\u03c3y' [rad\u00b2]", labelWidth=200, valueType=float, orientation="horizontal", callback=self.update_preview)
 
         self.left_box_2_2 = oasysgui.widgetBox(tab_beam, "", addSpace=False, orientation="vertical", height=185)
 
         gui.separator(self.left_box_2_2)
 
-        oasysgui.lineEdit(self.left_box_2_2, self, "electron_beam_size_h",       "\u03c3x [m]", labelWidth=200, valueType=float, orientation="horizontal")
-        oasysgui.lineEdit(self.left_box_2_2, self, "electron_beam_size_v",       "\u03c3y [m]",  labelWidth=200, valueType=float, orientation="horizontal")
-        oasysgui.lineEdit(self.left_box_2_2, self, "electron_beam_divergence_h", "\u03c3x' [rad]", labelWidth=200, valueType=float, orientation="horizontal")
-        oasysgui.lineEdit(self.left_box_2_2, self, "electron_beam_divergence_v", "\u03c3y' [rad]", labelWidth=200, valueType=float, orientation="horizontal")
+        oasysgui.lineEdit(self.left_box_2_2, self, "electron_beam_size_h",       "\u03c3x [m]", labelWidth=200, valueType=float, orientation="horizontal", callback=self.update_preview)
+        oasysgui.lineEdit(self.left_box_2_2, self, "electron_beam_size_v",       "\u03c3y [m]",  labelWidth=200, valueType=float, orientation="horizontal", callback=self.update_preview)
+        oasysgui.lineEdit(self.left_box_2_2, self, "electron_beam_divergence_h", "\u03c3x' [rad]", labelWidth=200, valueType=float, orientation="horizontal", callback=self.update_preview)
+        oasysgui.lineEdit(self.left_box_2_2, self, "electron_beam_divergence_v", "\u03c3y' [rad]", labelWidth=200, valueType=float, orientation="horizontal", callback=self.update_preview)
 
         self.left_box_2_3 = oasysgui.widgetBox(tab_beam, "", addSpace=False, orientation="horizontal", height=185)
 
@@ -183,16 +193,16 @@ class OWSRWSource(SRWWavefrontViewer, WidgetDecorator):
         gui.separator(left_box_2_3_l)
         gui.separator(left_box_2_3_r)
 
-        oasysgui.lineEdit(left_box_2_3_l, self, "horizontal_emittance", "Emittance x [m]", labelWidth=100, valueType=float, orientation="horizontal")
-        oasysgui.lineEdit(left_box_2_3_l, self, "horizontal_beta"     , "\u03B2x [m]"    , labelWidth=100, valueType=float, orientation="horizontal")
-        oasysgui.lineEdit(left_box_2_3_l, self, "horizontal_alpha"    , "\u03B1x [rad]"    , labelWidth=100, valueType=float, orientation="horizontal")
-        oasysgui.lineEdit(left_box_2_3_l, self, "horizontal_eta"      , "\u03B7x [m]"    , labelWidth=100, valueType=float, orientation="horizontal")
-        oasysgui.lineEdit(left_box_2_3_l, self, "horizontal_etap"     , "\u03B7x' [rad]"   , labelWidth=100, valueType=float, orientation="horizontal")
-        oasysgui.lineEdit(left_box_2_3_r, self, "vertical_emittance"  , "Emittance y [m]", labelWidth=100, valueType=float, orientation="horizontal")
-        oasysgui.lineEdit(left_box_2_3_r, self, "vertical_beta"       , "\u03B2y [m]"    , labelWidth=100, valueType=float, orientation="horizontal")
-        oasysgui.lineEdit(left_box_2_3_r, self, "vertical_alpha"      , "\u03B1y [rad]"    , labelWidth=100, valueType=float, orientation="horizontal")
-        oasysgui.lineEdit(left_box_2_3_r, self, "vertical_eta"        , "\u03B7y [m]"    , labelWidth=100, valueType=float, orientation="horizontal")
-        oasysgui.lineEdit(left_box_2_3_r, self, "vertical_etap"       , "\u03B7y' [rad]"   , labelWidth=100, valueType=float, orientation="horizontal")
+        oasysgui.lineEdit(left_box_2_3_l, self, "horizontal_emittance", "Emittance x [m]", labelWidth=100, valueType=float, orientation="horizontal", callback=self.update_preview)
+        oasysgui.lineEdit(left_box_2_3_l, self, "horizontal_beta"     , "\u03B2x [m]"    , labelWidth=100, valueType=float, orientation="horizontal", callback=self.update_preview)
+        oasysgui.lineEdit(left_box_2_3_l, self, "horizontal_alpha"    , "\u03B1x [rad]"    , labelWidth=100, valueType=float, orientation="horizontal", callback=self.update_preview)
+        oasysgui.lineEdit(left_box_2_3_l, self, "horizontal_eta"      , "\u03B7x [m]"    , labelWidth=100, valueType=float, orientation="horizontal", callback=self.update_preview)
+        oasysgui.lineEdit(left_box_2_3_l, self, "horizontal_etap"     , "\u03B7x' [rad]"   , labelWidth=100, valueType=float, orientation="horizontal", callback=self.update_preview)
+        oasysgui.lineEdit(left_box_2_3_r, self, "vertical_emittance"  , "Emittance y [m]", labelWidth=100, valueType=float, orientation="horizontal", callback=self.update_preview)
+        oasysgui.lineEdit(left_box_2_3_r, self, "vertical_beta"       , "\u03B2y [m]"    , labelWidth=100, valueType=float, orientation="horizontal", callback=self.update_preview)
+        oasysgui.lineEdit(left_box_2_3_r, self, "vertical_alpha"      , "\u03B1y [rad]"    , labelWidth=100, valueType=float, orientation="horizontal", callback=self.update_preview)
+        oasysgui.lineEdit(left_box_2_3_r, self, "vertical_eta"        , "\u03B7y [m]"    , labelWidth=100, valueType=float, orientation="horizontal", callback=self.update_preview)
+        oasysgui.lineEdit(left_box_2_3_r, self, "vertical_etap"       , "\u03B7y' [rad]"   , labelWidth=100, valueType=float, orientation="horizontal", callback=self.update_preview)
 
         self.set_TypeOfProperties()
 
@@ -252,13 +262,157 @@ class OWSRWSource(SRWWavefrontViewer, WidgetDecorator):
 
         oasysgui.lineEdit(pre_box, self, "wf_sampling_factor_for_adjusting_nx_ny", "Sampling factor for adjusting nx/ny\n(effective if > 0)", labelWidth=260, valueType=int, orientation="horizontal")
 
+        # CACHE -------------------------------------------
+
+        tab_cache = oasysgui.createTabPage(self.tabs_plots_setting, "Cache")
+
+        cache_box = oasysgui.widgetBox(tab_cache, "Wavefront Cache", addSpace=True, orientation="vertical")
+
+        gui.comboBox(cache_box, self, "use_wavefront_cache", label="Reuse previously calculated wavefronts",
+                     items=["No", "Yes"], labelWidth=260,
+                     sendSelectedValue=False, orientation="horizontal", callback=self.set_UseWavefrontCache)
+
+        self.cache_box_1 = oasysgui.widgetBox(cache_box, "", addSpace=False, orientation="vertical")
+
+        directory_box = oasysgui.widgetBox(self.cache_box_1, "", addSpace=False, orientation="horizontal")
+        self.le_wavefront_cache_directory = oasysgui.lineEdit(directory_box, self, "wavefront_cache_directory", "Directory", labelWidth=80, valueType=str, orientation="horizontal")
+        gui.button(directory_box, self, "...", callback=self.selectWavefrontCacheDirectory)
+
+        oasysgui.lineEdit(self.cache_box_1, self, "wavefront_cache_max_size", "Max Size [GB]", labelWidth=260, valueType=float, orientation="horizontal")
+
+        gui.button(self.cache_box_1, self, "Clear Cache", callback=self.clearWavefrontCache)
+
+        self.set_UseWavefrontCache()
+
+        # PREVIEW -------------------------------------------
+
+        if self.has_preview():
+            tab_preview = oasysgui.createTabPage(self.tabs_setting, "Preview")
+
+            preview_box = oasysgui.widgetBox(tab_preview, "Analytic Preview (approximated)", addSpace=False, orientation="vertical")
+
+            gui.comboBox(preview_box, self, "preview_automatic", label="Update at every change of parameters",
+                         items=["No", "Yes"], labelWidth=260,
+                         sendSelectedValue=False, orientation="horizontal", callback=self.update_preview)
+
+            self.build_preview_box(preview_box)
+
+            gui.button(preview_box, self, "Update Preview", callback=self.calculate_preview)
+
+            self.preview_output = oasysgui.textArea(height=130, width=self.CONTROL_AREA_WIDTH-35, readOnly=True)
+            preview_box.layout().addWidget(self.preview_output)
+
+            tabs_preview = oasysgui.tabWidget(tab_preview)
+
+            self.preview_canvas = []
+            for title in self.get_preview_titles():
+                tab = oasysgui.createTabPage(tabs_preview, title)
+
+                plot_canvas = oasysgui.plotWindow(roi=False, control=False, position=True, logScale=True)
+                plot_canvas.setDefaultPlotLines(True)
+                plot_canvas.setActiveCurveColor(color='blue')
+
+                tab.layout().addWidget(plot_canvas)
+                self.preview_canvas.append(plot_canvas)
+
         gui.rubber(self.controlArea)
 
+    def set_UseWavefrontCache(self):
+        self.cache_box_1.setVisible(self.use_wavefront_cache==1)
+
+    def selectWavefrontCacheDirectory(self):
+        directory = QFileDialog.getExistingDirectory(self, "Wavefront Cache Directory", self.wavefront_cache_directory)
+
+        if directory: self.le_wavefront_cache_directory.setText(directory)
+
+    def get_wavefront_cache(self):
+        congruence.checkEmptyString(self.wavefront_cache_directory, "Wavefront Cache Directory")
+        congruence.checkStrictlyPositiveNumber(self.wavefront_cache_max_size, "Wavefront Cache Max Size")
+
+        wavefront_cache = SRWWavefrontCache.Instance()
+        wavefront_cache.set_directory(self.wavefront_cache_directory)
+        wavefront_cache.set_max_size(self.wavefront_cache_max_size)
+
+        return wavefront_cache
+
+    def clearWavefrontCache(self):
+        try:
+            self.get_wavefront_cache().clear()
+        except Exception as exception:
+            QMessageBox.critical(self, "Error", str(exception), QMessageBox.Ok)
+
+            if self.IS_DEVELOP: raise exception
+
     def set_TypeOfProperties(self):
         self.left_box_2_1.setVisible(self.type_of_properties==0)
         self.left_box_2_2.setVisible(self.type_of_properties==1)
         self.left_box_2_3.setVisible(self.type_of_properties==2)
 
+        self.update_preview()
+
+    ####################################################################################
+    # ANALYTIC PREVIEW
+
+    def has_preview(self):
+        return False
+
+    def build_preview_box(self, box):
+        pass
+
+    def get_preview_titles(self):
+        return []
+
+    def get_preview(self, sigma_x, sigma_xp, sigma_y, sigma_yp):
+        '''
+        :return: text, list of curves (x, y, xtitle, ytitle), one for each title
+        '''
+        raise NotImplementedError()
+
+    def get_preview_electron_beam_sigmas(self):
+        # same properties of get_electron_beam, without changing the widget fields
+        if self.type_of_properties == 0:
+            return numpy.sqrt(self.moment_xx), numpy.sqrt(self.moment_xpxp), numpy.sqrt(self.moment_yy), numpy.sqrt(self.moment_ypyp)
+        elif self.type_of_properties == 1:
+            return self.electron_beam_size_h, self.electron_beam_divergence_h, self.electron_beam_size_v, self.electron_beam_divergence_v
+        elif self.type_of_properties == 2:
+            sigma_x, sigma_xp = get_electron_beam_sigmas_from_twiss(self.horizontal_emittance, self.horizontal_beta, self.horizontal_alpha,
+                                                                    self.horizontal_eta, self.horizontal_etap, self.electron_energy_spread)
+            sigma_y, sigma_yp = get_electron_beam_sigmas_from_twiss(self.vertical_emittance, self.vertical_beta, self.vertical_alpha,
+                                                                    self.vertical_eta, self.vertical_etap, self.electron_energy_spread)
+
+            return sigma_x, sigma_xp, sigma_y, sigma_yp
+
+    def update_preview(self):
+        # invoked at every change of the parameters: invalid values (while typing) are ignored
+        if self.has_preview() and self.preview_automatic == 1 and hasattr(self, "preview_canvas"):
+            try:
+                self.__plot_preview()
+            except Exception:
+                pass
+
+    def calculate_preview(self):
+        try:
+            self.__plot_preview()
+        except Exception as exception:
+            QMessageBox.critical(self, "Error", str(exception), QMessageBox.Ok)
+
+            if self.IS_DEVELOP: raise exception
+
+    def __plot_preview(self):
+        congruence.checkStrictlyPositiveNumber(self.electron_energy_in_GeV, "Energy")
+        congruence.checkStrictlyPositiveNumber(self.ring_current, "Ring Current")
+        self.checkLightSourceSpecificFields()
+
+        text, curves = self.get_preview(*self.get_preview_electron_beam_sigmas())
+
+        self.preview_output.setText(text)
+
+        for plot_canvas, title, (x, y, xtitle, ytitle) in zip(self.preview_canvas, self.get_preview_titles(), curves):
+            plot_canvas.addCurve(x, y, title, symbol='', color='blue', replace=True)
+            plot_canvas.setGraphXLabel(xtitle)
+            plot_canvas.setGraphYLabel(ytitle)
+            plot_canvas.resetZoom()
+
     def set_TypeOfInitialization(self):
         self.left_box_3_1.setVisible(self.type_of_initialization==1)
         self.left_box_3_2.setVisible(self.type_of_initialization!=1)
@@ -289,21 +443,31 @@ class OWSRWSource(SRWWavefrontViewer, WidgetDecorator):
             self.setStatusMessage("")
 
             beamline = SRWBeamline(light_source=srw_source)
-            self.output_wavefront = self.calculate_wavefront_propagation(srw_source)
 
+            profile_record = SRWProfileRecord(element_name=self.source_name if not self.source_name is None else self.windowTitle(),
+                                              widget_name=self.windowTitle(),
+                                              propagation_mode=self.srw_live_propagation_mode)
 
-            if self.is_do_plots():
-                self.setStatusMessage("Plotting Results")
+            with profile_propagation(profile_record), time_propagation(profile_record):
+                self.output_wavefront = self.calculate_wavefront_propagation(srw_source)
 
-                tickets = []
+            profile_record.set_mesh_after(self.output_wavefront)
 
-                self.run_calculation_for_plots(tickets, 50)
+            self.propagation_profile = SRWPropagationProfile()
+            self.propagation_profile.add_record(profile_record)
+
+
+            if self.is_do_plots():
+                self.setStatusMessage("Plotting Results")
 
-                self.plot_results(tickets, 80)
+                self.plot_output_wavefront(50)
 
             self.setStatusMessage("")
 
-            self.send("SRWData", SRWData(srw_beamline=beamline, srw_wavefront=self.output_wavefront))
+            output_srw_data = SRWData(srw_beamline=beamline, srw_wavefront=self.output_wavefront)
+            output_srw_data.set_propagation_profile(self.propagation_profile)
+
+            self.send("SRWData", output_srw_data)
 
         except Exception as exception:
             QMessageBox.critical(self, "Error", str(exception), QMessageBox.Ok)
@@ -465,68 +629,49 @@ class OWSRWSource(SRWWavefrontViewer, WidgetDecorator):
     def checkWavefrontPhotonEnergy(self):
         congruence.checkStrictlyPositiveNumber(self.wf_photon_energy, "Wavefront Propagation Photon Energy")
 
-    def run_calculation_for_plots(self, tickets, progress_bar_value):
-        if not self.output_wavefront is None:
-            if self.view_type == 1:
-                e, h, v, i = self.output_wavefront.get_intensity(multi_electron=False)
-
-                tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)]))
-
-                self.progressBarSet(progress_bar_value)
-
-                e, h, v, i = self.output_wavefront.get_phase()
-
-                tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)]))
-
-                self.progressBarSet(progress_bar_value + 10)
-
-                e, h, v, i = self.output_wavefront.get_intensity(multi_electron=True)
-
-                tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)]))
-
-                self.progressBarSet(progress_bar_value + 20)
-            elif self.view_type == 2:
-                e, h, v, i = self.output_wavefront.get_intensity(multi_electron=False, polarization_component_to_be_extracted=PolarizationComponent.LINEAR_HORIZONTAL)
-
-                tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)]))
-
-                self.progressBarSet(progress_bar_value)
-
-                #--
-
-                e, h, v, i = self.output_wavefront.get_intensity(multi_electron=False, polarization_component_to_be_extracted=PolarizationComponent.LINEAR_VERTICAL)
-
-                tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)]))
-
-                #--
-
-                e, h, v, i = self.output_wavefront.get_phase(polarization_component_to_be_extracted=PolarizationComponent.LINEAR_HORIZONTAL)
-
-                tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)]))
-
-                self.progressBarSet(progress_bar_value + 10)
-
-                e, h, v, i = self.output_wavefront.get_phase(polarization_component_to_be_extracted=PolarizationComponent.LINEAR_VERTICAL)
-
-                tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)]))
-
-                #--
+    def is_lazy_plotting(self):
+        return True
+
+    def get_ticket_calculators(self):
+        if self.view_type == 1:
+            return [lambda extraction: extraction.get_intensity_ticket(),
+                    lambda extraction: extraction.get_phase_ticket(),
+                    lambda extraction: extraction.get_intensity_ticket(multi_electron=True)]
+        elif self.view_type == 2:
+            return [lambda extraction: extraction.get_intensity_ticket(PolarizationComponent.LINEAR_HORIZONTAL),
+                    lambda extraction: extraction.get_intensity_ticket(PolarizationComponent.LINEAR_VERTICAL),
+                    lambda extraction: extraction.get_phase_ticket(PolarizationComponent.LINEAR_HORIZONTAL),
+                    lambda extraction: extraction.get_phase_ticket(PolarizationComponent.LINEAR_VERTICAL),
+                    lambda extraction: extraction.get_intensity_ticket(PolarizationComponent.LINEAR_HORIZONTAL, multi_electron=True),
+                    lambda extraction: extraction.get_intensity_ticket(PolarizationComponent.LINEAR_VERTICAL, multi_electron=True)]
+        else:
+            return []
 
-                e, h, v, i = self.output_wavefront.get_intensity(multi_electron=True, polarization_component_to_be_extracted=PolarizationComponent.LINEAR_HORIZONTAL)
+    def get_automatic_sr_method(self):
+        raise NotImplementedError()
 
-                tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)]))
+    def calculate_wavefront_propagation(self, srw_source):
+        wf_parameters = self.get_wavefront_parameters(srw_source)
 
-                self.progressBarSet(progress_bar_value + 20)
+        # electron beam randomly sampled at each run: nothing to reuse
+        if self.use_wavefront_cache == 1 and self.type_of_initialization != 2:
+            wavefront_cache = self.get_wavefront_cache()
 
-                e, h, v, i = self.output_wavefront.get_intensity(multi_electron=True, polarization_component_to_be_extracted=PolarizationComponent.LINEAR_VERTICAL)
+            key = wavefront_cache.get_key(srw_source, wf_parameters)
+            wavefront = wavefront_cache.get_wavefront(key)
 
-                tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)]))
+            if wavefront is None:
+                wavefront = srw_source.get_SRW_Wavefront(source_wavefront_parameters=wf_parameters)
 
+                wavefront_cache.put_wavefront(key, wavefront)
+            else:
+                print("Wavefront loaded from cache (" + key + ")")
 
-    def get_automatic_sr_method(self):
-        raise NotImplementedError()
+            return wavefront
+        else:
+            return srw_source.get_SRW_Wavefront(source_wavefront_parameters=wf_parameters)
 
-    def calculate_wavefront_propagation(self, srw_source):
+    def get_wavefront_parameters(self, srw_source):
         photon_energy = self.get_photon_energy_for_wavefront_propagation(srw_source)
 
         wf_parameters = WavefrontParameters(photon_energy_min = photon_energy,
@@ -544,7 +689,7 @@ class OWSRWSource(SRWWavefrontViewer, WidgetDecorator):
                                                                                                         number_of_points_for_trajectory_calculation=self.wf_number_of_points_for_trajectory_calculation,
                                                                                                         use_terminating_terms=self.wf_use_terminating_terms,
                                                                                                         sampling_factor_for_adjusting_nx_ny=self.wf_sampling_factor_for_adjusting_nx_ny))
-        return srw_source.get_SRW_Wavefront(source_wavefront_parameters=wf_parameters)
+        return wf_parameters
 
     def get_photon_energy_for_wavefront_propagation(self, srw_source):
         return self.wf_photon_energy
@@ -613,4 +758,4 @@ class OWSRWSource(SRWWavefrontViewer, WidgetDecorator):
         raise NotImplementedError()
 
     def callback_electron_energy(self):
-        pass
+        self.update_preview()
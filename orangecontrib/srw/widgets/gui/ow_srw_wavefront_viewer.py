@@ -18,6 +18,7 @@ from wofrysrw.propagator.propagators2D.srw_fresnel_wofry import FresnelSRWWofry
 from wofrysrw.propagator.propagators2D.srw_propagation_mode import SRWPropagationMode
 
 from orangecontrib.srw.util.srw_util import SRWPlot
+from orangecontrib.srw.util.srw_extraction import SRWWavefrontExtraction
 from orangecontrib.srw.widgets.gui.ow_srw_widget import SRWWidget
 
 def initialize_propagator_2D():
@@ -47,6 +48,8 @@ class SRWWavefrontViewer(SRWWidget):
     view_type=Setting(1)
 
     output_wavefront=None
+    wavefront_extraction=None
+    plotted_extraction=None
 
     use_range = Setting(0)
 
@@ -129,6 +132,8 @@ class SRWWavefrontViewer(SRWWidget):
 
         self.initializeTabs()
 
+        self.tabs.currentChanged.connect(self.tab_changed)
+
         self.srw_output = oasysgui.textArea(580, 800)
 
         out_box = gui.widgetBox(out_tab, "System Output", addSpace=True, orientation="horizontal")
@@ -158,6 +163,8 @@ class SRWWavefrontViewer(SRWWidget):
         if self.show_view_box and propagation_mode==SRWPropagationMode.WHOLE_BEAMLINE: self.view_type = 0
 
     def initializeTabs(self):
+        self.tabs.blockSignals(True)
+
         current_tab = self.tabs.currentIndex()
 
         size = len(self.tab)
@@ -179,6 +186,10 @@ class SRWWavefrontViewer(SRWWidget):
 
         self.tabs.setCurrentIndex(current_tab)
 
+        self.plotted_tabs = []
+
+        self.tabs.blockSignals(False)
+
     def set_PlottingRange(self):
         self.plot_range_box_1.setVisible(self.use_range==1)
         self.plot_range_box_2.setVisible(self.use_range==0)
@@ -190,11 +201,9 @@ class SRWWavefrontViewer(SRWWidget):
         if self.is_do_plots():
             try:
                 if not self.output_wavefront is None:
-                    tickets = []
+                    self.plotted_tabs = []
 
-                    self.run_calculation_for_plots(tickets, 50)
-
-                    self.plot_results(tickets, 80)
+                    self.plot_output_wavefront(50)
 
             except Exception as exception:
                 QtWidgets.QMessageBox.critical(self, "Error",
@@ -213,11 +222,7 @@ class SRWWavefrontViewer(SRWWidget):
                 self.initializeTabs()
 
                 if not self.output_wavefront is None:
-                    tickets = []
-
-                    self.run_calculation_for_plots(tickets, 50)
-
-                    self.plot_results(tickets, 80)
+                    self.plot_output_wavefront(50)
 
             except Exception as exception:
                 QtWidgets.QMessageBox.critical(self, "Error",
@@ -231,8 +236,89 @@ class SRWWavefrontViewer(SRWWidget):
         self.progressBarFinished()
 
     def run_calculation_for_plots(self, tickets, progress_bar_value):
+        if self.is_lazy_plotting():
+            calculators = self.get_ticket_calculators()
+            progress = (80 - progress_bar_value) / max(1, len(calculators))
+
+            for index in range(len(calculators)):
+                tickets.append(self.get_ticket(index))
+
+                self.progressBarSet(progress_bar_value + (index+1)*progress)
+        else:
+            raise NotImplementedError("to be implemented")
+
+    #########################################################################################
+    #
+    # LAZY PLOTTING: tickets are calculated only when their tab is shown, once per wavefront
+    #
+    #########################################################################################
+
+    def is_lazy_plotting(self):
+        return False
+
+    def get_ticket_calculators(self):
+        '''
+        to be implemented by widgets with lazy plotting: one function per plot tab, taking a
+        SRWWavefrontExtraction of the output wavefront and returning the ticket to be plotted
+        '''
         raise NotImplementedError("to be implemented")
 
+    def get_wavefront_extraction(self):
+        if self.output_wavefront is None: return None
+
+        if self.wavefront_extraction is None or \
+                not self.wavefront_extraction.get_srw_wavefront() is self.output_wavefront:
+            self.wavefront_extraction = SRWWavefrontExtraction(self.output_wavefront)
+
+        return self.wavefront_extraction
+
+    def get_ticket(self, index):
+        return self.get_ticket_calculators()[index](self.get_wavefront_extraction())
+
+    def plot_output_wavefront(self, progress_bar_value=50):
+        if self.is_lazy_plotting():
+            self.plot_current_tab(progress_bar_value=progress_bar_value)
+        else:
+            tickets = []
+
+            self.run_calculation_for_plots(tickets, progress_bar_value)
+
+            self.plot_results(tickets, progress_bar_value + 30)
+
+    def tab_changed(self, index):
+        if self.is_lazy_plotting():
+            self.progressBarInit()
+            self.plot_current_tab()
+            self.progressBarFinished()
+
+    def plot_current_tab(self, progress_bar_value=80):
+        if not self.is_lazy_plotting() or not self.is_do_plots() or self.output_wavefront is None: return
+
+        if not self.get_wavefront_extraction() is self.plotted_extraction:
+            self.plotted_tabs = []
+            self.plotted_extraction = self.get_wavefront_extraction()
+
+        index = self.tabs.currentIndex()
+
+        if index < 0 or index >= len(self.tab) or index in self.plotted_tabs: return
+
+        try:
+            if self.use_range==1:
+                congruence.checkGreaterThan(self.range_x_max, self.range_x_min, "Range X Max", "Range X Min")
+                congruence.checkGreaterThan(self.range_y_max, self.range_y_min, "Range Y Max", "Range Y Min")
+
+            SRWPlot.set_conversion_active(self.getConversionActive())
+
+            self.plot_ticket(self.get_ticket(index), index, progress_bar_value)
+
+            self.plotted_tabs.append(index)
+        except Exception as exception:
+            QtWidgets.QMessageBox.critical(self, "Error",
+                                           str(exception),
+                                           QtWidgets.QMessageBox.Ok)
+
+            if self.IS_DEVELOP: raise exception
+
     def plot_1D(self, ticket, progressBarValue, var, plot_canvas_index, title, xtitle, ytitle, xum=""):
         if self.plot_canvas[plot_canvas_index] is None:
             self.plot_canvas[plot_canvas_index] = SRWPlot.Detailed1DWidget()
@@ -322,14 +408,8 @@ class SRWWavefrontViewer(SRWWidget):
 
                     try:
                         for i in range(0, len(tickets)):
-                            if type(tickets[i]) is tuple:
-                                if len(tickets[i]) == 4:
-                                    self.plot_3D(tickets[i][0], tickets[i][1], tickets[i][2], tickets[i][3], progressBarValue + (i+1)*progress, plot_canvas_index=i, title=titles[i], xtitle=xtitles[i], ytitle=ytitles[i], xum=xums[i], yum=yums[i])
-                            else:
-                                if len(variables[i]) == 1:
-                                    self.plot_1D(tickets[i], progressBarValue + (i+1)*progress, variables[i],                     plot_canvas_index=i, title=titles[i], xtitle=xtitles[i], ytitle=ytitles[i], xum=xums[i])
-                                else:
-                                    self.plot_2D(tickets[i], progressBarValue + (i+1)*progress, variables[i][0], variables[i][1], plot_canvas_index=i, title=titles[i], xtitle=xtitles[i], ytitle=ytitles[i], xum=xums[i], yum=yums[i], ignore_range=ignore_range)
+                            self.plot_ticket(tickets[i], i, progressBarValue + (i+1)*progress, ignore_range=ignore_range,
+                                             variables=variables, titles=titles, xtitles=xtitles, ytitles=ytitles, xums=xums, yums=yums)
                     except Exception as e:
                         self.view_type_combo.setEnabled(True)
 
@@ -339,6 +419,23 @@ class SRWWavefrontViewer(SRWWidget):
             else:
                 raise Exception("Nothing to Plot")
 
+    def plot_ticket(self, ticket, i, progressBarValue, ignore_range=False, variables=None, titles=None, xtitles=None, ytitles=None, xums=None, yums=None):
+        if variables is None: variables = self.getVariablesToPlot()
+        if titles is None: titles = self.getTitles(with_um=True)
+        if xtitles is None: xtitles = self.getXTitles()
+        if ytitles is None: ytitles = self.getYTitles()
+        if xums is None: xums = self.getXUM()
+        if yums is None: yums = self.getYUM()
+
+        if type(ticket) is tuple:
+            if len(ticket) == 4:
+                self.plot_3D(ticket[0], ticket[1], ticket[2], ticket[3], progressBarValue, plot_canvas_index=i, title=titles[i], xtitle=xtitles[i], ytitle=ytitles[i], xum=xums[i], yum=yums[i])
+        else:
+            if len(variables[i]) == 1:
+                self.plot_1D(ticket, progressBarValue, variables[i],                     plot_canvas_index=i, title=titles[i], xtitle=xtitles[i], ytitle=ytitles[i], xum=xums[i])
+            else:
+                self.plot_2D(ticket, progressBarValue, variables[i][0], variables[i][1], plot_canvas_index=i, title=titles[i], xtitle=xtitles[i], ytitle=ytitles[i], xum=xums[i], yum=yums[i], ignore_range=ignore_range)
+
     def writeStdOut(self, text):
         cursor = self.srw_output.textCursor()
         cursor.movePosition(QtGui.QTextCursor.End)
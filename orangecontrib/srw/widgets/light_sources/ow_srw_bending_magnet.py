@@ -1,4 +1,4 @@
-import sys
+import sys, numpy
 
 from PyQt5.QtWidgets import QApplication
 from orangewidget import gui
@@ -12,6 +12,7 @@ from wofrysrw.storage_ring.light_sources.srw_bending_magnet_light_source import
 from wofrysrw.storage_ring.magnetic_structures.srw_bending_magnet import SRWBendingMagnet
 
 from orangecontrib.srw.util.srw_util import SRWPlot
+from orangecontrib.srw.util.srw_preview import get_gamma, get_critical_energy, get_bending_magnet_spectrum, get_bending_magnet_power_density
 from orangecontrib.srw.widgets.gui.ow_srw_source import OWSRWSource
 
 from syned.storage_ring.magnetic_structures.bending_magnet import BendingMagnet
@@ -36,7 +37,9 @@ class OWSRWBendingMagnet(OWSRWSource):
 
         oasysgui.lineEdit(left_box_2, self, "magnetic_radius", "Magnetic Radius [m]", labelWidth=260, valueType=float, orientation="horizontal", callback=self.calculateMagneticField)
         oasysgui.lineEdit(left_box_2, self, "magnetic_field", "Magnetic Field [T]", labelWidth=260, valueType=float, orientation="horizontal", callback=self.calculateMagneticRadius)
-        oasysgui.lineEdit(left_box_2, self, "length", "Length [m]", labelWidth=260, valueType=float, orientation="horizontal")
+        oasysgui.lineEdit(left_box_2, self, "length", "Length [m]", labelWidth=260, valueType=float, orientation="horizontal", callback=self.update_preview)
+
+        self.update_preview()
 
         gui.rubber(self.controlArea)
         gui.rubber(self.mainArea)
@@ -73,11 +76,41 @@ class OWSRWBendingMagnet(OWSRWSource):
            self.magnetic_field=BendingMagnet.calculate_magnetic_field(self.magnetic_radius,
                                                                       self.electron_energy_in_GeV)
 
+        self.update_preview()
+
     def calculateMagneticRadius(self):
         if self.magnetic_field > 0:
            self.magnetic_radius=BendingMagnet.calculate_magnetic_radius(self.magnetic_field,
                                                                         self.electron_energy_in_GeV)
 
+        self.update_preview()
+
+    def has_preview(self):
+        return True
+
+    def get_preview_titles(self):
+        return ["Spectrum", "On-Axis Spectrum", "Power Density"]
+
+    def get_preview(self, sigma_x, sigma_xp, sigma_y, sigma_yp):
+        critical_energy = get_critical_energy(self.electron_energy_in_GeV, self.magnetic_field)
+
+        energy = numpy.logspace(numpy.log10(critical_energy*1e-3), numpy.log10(critical_energy*10), 1000)
+        flux, flux_density = get_bending_magnet_spectrum(self.electron_energy_in_GeV, self.ring_current, self.magnetic_field, energy)
+
+        # vertical profile at the wavefront distance, +/- 5/gamma
+        y = numpy.linspace(-5.0, 5.0, 501)*self.wf_distance/get_gamma(self.electron_energy_in_GeV)
+        power_density, linear_power_density = get_bending_magnet_power_density(self.electron_energy_in_GeV, self.ring_current, self.magnetic_field, self.wf_distance, y)
+
+        text = "Critical Energy: {0:.1f} eV\n".format(critical_energy)
+        text += "Flux at Critical Energy: {0:.3e} ph/s/mrad/0.1%bw\n".format(float(get_bending_magnet_spectrum(self.electron_energy_in_GeV, self.ring_current, self.magnetic_field, critical_energy)[0]))
+        text += "Power per horizontal angle: {0:.2f} W/mrad\n".format(linear_power_density)
+        text += "Peak Power Density at {0} m: {1:.3f} W/mm\u00b2\n".format(self.wf_distance, power_density.max())
+        text += "Total Power (length): {0:.2f} W\n".format(linear_power_density*1e3*self.length/self.magnetic_radius)
+
+        return text, [(energy, flux, "E [eV]", "Flux [ph/s/mrad/0.1%bw]"),
+                      (energy, flux_density, "E [eV]", "Flux Density [ph/s/mrad\u00b2/0.1%bw]"),
+                      (y*1e3, power_density, "Y [mm]", "Power Density [W/mm\u00b2]")]
+
     def receive_specific_syned_data(self, data):
         if isinstance(data._light_source._magnetic_structure, BendingMagnet):
             light_source = data._light_source
@@ -25,6 +25,8 @@ from wofrysrw.storage_ring.light_sources.srw_gaussian_light_source import SRWGau
 
 from orangecontrib.srw.util.srw_util import SRWPlot
 from orangecontrib.srw.util.srw_objects import SRWData
+from orangecontrib.srw.util.srw_parallel import calculate_wavefronts
+from orangecontrib.srw.util.srw_coherent_modes import SRWCoherentModes, get_coherent_modes
 from orangecontrib.srw.widgets.gui.ow_srw_wavefront_viewer import SRWWavefrontViewer
 
 
@@ -74,6 +76,14 @@ class OWSRWGaussianSource(SRWWavefrontViewer, WidgetDecorator):
 
     wf_sampling_factor_for_adjusting_nx_ny = Setting(0.0)
 
+    use_coherent_modes = Setting(0)
+    horizontal_electron_beam_emittance = Setting(1e-10)
+    vertical_electron_beam_emittance = Setting(1e-12)
+    number_of_coherent_modes = Setting(20)
+    coherent_modes_number_of_processes = Setting(1)
+
+    coherent_modes = None
+
     TABS_AREA_HEIGHT = 618
     CONTROL_AREA_WIDTH = 405
 
@@ -137,6 +147,20 @@ class OWSRWGaussianSource(SRWWavefrontViewer, WidgetDecorator):
         oasysgui.lineEdit(left_box_1, self, "transverse_gauss_hermite_mode_order_x", "Transverse Gauss-Hermite mode order x", labelWidth=260, valueType=int, orientation="horizontal")
         oasysgui.lineEdit(left_box_1, self, "transverse_gauss_hermite_mode_order_y", "Transverse Gauss-Hermite mode order y", labelWidth=260, valueType=int, orientation="horizontal")
 
+        left_box_2 = oasysgui.widgetBox(self.tab_source, "Partial Coherence", addSpace=True, orientation="vertical", height=170)
+
+        gui.comboBox(left_box_2, self, "use_coherent_modes", label="Source", items=["Coherent", "Gaussian-Schell (coherent modes)"], labelWidth=150,
+                     sendSelectedValue=False, orientation="horizontal", callback=self.set_UseCoherentModes)
+
+        self.coherent_modes_box = oasysgui.widgetBox(left_box_2, "", addSpace=False, orientation="vertical")
+
+        oasysgui.lineEdit(self.coherent_modes_box, self, "horizontal_electron_beam_emittance", "Electron beam emittance x [m]", labelWidth=260, valueType=float, orientation="horizontal")
+        oasysgui.lineEdit(self.coherent_modes_box, self, "vertical_electron_beam_emittance", "Electron beam emittance y [m]", labelWidth=260, valueType=float, orientation="horizontal")
+        oasysgui.lineEdit(self.coherent_modes_box, self, "number_of_coherent_modes", "Number of coherent modes", labelWidth=260, valueType=int, orientation="horizontal")
+        oasysgui.lineEdit(self.coherent_modes_box, self, "coherent_modes_number_of_processes", "Parallel Processes", labelWidth=260, valueType=int, orientation="horizontal")
+
+        self.set_UseCoherentModes()
+
         self.tab_plots = oasysgui.createTabPage(self.tabs_setting, "Wavefront Setting")
 
         self.tabs_plots_setting = oasysgui.tabWidget(self.tab_plots)
@@ -182,7 +206,15 @@ class OWSRWGaussianSource(SRWWavefrontViewer, WidgetDecorator):
             self.setStatusMessage("")
 
             beamline = SRWBeamline(light_source=srw_source)
-            wavefront = self.calculate_wavefront_propagation(srw_source)
+
+            if self.use_coherent_modes == 1:
+                self.coherent_modes = self.calculate_coherent_modes()
+                wavefront = self.coherent_modes.get_wavefronts()[0]
+            else:
+                self.coherent_modes = None
+                wavefront = self.calculate_wavefront_propagation(srw_source)
+
+            self.initializeTabs()
 
             tickets = []
 
@@ -195,7 +227,10 @@ class OWSRWGaussianSource(SRWWavefrontViewer, WidgetDecorator):
 
             self.setStatusMessage("")
 
-            self.send("SRWData", SRWData(srw_beamline=beamline, srw_wavefront=wavefront))
+            srw_data = SRWData(srw_beamline=beamline, srw_wavefront=wavefront)
+            srw_data.set_coherent_modes(self.coherent_modes)
+
+            self.send("SRWData", srw_data)
 
         except Exception as exception:
             QMessageBox.critical(self, "Error", str(exception), QMessageBox.Ok)
@@ -208,7 +243,10 @@ class OWSRWGaussianSource(SRWWavefrontViewer, WidgetDecorator):
         if trigger and trigger.new_object == True:
             self.runSRWSource()
 
-    def get_srw_source(self):
+    def set_UseCoherentModes(self):
+        self.coherent_modes_box.setVisible(self.use_coherent_modes == 1)
+
+    def get_srw_source(self, horizontal_sigma_at_waist=None, vertical_sigma_at_waist=None, mode_order_x=None, mode_order_y=None):
         return SRWGaussianLightSource(beam_center_at_waist_x=self.beam_center_at_waist_x,
                                       beam_center_at_waist_y=self.beam_center_at_waist_y,
                                       beam_center_at_waist_z=self.beam_center_at_waist_z,
@@ -218,11 +256,11 @@ class OWSRWGaussianSource(SRWWavefrontViewer, WidgetDecorator):
                                       energy_per_pulse=self.energy_per_pulse,
                                       repetition_rate=self.repetition_rate,
                                       polarization=self.polarization + 1,
-                                      horizontal_sigma_at_waist=self.horizontal_sigma_at_waist,
-                                      vertical_sigma_at_waist=self.vertical_sigma_at_waist,
+                                      horizontal_sigma_at_waist=self.horizontal_sigma_at_waist if horizontal_sigma_at_waist is None else horizontal_sigma_at_waist,
+                                      vertical_sigma_at_waist=self.vertical_sigma_at_waist if vertical_sigma_at_waist is None else vertical_sigma_at_waist,
                                       pulse_duration=self.pulse_duration,
-                                      transverse_gauss_hermite_mode_order_x=self.transverse_gauss_hermite_mode_order_x,
-                                      transverse_gauss_hermite_mode_order_y=self.transverse_gauss_hermite_mode_order_y)
+                                      transverse_gauss_hermite_mode_order_x=self.transverse_gauss_hermite_mode_order_x if mode_order_x is None else mode_order_x,
+                                      transverse_gauss_hermite_mode_order_y=self.transverse_gauss_hermite_mode_order_y if mode_order_y is None else mode_order_y)
 
     def checkFields(self):
         congruence.checkPositiveNumber(self.energy_per_pulse, "Energy per pulse")
@@ -232,6 +270,14 @@ class OWSRWGaussianSource(SRWWavefrontViewer, WidgetDecorator):
         congruence.checkPositiveNumber(self.transverse_gauss_hermite_mode_order_x, "Transverse Gauss-Hermite mode order x")
         congruence.checkPositiveNumber(self.transverse_gauss_hermite_mode_order_y, "Transverse Gauss-Hermite mode order y")
 
+        if self.use_coherent_modes == 1:
+            congruence.checkStrictlyPositiveNumber(self.horizontal_sigma_at_waist, "\u03c3x at waist")
+            congruence.checkStrictlyPositiveNumber(self.vertical_sigma_at_waist, "\u03c3y at waist")
+            congruence.checkPositiveNumber(self.horizontal_electron_beam_emittance, "Electron beam emittance x")
+            congruence.checkPositiveNumber(self.vertical_electron_beam_emittance, "Electron beam emittance y")
+            congruence.checkStrictlyPositiveNumber(self.number_of_coherent_modes, "Number of coherent modes")
+            congruence.checkStrictlyPositiveNumber(self.coherent_modes_number_of_processes, "Parallel Processes")
+
         # WAVEFRONT
 
         congruence.checkStrictlyPositiveNumber(self.wf_photon_energy, "Wavefront Propagation Photon Energy")
@@ -257,8 +303,38 @@ class OWSRWGaussianSource(SRWWavefrontViewer, WidgetDecorator):
 
         self.progressBarSet(progress_bar_value + 20)
 
+        if not self.coherent_modes is None:
+            tickets.append(self.coherent_modes.get_intensity_ticket())
+
+            self.progressBarSet(progress_bar_value + 30)
+
     def calculate_wavefront_propagation(self, srw_source):
-        wf_parameters = WavefrontParameters(photon_energy_min = self.wf_photon_energy,
+        return srw_source.get_SRW_Wavefront(source_wavefront_parameters=self.get_wavefront_parameters())
+
+    def calculate_coherent_modes(self):
+        '''
+        Gaussian-Schell source: the sizes at waist are the rms sizes of the partially coherent beam, the
+        Gauss-Hermite orders are the ones of the modes
+        '''
+        mode_sigma_x, mode_sigma_y, modes = get_coherent_modes(self.horizontal_sigma_at_waist,
+                                                               self.vertical_sigma_at_waist,
+                                                               self.horizontal_electron_beam_emittance,
+                                                               self.vertical_electron_beam_emittance,
+                                                               self.wf_photon_energy,
+                                                               self.number_of_coherent_modes)
+
+        print("Coherent modes: \u03c3x = {0:.3e} m, \u03c3y = {1:.3e} m of the fundamental mode".format(mode_sigma_x, mode_sigma_y))
+        for order_x, order_y, weight in modes: print("Mode ({0}, {1}): weight {2:.4f}".format(order_x, order_y, weight))
+        print("Captured fraction of the intensity: {0:.4f}".format(sum([weight for _, _, weight in modes])))
+
+        srw_sources = [self.get_srw_source(mode_sigma_x, mode_sigma_y, order_x, order_y) for order_x, order_y, _ in modes]
+
+        return SRWCoherentModes(calculate_wavefronts(srw_sources, self.get_wavefront_parameters(), self.coherent_modes_number_of_processes),
+                                [weight for _, _, weight in modes],
+                                self.coherent_modes_number_of_processes)
+
+    def get_wavefront_parameters(self):
+        return WavefrontParameters(photon_energy_min = self.wf_photon_energy,
                                             photon_energy_max = self.wf_photon_energy,
                                             photon_energy_points=1,
                                             h_slit_gap = self.wf_h_slit_gap,
@@ -268,27 +344,31 @@ class OWSRWGaussianSource(SRWWavefrontViewer, WidgetDecorator):
                                             distance = self.wf_distance,
                                             wavefront_precision_parameters=WavefrontPrecisionParameters(sampling_factor_for_adjusting_nx_ny=self.wf_sampling_factor_for_adjusting_nx_ny))
 
-        return srw_source.get_SRW_Wavefront(source_wavefront_parameters=wf_parameters)
-
     def receive_syned_data(self, data):
         if not data is None: QMessageBox.critical(self, "Error", "Syned data not supported for Gaussian Light Source", QMessageBox.Ok)
 
+    def get_number_of_plots(self):
+        return 2 if self.coherent_modes is None else 3
+
     def getVariablesToPlot(self):
-        return [[1, 2], [1, 2]]
+        return [[1, 2]]*self.get_number_of_plots()
 
     def getTitles(self, with_um=False):
-        if with_um: return ["Intensity [ph/s/.1%bw/mm\u00b2]",
-                            "Phase [rad]"]
-        else: return ["Intensity", "Phase"]
+        if with_um: titles = ["Intensity [ph/s/.1%bw/mm\u00b2]",
+                              "Phase [rad]",
+                              "Intensity (Coherent Modes) [ph/s/.1%bw/mm\u00b2]"]
+        else: titles = ["Intensity", "Phase", "Intensity (Coherent Modes)"]
+
+        return titles[:self.get_number_of_plots()]
 
     def getXTitles(self):
-        return ["X [\u03bcm]", "X [\u03bcm]"]
+        return ["X [\u03bcm]"]*self.get_number_of_plots()
 
     def getYTitles(self):
-        return ["Y [\u03bcm]", "Y [\u03bcm]"]
+        return ["Y [\u03bcm]"]*self.get_number_of_plots()
 
     def getXUM(self):
-        return ["X [\u03bcm]", "X [\u03bcm]"]
+        return ["X [\u03bcm]"]*self.get_number_of_plots()
 
     def getYUM(self):
-        return ["Y [\u03bcm]", "Y [\u03bcm]"]
+        return ["Y [\u03bcm]"]*self.get_number_of_plots()
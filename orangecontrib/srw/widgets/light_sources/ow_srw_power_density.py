@@ -20,6 +20,7 @@ from wofrysrw.storage_ring.light_sources.srw_undulator_light_source import SRWUn
 
 from orangecontrib.srw.util.srw_util import SRWPlot
 from orangecontrib.srw.util.srw_objects import SRWData
+from orangecontrib.srw.util.srw_parallel import calculate_power_density_in_strips
 from orangecontrib.srw.widgets.gui.ow_srw_power_density_viewer import SRWPowerDensityViewer
 
 
@@ -70,6 +71,9 @@ class OWSRWPowerDensity(SRWPowerDensityViewer):
     pow_final_longitudinal_position = Setting(0.0) 
     pow_number_of_points_for_trajectory_calculation = Setting(20000)
 
+    pow_number_of_strips = Setting(1)
+    pow_use_trajectory_cache = Setting(0)
+
     calculated_total_power = 0.0
 
     received_light_source = None
@@ -138,6 +142,11 @@ class OWSRWPowerDensity(SRWPowerDensityViewer):
         oasysgui.lineEdit(tab_pow, self, "pow_initial_longitudinal_position", "Initial longitudinal position [m]", labelWidth=260, valueType=float, orientation="horizontal")
         oasysgui.lineEdit(tab_pow, self, "pow_final_longitudinal_position", "Final longitudinal position [m]", labelWidth=260, valueType=float, orientation="horizontal")
         oasysgui.lineEdit(tab_pow, self, "pow_number_of_points_for_trajectory_calculation", "Number of points for trajectory calculation", labelWidth=260, valueType=int, orientation="horizontal")
+        oasysgui.lineEdit(tab_pow, self, "pow_number_of_strips", "Mesh Strips (parallel processes)", labelWidth=260, valueType=int, orientation="horizontal")
+
+        gui.comboBox(tab_pow, self, "pow_use_trajectory_cache", label="Reuse trajectory (explicit integration limits)",
+                     items=["No", "Yes"], labelWidth=260,
+                     sendSelectedValue=False, orientation="horizontal")
 
         gui.rubber(self.controlArea)
 
@@ -253,24 +262,33 @@ class OWSRWPowerDensity(SRWPowerDensityViewer):
 
         congruence.checkStrictlyPositiveNumber(self.pow_precision_factor, "Intensity/Power Density Power - Precision Factor")
         congruence.checkStrictlyPositiveNumber(self.pow_number_of_points_for_trajectory_calculation, "Intensity/Power Density Power - Number of points for trajectory calculation")
+        congruence.checkStrictlyPositiveNumber(self.pow_number_of_strips, "Intensity/Power Density Power - Mesh Strips")
+
 
+    def get_wavefront_parameters(self, v_position, v_slit_gap, v_slit_points):
+        return WavefrontParameters(photon_energy_min = 0.0,
+                                   photon_energy_max = 0.0,
+                                   photon_energy_points=1,
+                                   h_slit_gap = self.int_h_slit_gap,
+                                   v_slit_gap = v_slit_gap,
+                                   h_slit_points=self.int_h_slit_points,
+                                   v_slit_points=v_slit_points,
+                                   v_position=v_position,
+                                   distance = self.int_distance)
 
     def run_calculation_intensity_power(self, srw_source, tickets, progress_bar_value=30):
-        wf_parameters = WavefrontParameters(photon_energy_min = 0.0,
-                                            photon_energy_max = 0.0,
-                                            photon_energy_points=1,
-                                            h_slit_gap = self.int_h_slit_gap,
-                                            v_slit_gap = self.int_v_slit_gap,
-                                            h_slit_points=self.int_h_slit_points,
-                                            v_slit_points=self.int_v_slit_points,
-                                            distance = self.int_distance)
-
-        h, v, p = srw_source.get_power_density(source_wavefront_parameters=wf_parameters,
-                                               power_density_precision_parameters=PowerDensityPrecisionParameters(precision_factor=self.pow_precision_factor,
-                                                                                                                  computation_method=self.pow_computation_method,
-                                                                                                                  initial_longitudinal_position=self.pow_initial_longitudinal_position,
-                                                                                                                  final_longitudinal_position=self.pow_final_longitudinal_position,
-                                                                                                                  number_of_points_for_trajectory_calculation=self.pow_number_of_points_for_trajectory_calculation))
+        # strips of the observation mesh are calculated in parallel processes and stitched together
+        h, v, p = calculate_power_density_in_strips(srw_source,
+                                                    self.get_wavefront_parameters,
+                                                    PowerDensityPrecisionParameters(precision_factor=self.pow_precision_factor,
+                                                                                    computation_method=self.pow_computation_method,
+                                                                                    initial_longitudinal_position=self.pow_initial_longitudinal_position,
+                                                                                    final_longitudinal_position=self.pow_final_longitudinal_position,
+                                                                                    number_of_points_for_trajectory_calculation=self.pow_number_of_points_for_trajectory_calculation),
+                                                    self.int_v_slit_gap,
+                                                    self.int_v_slit_points,
+                                                    self.pow_number_of_strips,
+                                                    self.pow_use_trajectory_cache == 1)
 
         self.calculated_total_power = SRWLightSource.get_total_power_from_power_density(h, v, p)
 
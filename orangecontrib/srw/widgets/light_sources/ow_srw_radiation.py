@@ -21,6 +21,7 @@ from wofrysrw.storage_ring.light_sources.srw_undulator_light_source import SRWUn
 
 from orangecontrib.srw.util.srw_util import SRWPlot
 from orangecontrib.srw.util.srw_objects import SRWData
+from orangecontrib.srw.util.srw_parallel import calculate_wavefront_in_energy_chunks, calculate_energy_integrated_intensity
 from orangecontrib.srw.widgets.gui.ow_srw_power_density_viewer import SRWPowerDensityViewer
 
 class OWSRWRadiation(SRWPowerDensityViewer):
@@ -75,6 +76,13 @@ class OWSRWRadiation(SRWPowerDensityViewer):
     int_use_terminating_terms = Setting(1)
     int_sampling_factor_for_adjusting_nx_ny = Setting(0.0)
 
+    int_energy_chunks = Setting(1)
+    int_energy_chunk_points = Setting(50)
+    int_use_trajectory_cache = Setting(0)
+
+    int_show_intensity_se = Setting(1)
+    int_show_intensity_me = Setting(1)
+
     calculated_total_power = 0.0
 
     received_light_source = None
@@ -130,6 +138,19 @@ class OWSRWRadiation(SRWPowerDensityViewer):
         oasysgui.lineEdit(int_box, self, "int_h_slit_points", "H Slit Points", labelWidth=260, valueType=int, orientation="horizontal")
         oasysgui.lineEdit(int_box, self, "int_v_slit_points", "V Slit Points", labelWidth=260, valueType=int, orientation="horizontal")
         oasysgui.lineEdit(int_box, self, "int_distance", "Propagation Distance [m]", labelWidth=260, valueType=float, orientation="horizontal")
+        oasysgui.lineEdit(int_box, self, "int_energy_chunks", "Energy Chunks (parallel processes)", labelWidth=260, valueType=int, orientation="horizontal")
+
+        gui.comboBox(int_box, self, "int_show_intensity_se", label="Show Intensity SE vs E,X,Y",
+                     items=["No", "Yes"], labelWidth=260,
+                     sendSelectedValue=False, orientation="horizontal", callback=self.set_ShowIntensity)
+
+        gui.comboBox(int_box, self, "int_show_intensity_me", label="Show Intensity ME vs E,X,Y",
+                     items=["No", "Yes"], labelWidth=260,
+                     sendSelectedValue=False, orientation="horizontal", callback=self.set_ShowIntensity)
+
+        self.streaming_box = oasysgui.widgetBox(int_box, "", addSpace=False, orientation="vertical")
+
+        oasysgui.lineEdit(self.streaming_box, self, "int_energy_chunk_points", "Max Photon Energy Points per Chunk", labelWidth=260, valueType=int, orientation="horizontal")
 
         pre_box = oasysgui.widgetBox(tab_convolution, "Precision Parameters", addSpace=False, orientation="vertical")
 
@@ -152,8 +173,31 @@ class OWSRWRadiation(SRWPowerDensityViewer):
 
         oasysgui.lineEdit(tab_prop, self, "int_sampling_factor_for_adjusting_nx_ny", "Sampling factor for adjusting nx/ny", labelWidth=260, valueType=int, orientation="horizontal")
 
+        gui.comboBox(tab_prop, self, "int_use_trajectory_cache", label="Reuse trajectory (explicit integration limits)",
+                     items=["No", "Yes"], labelWidth=260,
+                     sendSelectedValue=False, orientation="horizontal")
+
+        self.set_ShowIntensity(initialize_tabs=False)
+
         gui.rubber(self.controlArea)
 
+    def set_ShowIntensity(self, initialize_tabs=True):
+        # without 3D stacks, power density is accumulated over energy chunks
+        self.streaming_box.setVisible(self.is_streaming())
+
+        if initialize_tabs: self.initializeTabs()
+
+    def is_streaming(self):
+        return self.int_show_intensity_se == 0 and self.int_show_intensity_me == 0
+
+    def get_plotted_quantities(self):
+        plotted_quantities = []
+        if self.int_show_intensity_se == 1: plotted_quantities.append(0)
+        if self.int_show_intensity_me == 1: plotted_quantities.append(1)
+        plotted_quantities.append(2)
+
+        return plotted_quantities
+
     def calculateRadiation(self):
         if not self.received_light_source is None:
 
@@ -278,39 +322,63 @@ class OWSRWRadiation(SRWPowerDensityViewer):
         congruence.checkStrictlyPositiveNumber(self.int_relative_precision, "Propagation - Relative Precision")
         congruence.checkStrictlyPositiveNumber(self.int_number_of_points_for_trajectory_calculation, "Propagation - Number of points for trajectory calculation")
         congruence.checkPositiveNumber(self.int_sampling_factor_for_adjusting_nx_ny, " Propagation - Sampling Factor for adjusting nx/ny")
+        congruence.checkStrictlyPositiveNumber(self.int_energy_chunks, "Energy Chunks")
+        if self.is_streaming(): congruence.checkStrictlyPositiveNumber(self.int_energy_chunk_points, "Max Photon Energy Points per Chunk")
+
+    def get_wavefront_parameters(self, photon_energy_min, photon_energy_max, photon_energy_points):
+        return WavefrontParameters(photon_energy_min = photon_energy_min,
+                                   photon_energy_max = photon_energy_max,
+                                   photon_energy_points=photon_energy_points,
+                                   h_slit_gap = self.int_h_slit_gap,
+                                   v_slit_gap = self.int_v_slit_gap,
+                                   h_slit_points=self.int_h_slit_points,
+                                   v_slit_points=self.int_v_slit_points,
+                                   distance = self.int_distance,
+                                   wavefront_precision_parameters=WavefrontPrecisionParameters(sr_method=0 if self.int_sr_method == 0 else self.get_automatic_sr_method(),
+                                                                                               relative_precision=self.int_relative_precision,
+                                                                                               start_integration_longitudinal_position=self.int_start_integration_longitudinal_position,
+                                                                                               end_integration_longitudinal_position=self.int_end_integration_longitudinal_position,
+                                                                                               number_of_points_for_trajectory_calculation=self.int_number_of_points_for_trajectory_calculation,
+                                                                                               use_terminating_terms=self.int_use_terminating_terms,
+                                                                                               sampling_factor_for_adjusting_nx_ny=self.int_sampling_factor_for_adjusting_nx_ny))
 
     def run_calculation_intensity_power(self, srw_source, tickets, progress_bar_value=30):
-        wf_parameters = WavefrontParameters(photon_energy_min = self.int_photon_energy_min,
-                                            photon_energy_max = self.int_photon_energy_max,
-                                            photon_energy_points=self.int_photon_energy_points,
-                                            h_slit_gap = self.int_h_slit_gap,
-                                            v_slit_gap = self.int_v_slit_gap,
-                                            h_slit_points=self.int_h_slit_points,
-                                            v_slit_points=self.int_v_slit_points,
-                                            distance = self.int_distance,
-                                            wavefront_precision_parameters=WavefrontPrecisionParameters(sr_method=0 if self.int_sr_method == 0 else self.get_automatic_sr_method(),
-                                                                                                        relative_precision=self.int_relative_precision,
-                                                                                                        start_integration_longitudinal_position=self.int_start_integration_longitudinal_position,
-                                                                                                        end_integration_longitudinal_position=self.int_end_integration_longitudinal_position,
-                                                                                                        number_of_points_for_trajectory_calculation=self.int_number_of_points_for_trajectory_calculation,
-                                                                                                        use_terminating_terms=self.int_use_terminating_terms,
-                                                                                                        sampling_factor_for_adjusting_nx_ny=self.int_sampling_factor_for_adjusting_nx_ny))
+        if self.int_photon_energy_points > 1: energy_step = (self.int_photon_energy_max - self.int_photon_energy_min)/(self.int_photon_energy_points - 1)
+        else: energy_step = 1.0
 
-        srw_wavefront = srw_source.get_SRW_Wavefront(source_wavefront_parameters=wf_parameters)
+        if self.is_streaming():
+            # no 3D cube in memory: only the energy integrated intensity of each chunk
+            h, v, integrated_intensity = calculate_energy_integrated_intensity(srw_source,
+                                                                               self.get_wavefront_parameters,
+                                                                               self.int_photon_energy_min,
+                                                                               self.int_photon_energy_max,
+                                                                               self.int_photon_energy_points,
+                                                                               self.int_energy_chunk_points,
+                                                                               self.int_energy_chunks,
+                                                                               self.int_use_trajectory_cache == 1)
+        else:
+            # energy chunks are calculated in parallel processes and merged in a single wavefront
+            srw_wavefront = calculate_wavefront_in_energy_chunks(srw_source,
+                                                                 self.get_wavefront_parameters,
+                                                                 self.int_photon_energy_min,
+                                                                 self.int_photon_energy_max,
+                                                                 self.int_photon_energy_points,
+                                                                 self.int_energy_chunks,
+                                                                 self.int_use_trajectory_cache == 1)
 
-        e, h, v, i_se = srw_wavefront.get_intensity(multi_electron=False)
+            if self.int_show_intensity_se == 1:
+                e, h, v, i_se = srw_wavefront.get_intensity(multi_electron=False)
 
-        tickets.append((i_se, e, h*1e3, v*1e3))
+                tickets.append((i_se, e, h*1e3, v*1e3))
 
-        e, h, v, i_me = srw_wavefront.get_intensity(multi_electron=True)
+            e, h, v, i_me = srw_wavefront.get_intensity(multi_electron=True)
 
-        tickets.append((i_me, e, h*1e3, v*1e3))
+            if self.int_show_intensity_me == 1: tickets.append((i_me, e, h*1e3, v*1e3))
 
-        if len(e) > 1: energy_step = e[1]-e[0]
-        else: energy_step = 1.0
+            integrated_intensity = i_me.sum(axis=0)
 
         import scipy.constants as codata
-        pd = i_me.sum(axis=0)*energy_step*codata.e*1e3
+        pd = integrated_intensity*energy_step*codata.e*1e3
 
         self.calculated_total_power = SRWLightSource.get_total_power_from_power_density(h, v, pd)
 
@@ -321,25 +389,27 @@ class OWSRWRadiation(SRWPowerDensityViewer):
         self.progressBarSet(progress_bar_value + 10)
 
     def getVariablesToPlot(self):
-        return [[1, 2], [1, 2], [1, 2]]
+        return [[1, 2] for _ in self.get_plotted_quantities()]
 
     def getTitles(self, with_um=False):
-        if with_um: return ["Intensity SE vs E,X,Y [ph/s/.1%bw/mm\u00b2]",
-                            "Intensity ME vs E,X,Y [ph/s/.1%bw/mm\u00b2]",
-                            "Power Density vs X,Y [W/mm\u00b2]"]
-        else: return ["Intensity SE vs E,X,Y", "Intensity ME vs E,X,Y", "Power Density vs X,Y"]
+        if with_um: titles = ["Intensity SE vs E,X,Y [ph/s/.1%bw/mm\u00b2]",
+                              "Intensity ME vs E,X,Y [ph/s/.1%bw/mm\u00b2]",
+                              "Power Density vs X,Y [W/mm\u00b2]"]
+        else: titles = ["Intensity SE vs E,X,Y", "Intensity ME vs E,X,Y", "Power Density vs X,Y"]
+
+        return [titles[index] for index in self.get_plotted_quantities()]
 
     def getXTitles(self):
-        return ["X [mm]", "X [mm]", "X [mm]"]
+        return ["X [mm]" for _ in self.get_plotted_quantities()]
 
     def getYTitles(self):
-        return ["Y [mm]", "Y [mm]", "Y [mm]"]
+        return ["Y [mm]" for _ in self.get_plotted_quantities()]
 
     def getXUM(self):
-        return ["X [mm]", "X [mm]", "X [mm]"]
+        return ["X [mm]" for _ in self.get_plotted_quantities()]
 
     def getYUM(self):
-        return ["Y [mm]", "Y [mm]", "X [mm]"]
+        return [["Y [mm]", "Y [mm]", "X [mm]"][index] for index in self.get_plotted_quantities()]
 
     def receive_srw_data(self, data):
         if not data is None:
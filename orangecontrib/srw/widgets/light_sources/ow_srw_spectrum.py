@@ -23,6 +23,7 @@ from wofrysrw.storage_ring.light_sources.srw_undulator_light_source import FluxP
 
 from orangecontrib.srw.util.srw_util import SRWPlot
 from orangecontrib.srw.util.srw_objects import SRWData
+from orangecontrib.srw.util.srw_parallel import run_tasks_in_parallel, split_integer_range, get_flux, get_undulator_flux
 from orangecontrib.srw.widgets.gui.ow_srw_wavefront_viewer import SRWWavefrontViewer
 
 class OWSRWSpectrum(SRWWavefrontViewer):
@@ -89,6 +90,9 @@ class OWSRWSpectrum(SRWWavefrontViewer):
     spe_longitudinal_integration_precision_parameter = Setting(1.5)
     spe_azimuthal_integration_precision_parameter = Setting(1.5)
 
+    spe_number_of_processes = Setting(1)
+    spe_use_trajectory_cache = Setting(0)
+
     calculated_total_power = 0.0
 
     received_light_source = None
@@ -171,6 +175,12 @@ class OWSRWSpectrum(SRWWavefrontViewer):
 
         oasysgui.lineEdit(tab_prop, self, "spe_sampling_factor_for_adjusting_nx_ny", "Sampling factor for adjusting nx/ny", labelWidth=260, valueType=int, orientation="horizontal")
 
+        gui.comboBox(tab_prop, self, "spe_use_trajectory_cache", label="Reuse trajectory (explicit integration limits)",
+                     items=["No", "Yes"], labelWidth=260,
+                     sendSelectedValue=False, orientation="horizontal")
+
+        oasysgui.lineEdit(pre_box, self, "spe_number_of_processes", "Parallel Processes", labelWidth=260, valueType=int, orientation="horizontal")
+
         # FLUX  -------------------------------------------
 
         gui.rubber(self.controlArea)
@@ -298,6 +308,7 @@ class OWSRWSpectrum(SRWWavefrontViewer):
         congruence.checkStrictlyPositiveNumber(self.spe_relative_precision, "Relative Precision")
         congruence.checkStrictlyPositiveNumber(self.spe_number_of_points_for_trajectory_calculation, "Number of points for trajectory calculation")
         congruence.checkPositiveNumber(self.spe_sampling_factor_for_adjusting_nx_ny, "Sampling Factor for adjusting nx/ny")
+        congruence.checkStrictlyPositiveNumber(self.spe_number_of_processes, "Parallel Processes")
 
         self.checkFluxSpecificFields()
 
@@ -310,63 +321,66 @@ class OWSRWSpectrum(SRWWavefrontViewer):
             congruence.checkStrictlyPositiveNumber(self.spe_longitudinal_integration_precision_parameter, "Flux Longitudinal integration precision parameter")
             congruence.checkStrictlyPositiveNumber(self.spe_azimuthal_integration_precision_parameter, "Flux Azimuthal integration precision parameter")
 
+    def get_wavefront_parameters(self, h_slit_gap, v_slit_gap, h_slit_points, v_slit_points, h_position=0.0, v_position=0.0):
+        return WavefrontParameters(photon_energy_min = self.spe_photon_energy_min,
+                                   photon_energy_max = self.spe_photon_energy_max,
+                                   photon_energy_points=self.spe_photon_energy_points,
+                                   h_slit_gap = h_slit_gap,
+                                   v_slit_gap = v_slit_gap,
+                                   h_slit_points = h_slit_points,
+                                   v_slit_points = v_slit_points,
+                                   h_position=h_position,
+                                   v_position=v_position,
+                                   distance = self.spe_distance,
+                                   wavefront_precision_parameters=WavefrontPrecisionParameters(sr_method=0 if self.spe_sr_method == 0 else self.get_automatic_sr_method(),
+                                                                                               relative_precision=self.spe_relative_precision,
+                                                                                               start_integration_longitudinal_position=self.spe_start_integration_longitudinal_position,
+                                                                                               end_integration_longitudinal_position=self.spe_end_integration_longitudinal_position,
+                                                                                               number_of_points_for_trajectory_calculation=self.spe_number_of_points_for_trajectory_calculation,
+                                                                                               use_terminating_terms=self.spe_use_terminating_terms,
+                                                                                               sampling_factor_for_adjusting_nx_ny=self.spe_sampling_factor_for_adjusting_nx_ny))
+
     def run_calculation_flux(self, srw_source, tickets, progress_bar_value=50):
-        wf_parameters = WavefrontParameters(photon_energy_min = self.spe_photon_energy_min,
-                                            photon_energy_max = self.spe_photon_energy_max,
-                                            photon_energy_points=self.spe_photon_energy_points,
-                                            h_slit_gap = self.spe_h_slit_gap,
-                                            v_slit_gap = self.spe_v_slit_gap,
-                                            h_slit_points = self.spe_h_slit_points,
-                                            v_slit_points = self.spe_v_slit_points,
-                                            distance = self.spe_distance,
-                                            wavefront_precision_parameters=WavefrontPrecisionParameters(sr_method=0 if self.spe_sr_method == 0 else self.get_automatic_sr_method(),
-                                                                                                        relative_precision=self.spe_relative_precision,
-                                                                                                        start_integration_longitudinal_position=self.spe_start_integration_longitudinal_position,
-                                                                                                        end_integration_longitudinal_position=self.spe_end_integration_longitudinal_position,
-                                                                                                        number_of_points_for_trajectory_calculation=self.spe_number_of_points_for_trajectory_calculation,
-                                                                                                        use_terminating_terms=self.spe_use_terminating_terms,
-                                                                                                        sampling_factor_for_adjusting_nx_ny=self.spe_sampling_factor_for_adjusting_nx_ny))
-
-
-        srw_wavefront = srw_source.get_SRW_Wavefront(source_wavefront_parameters=wf_parameters)
+        wf_parameters = self.get_wavefront_parameters(h_slit_gap=self.spe_h_slit_gap,
+                                                      v_slit_gap=self.spe_v_slit_gap,
+                                                      h_slit_points=self.spe_h_slit_points,
+                                                      v_slit_points=self.spe_v_slit_points)
 
+        # flux through the slit and on-axis spectrum are independent: they run concurrently, with the
+        # undulator flux split in ranges of harmonics (the contributions of the harmonics are summed)
         if isinstance(self.received_light_source, SRWBendingMagnetLightSource):
-            e, i = srw_wavefront.get_flux(multi_electron=True, polarization_component_to_be_extracted=self.spe_polarization_component_to_be_extracted)
+            flux_tasks = [(get_flux, (srw_source, wf_parameters, True, self.spe_polarization_component_to_be_extracted, self.spe_use_trajectory_cache == 1))]
         elif isinstance(self.received_light_source, SRWUndulatorLightSource):
-            e, i = srw_source.get_undulator_flux(source_wavefront_parameters=wf_parameters,
-                                                 flux_precision_parameters=FluxPrecisionParameters(initial_UR_harmonic=self.spe_initial_UR_harmonic,
-                                                                                                   final_UR_harmonic=self.spe_final_UR_harmonic,
-                                                                                                   longitudinal_integration_precision_parameter=self.spe_longitudinal_integration_precision_parameter,
-                                                                                                   azimuthal_integration_precision_parameter=self.spe_azimuthal_integration_precision_parameter,
-                                                                                                   calculation_type=1))
+            flux_tasks = [(get_undulator_flux, (srw_source,
+                                                wf_parameters,
+                                                FluxPrecisionParameters(initial_UR_harmonic=initial_UR_harmonic,
+                                                                        final_UR_harmonic=final_UR_harmonic,
+                                                                        longitudinal_integration_precision_parameter=self.spe_longitudinal_integration_precision_parameter,
+                                                                        azimuthal_integration_precision_parameter=self.spe_azimuthal_integration_precision_parameter,
+                                                                        calculation_type=1)))
+                          for initial_UR_harmonic, final_UR_harmonic in split_integer_range(self.spe_initial_UR_harmonic,
+                                                                                            self.spe_final_UR_harmonic,
+                                                                                            max(1, self.spe_number_of_processes-1))]
+
+        on_axis_wf_parameters = self.get_wavefront_parameters(h_slit_gap=0.0,
+                                                              v_slit_gap=0.0,
+                                                              h_slit_points=1,
+                                                              v_slit_points=1,
+                                                              h_position=self.spe_on_axis_x,
+                                                              v_position=self.spe_on_axis_y)
+
+        results = run_tasks_in_parallel(flux_tasks + [(get_flux, (srw_source, on_axis_wf_parameters, False, self.spe_polarization_component_to_be_extracted, self.spe_use_trajectory_cache == 1))],
+                                        max_processes=self.spe_number_of_processes)
+
+        e, i = results[0][0], numpy.sum([result[1] for result in results[:-1]], axis=0)
 
         tickets.append(SRWPlot.get_ticket_1D(e, i))
 
-        wf_parameters = WavefrontParameters(photon_energy_min = self.spe_photon_energy_min,
-                                            photon_energy_max = self.spe_photon_energy_max,
-                                            photon_energy_points=self.spe_photon_energy_points,
-                                            h_slit_gap = 0.0,
-                                            v_slit_gap = 0.0,
-                                            h_slit_points = 1,
-                                            v_slit_points = 1,
-                                            h_position=self.spe_on_axis_x,
-                                            v_position=self.spe_on_axis_y,
-                                            distance = self.spe_distance,
-                                            wavefront_precision_parameters=WavefrontPrecisionParameters(sr_method=0 if self.spe_sr_method == 0 else self.get_automatic_sr_method(),
-                                                                                                        relative_precision=self.spe_relative_precision,
-                                                                                                        start_integration_longitudinal_position=self.spe_start_integration_longitudinal_position,
-                                                                                                        end_integration_longitudinal_position=self.spe_end_integration_longitudinal_position,
-                                                                                                        number_of_points_for_trajectory_calculation=self.spe_number_of_points_for_trajectory_calculation,
-                                                                                                        use_terminating_terms=self.spe_use_terminating_terms,
-                                                                                                        sampling_factor_for_adjusting_nx_ny=self.spe_sampling_factor_for_adjusting_nx_ny))
-
         power = i * 1e3 * (e[1]-e[0]) * codata.e
         cumulated_power = numpy.cumsum(power)
         self.calculated_total_power = cumulated_power[-1]
 
-        srw_wavefront = srw_source.get_SRW_Wavefront(source_wavefront_parameters=wf_parameters)
-
-        e, i = srw_wavefront.get_flux(multi_electron=False, polarization_component_to_be_extracted=self.spe_polarization_component_to_be_extracted)
+        e, i = results[-1]
 
         tickets.append(SRWPlot.get_ticket_1D(e, i))
 
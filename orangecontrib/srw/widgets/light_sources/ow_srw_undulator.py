@@ -1,6 +1,6 @@
 import sys, os, numpy
 
-from PyQt5.QtWidgets import QApplication, QDialog, QVBoxLayout, QLabel, QDialogButtonBox
+from PyQt5.QtWidgets import QApplication, QDialog, QVBoxLayout, QLabel, QDialogButtonBox, QMessageBox
 from PyQt5.QtGui import QPixmap, QPalette, QColor, QFont
 import orangecanvas.resources as resources
 from orangewidget import gui
@@ -10,9 +10,12 @@ from oasys.widgets import congruence
 
 from syned.storage_ring.magnetic_structures.undulator import Undulator
 
-from wofrysrw.storage_ring.light_sources.srw_undulator_light_source import SRWUndulatorLightSource
+from wofrysrw.propagator.wavefront2D.srw_wavefront import WavefrontParameters
+from wofrysrw.storage_ring.light_sources.srw_undulator_light_source import SRWUndulatorLightSource, FluxPrecisionParameters
 from wofrysrw.storage_ring.magnetic_structures.srw_undulator import SRWUndulator
 
+from orangecontrib.srw.util.srw_preview import get_undulator_on_axis_spectrum, get_undulator_resonance_energy, get_undulator_central_cone_flux, get_undulator_photon_beam_sizes
+from orangecontrib.srw.util.srw_tuning_curves import calculate_tuning_points, get_brilliance
 from orangecontrib.srw.widgets.gui.ow_srw_source import OWSRWSource
 
 import scipy.constants as codata
@@ -55,6 +58,17 @@ class OWSRWUndulator(OWSRWSource):
     auto_energy = Setting(0.0)
     auto_harmonic_number = Setting(1)
 
+    preview_max_harmonic = Setting(7)
+
+    tc_K_min = Setting(0.2)
+    tc_K_max = Setting(2.5)
+    tc_K_points = Setting(20)
+    tc_max_harmonic = Setting(5)
+    tc_energy_points = Setting(41)
+    tc_longitudinal_integration_precision_parameter = Setting(1.5)
+    tc_azimuthal_integration_precision_parameter = Setting(1.5)
+    tc_number_of_processes = Setting(1)
+
     def __init__(self):
         super().__init__()
 
@@ -64,7 +78,7 @@ class OWSRWUndulator(OWSRWSource):
         left_box_3 = oasysgui.createTabPage(tabs, "ID Magnetic Field")
 
         oasysgui.lineEdit(left_box_2, self, "period_length", "Period Length [m]", labelWidth=260, valueType=float, orientation="horizontal", callback=self.set_harmonic_energy)
-        oasysgui.lineEdit(left_box_2, self, "number_of_periods", "Number of Periods", labelWidth=260, valueType=float, orientation="horizontal")
+        oasysgui.lineEdit(left_box_2, self, "number_of_periods", "Number of Periods", labelWidth=260, valueType=float, orientation="horizontal", callback=self.update_preview)
         oasysgui.lineEdit(left_box_2, self, "horizontal_central_position", "Horizontal Central Position [m]", labelWidth=260, valueType=float, orientation="horizontal")
         oasysgui.lineEdit(left_box_2, self, "vertical_central_position", "Vertical Central Position [m]", labelWidth=260, valueType=float, orientation="horizontal")
         oasysgui.lineEdit(left_box_2, self, "longitudinal_central_position", "Longitudinal Central Position [m]", labelWidth=260, valueType=float, orientation="horizontal")
@@ -120,6 +134,34 @@ class OWSRWUndulator(OWSRWSource):
 
         gui.button(left_box_1, self, "Set Kv value", callback=self.auto_set_undulator)
 
+        tc_box = oasysgui.widgetBox(tab_util, "Tuning Curves (Kv sweep, flux through the wavefront slit)", addSpace=False, orientation="vertical")
+
+        oasysgui.lineEdit(tc_box, self, "tc_K_min", "K min", labelWidth=250, valueType=float, orientation="horizontal")
+        oasysgui.lineEdit(tc_box, self, "tc_K_max", "K max", labelWidth=250, valueType=float, orientation="horizontal")
+        oasysgui.lineEdit(tc_box, self, "tc_K_points", "K points", labelWidth=250, valueType=int, orientation="horizontal")
+        oasysgui.lineEdit(tc_box, self, "tc_max_harmonic", "Max Harmonic (odd harmonics)", labelWidth=250, valueType=int, orientation="horizontal")
+        oasysgui.lineEdit(tc_box, self, "tc_energy_points", "Energy points around each harmonic", labelWidth=250, valueType=int, orientation="horizontal")
+        oasysgui.lineEdit(tc_box, self, "tc_longitudinal_integration_precision_parameter", "Longitudinal integration precision param.", labelWidth=250, valueType=float, orientation="horizontal")
+        oasysgui.lineEdit(tc_box, self, "tc_azimuthal_integration_precision_parameter", "Azimuthal integration precision param.", labelWidth=250, valueType=float, orientation="horizontal")
+        oasysgui.lineEdit(tc_box, self, "tc_number_of_processes", "Parallel Processes", labelWidth=250, valueType=int, orientation="horizontal")
+
+        gui.button(tc_box, self, "Calculate Tuning Curves", callback=self.calculate_tuning_curves)
+
+        tab_tuning_curves = oasysgui.createTabPage(self.main_tabs, "Tuning Curves")
+        tabs_tuning_curves = oasysgui.tabWidget(tab_tuning_curves)
+
+        self.tuning_curves_canvas = []
+        for title in ["Flux (slit)", "Brilliance (central cone)"]:
+            tab = oasysgui.createTabPage(tabs_tuning_curves, title)
+
+            plot_canvas = oasysgui.plotWindow(roi=False, control=False, position=True, logScale=True)
+            plot_canvas.setDefaultPlotLines(True)
+            plot_canvas.setGraphYLogarithmic(True)
+
+            tab.layout().addWidget(plot_canvas)
+            self.tuning_curves_canvas.append(plot_canvas)
+
+        self.update_preview()
 
         gui.rubber(self.controlArea)
         gui.rubber(self.mainArea)
@@ -198,15 +240,146 @@ class OWSRWUndulator(OWSRWSource):
 
         self.set_MagneticField()
 
+    def calculate_tuning_curves(self):
+        self.setStatusMessage("")
+        self.progressBarInit()
+
+        try:
+            congruence.checkStrictlyPositiveNumber(self.electron_energy_in_GeV, "Energy")
+            congruence.checkStrictlyPositiveNumber(self.period_length, "Period Length")
+            congruence.checkStrictlyPositiveNumber(self.number_of_periods, "Number of Periods")
+            congruence.checkStrictlyPositiveNumber(self.ring_current, "Ring Current")
+            congruence.checkStrictlyPositiveNumber(self.tc_K_min, "K min")
+            congruence.checkGreaterThan(self.tc_K_max, self.tc_K_min, "K max", "K min")
+            congruence.checkStrictlyPositiveNumber(self.tc_K_points, "K points")
+            congruence.checkStrictlyPositiveNumber(self.tc_max_harmonic, "Max Harmonic")
+            congruence.checkStrictlyPositiveNumber(self.tc_energy_points, "Energy points around each harmonic")
+            congruence.checkStrictlyPositiveNumber(self.tc_number_of_processes, "Parallel Processes")
+            congruence.checkStrictlyPositiveNumber(self.wf_h_slit_gap, "Wavefront Propagation H Slit Gap")
+            congruence.checkStrictlyPositiveNumber(self.wf_v_slit_gap, "Wavefront Propagation V Slit Gap")
+            congruence.checkStrictlyPositiveNumber(self.wf_distance, "Wavefront Propagation Distance")
+
+            electron_beam = self.get_electron_beam()
+            sigma_x, sigma_xp, sigma_y, sigma_yp = self.get_preview_electron_beam_sigmas()
+
+            K_values = numpy.linspace(self.tc_K_min, self.tc_K_max, self.tc_K_points)
+            harmonics = list(range(1, self.tc_max_harmonic + 1, 2))
+
+            tasks = []
+            for harmonic in harmonics:
+                flux_precision_parameters = FluxPrecisionParameters(initial_UR_harmonic=harmonic,
+                                                                    final_UR_harmonic=harmonic,
+                                                                    longitudinal_integration_precision_parameter=self.tc_longitudinal_integration_precision_parameter,
+                                                                    azimuthal_integration_precision_parameter=self.tc_azimuthal_integration_precision_parameter,
+                                                                    calculation_type=1)
+                for K in K_values:
+                    # the peak of the flux through an aperture is red-shifted, within the width of the line (+ energy spread)
+                    photon_energy = get_undulator_resonance_energy(self.electron_energy_in_GeV, K, self.period_length, harmonic)
+                    relative_width = 1/(harmonic*self.number_of_periods) + 2*self.electron_energy_spread
+
+                    tasks.append((self.get_tuning_curve_srw_source(electron_beam, K),
+                                  self.get_tuning_curve_wavefront_parameters(photon_energy*(1 - 4*relative_width), photon_energy*(1 + relative_width)),
+                                  flux_precision_parameters))
+
+            self.setStatusMessage("Calculating " + str(len(tasks)) + " points of the tuning curves")
+            self.progressBarSet(20)
+
+            points, calculated_points = calculate_tuning_points(tasks, self.tc_number_of_processes)
+
+            self.progressBarSet(80)
+
+            for plot_canvas in self.tuning_curves_canvas: plot_canvas.clear()
+
+            for index, harmonic in enumerate(harmonics):
+                harmonic_points = points[index*len(K_values):(index + 1)*len(K_values)]
+
+                energy = numpy.array([point[0] for point in harmonic_points])
+                flux = numpy.array([point[1] for point in harmonic_points])
+
+                # brilliance does not depend on the slit: central cone at resonance
+                brilliance_energy, brilliance = get_brilliance(self.electron_energy_in_GeV, self.ring_current, K_values, self.period_length, self.number_of_periods, harmonic,
+                                                               sigma_x, sigma_xp, sigma_y, sigma_yp)
+
+                for plot_canvas, x, y in zip(self.tuning_curves_canvas, [energy, brilliance_energy], [flux, brilliance]):
+                    plot_canvas.addCurve(x, y, "n=" + str(harmonic), symbol='.', replace=False)
+
+            for plot_canvas, ytitle in zip(self.tuning_curves_canvas, ["Flux [ph/s/0.1%bw]", "Brilliance [ph/s/mm\u00b2/mrad\u00b2/0.1%bw]"]):
+                plot_canvas.setGraphXLabel("E [eV]")
+                plot_canvas.setGraphYLabel(ytitle)
+                plot_canvas.resetZoom()
+
+            self.main_tabs.setCurrentIndex(self.main_tabs.count() - 1)
+
+            self.setStatusMessage("Tuning curves: " + str(calculated_points) + " points calculated, " + str(len(tasks) - calculated_points) + " from cache")
+        except Exception as exception:
+            QMessageBox.critical(self, "Error", str(exception), QMessageBox.Ok)
+
+            if self.IS_DEVELOP: raise exception
+
+        self.progressBarFinished()
+
+    def get_tuning_curve_srw_source(self, electron_beam, K_vertical):
+        return SRWUndulatorLightSource(electron_beam=electron_beam,
+                                       undulator_magnetic_structure=SRWUndulator(K_vertical=K_vertical,
+                                                                                 K_horizontal=0.0,
+                                                                                 period_length=self.period_length,
+                                                                                 number_of_periods=self.number_of_periods))
+
+    def get_tuning_curve_wavefront_parameters(self, photon_energy_min, photon_energy_max):
+        return WavefrontParameters(photon_energy_min=photon_energy_min,
+                                   photon_energy_max=photon_energy_max,
+                                   photon_energy_points=self.tc_energy_points,
+                                   h_slit_gap=self.wf_h_slit_gap,
+                                   v_slit_gap=self.wf_v_slit_gap,
+                                   h_slit_points=1,
+                                   v_slit_points=1,
+                                   distance=self.wf_distance)
+
     def set_harmonic_energy(self):
         if self.wf_use_harmonic==0:
             self.wf_harmonic_energy = round(self.__resonance_energy(harmonic=self.wf_harmonic_number), 2)
         else:
             self.wf_harmonic_energy = numpy.nan
 
+        self.update_preview()
+
     def callback_electron_energy(self):
         self.set_harmonic_energy()
 
+    def has_preview(self):
+        return True
+
+    def build_preview_box(self, box):
+        oasysgui.lineEdit(box, self, "preview_max_harmonic", "Max Harmonic", labelWidth=260, valueType=int, orientation="horizontal", callback=self.update_preview)
+
+    def get_preview_titles(self):
+        return ["On-Axis Spectrum"]
+
+    def get_preview(self, sigma_x, sigma_xp, sigma_y, sigma_yp):
+        congruence.checkStrictlyPositiveNumber(self.preview_max_harmonic, "Max Harmonic")
+
+        if self.magnetic_field_from == 0:
+            K = numpy.sqrt(self.K_horizontal**2 + self.K_vertical**2)
+        else:
+            K = numpy.sqrt(self.__K_from_magnetic_field(self.B_horizontal)**2 + self.__K_from_magnetic_field(self.B_vertical)**2)
+
+        energy, flux_density = get_undulator_on_axis_spectrum(self.electron_energy_in_GeV, self.ring_current, K, self.period_length,
+                                                              self.number_of_periods, self.preview_max_harmonic)
+
+        text = "K = {0:.4f}\n\n".format(K)
+        text += "{0:>2} {1:>10} {2:>10} {3:>7} {4:>7} {5:>7} {6:>7}\n".format("n", "E [eV]", "Flux Cone", "Sx[um]", "Sx'[ur]", "Sy[um]", "Sy'[ur]")
+
+        for harmonic in range(1, self.preview_max_harmonic + 1, 2):
+            photon_energy = get_undulator_resonance_energy(self.electron_energy_in_GeV, K, self.period_length, harmonic)
+            flux = get_undulator_central_cone_flux(self.ring_current, K, self.number_of_periods, harmonic)
+            sizes = get_undulator_photon_beam_sizes(photon_energy, self.period_length, self.number_of_periods, sigma_x, sigma_xp, sigma_y, sigma_yp)
+
+            text += "{0:>2} {1:>10.1f} {2:>10.3e} {3:>7.2f} {4:>7.2f} {5:>7.2f} {6:>7.2f}\n".format(harmonic, photon_energy, flux, *[size*1e6 for size in sizes])
+
+        text += "\nFlux Cone: central cone flux [ph/s/0.1%bw]"
+
+        return text, [(energy, flux_density, "E [eV]", "Flux Density [ph/s/mrad\u00b2/0.1%bw]")]
+
     def get_default_initial_z(self):
         return -0.5*self.period_length*(self.number_of_periods + 4) # initial Longitudinal Coordinate (set before the ID)
 
@@ -0,0 +1,287 @@
+__author__ = 'labx'
+
+import os, numpy
+
+from PyQt5.QtCore import QTimer
+from PyQt5.QtGui import QPalette, QColor, QFont
+from PyQt5.QtWidgets import QMessageBox, QLabel
+from orangewidget import gui
+from orangewidget.settings import Setting
+from oasys.widgets import gui as oasysgui
+from oasys.widgets import congruence
+
+from orangecontrib.srw.util.srw_util import SRWPlot
+from orangecontrib.srw.util.srw_script_runner import SRWScriptJobRunner
+from orangecontrib.srw.util.srw_me_sharding import get_shard_file_name
+from orangecontrib.srw.widgets.gui.ow_srw_wavefront_viewer import SRWWavefrontViewer
+
+from orangecontrib.srw.widgets.native.util.me_monitor import SRWIntensityFileWatcher, SRWConvergenceEstimator
+
+class OWSRWMEConvergenceMonitor(SRWWavefrontViewer):
+
+    maintainer = "Luca Rebuffi"
+    maintainer_email = "lrebuffi(@at@)anl.gov"
+    category = "Native"
+    keywords = ["data", "file", "monitor", "convergence"]
+    name = "ME Convergence Monitor"
+    description = "SRW Native: ME Convergence Monitor"
+    icon = "icons/intensity.png"
+    priority = 5
+
+    want_main_area=1
+
+    TABS_AREA_HEIGHT = 618
+
+    intensity_file_name = Setting("output_srw_script_me.dat")
+    polling_interval = Setting(10.0)
+    save_periodicity = Setting(20)
+    convergence_threshold = Setting(0.01)
+    convergence_snapshots = Setting(3)
+    auto_stop = Setting(0)
+
+    is_final_screen = True
+    view_type = 1
+
+    last_tickets=None
+
+    convergence_status = "Not monitoring"
+
+    def __init__(self):
+        super().__init__(show_automatic_box=False, show_view_box=False)
+
+        self.general_options_box.setVisible(False)
+
+        button_box = oasysgui.widgetBox(self.controlArea, "", addSpace=False, orientation="horizontal")
+
+        self.monitor_button = gui.button(button_box, self, "Start Monitoring", callback=self.toggle_monitoring)
+        font = QFont(self.monitor_button.font())
+        font.setBold(True)
+        self.monitor_button.setFont(font)
+        palette = QPalette(self.monitor_button.palette()) # make a copy of the palette
+        palette.setColor(QPalette.ButtonText, QColor('Dark Blue'))
+        self.monitor_button.setPalette(palette) # assign new palette
+        self.monitor_button.setFixedHeight(45)
+
+        button = gui.button(button_box, self, "Stop Calculation", callback=self.stop_calculation)
+        font = QFont(button.font())
+        font.setItalic(True)
+        button.setFont(font)
+        palette = QPalette(button.palette()) # make a copy of the palette
+        palette.setColor(QPalette.ButtonText, QColor('Dark Red'))
+        button.setPalette(palette) # assign new palette
+        button.setFixedHeight(45)
+        button.setFixedWidth(150)
+
+        gui.separator(self.controlArea)
+
+        self.controlArea.setFixedWidth(self.CONTROL_AREA_WIDTH)
+
+        self.tabs_setting = oasysgui.tabWidget(self.controlArea)
+        self.tabs_setting.setFixedHeight(self.TABS_AREA_HEIGHT)
+        self.tabs_setting.setFixedWidth(self.CONTROL_AREA_WIDTH-5)
+
+        self.tab_bas = oasysgui.createTabPage(self.tabs_setting, "Monitor Setting")
+
+        gui.separator(self.tab_bas)
+
+        file_box =  oasysgui.widgetBox(self.tab_bas, "", addSpace=False, orientation="horizontal")
+        self.le_intensity_file_name = oasysgui.lineEdit(file_box, self, "intensity_file_name", "ME Output File", labelWidth=105, valueType=str, orientation="horizontal")
+        gui.button(file_box, self, "...", callback=self.selectIntensityFile)
+
+        gui.separator(self.tab_bas)
+
+        monitor_box = oasysgui.widgetBox(self.tab_bas, "Monitor", addSpace=False, orientation="vertical")
+
+        oasysgui.lineEdit(monitor_box, self, "polling_interval", "Polling Interval [s]", labelWidth=260, valueType=float, orientation="horizontal")
+        oasysgui.lineEdit(monitor_box, self, "save_periodicity", "Saving periodicity (in terms of Electrons)", labelWidth=260, valueType=int, orientation="horizontal")
+
+        convergence_box = oasysgui.widgetBox(self.tab_bas, "Convergence", addSpace=False, orientation="vertical")
+
+        oasysgui.lineEdit(convergence_box, self, "convergence_threshold", "Relative Error Threshold", labelWidth=260, valueType=float, orientation="horizontal")
+        oasysgui.lineEdit(convergence_box, self, "convergence_snapshots", "Nr. of consecutive snapshots below threshold", labelWidth=260, valueType=int, orientation="horizontal")
+
+        gui.comboBox(convergence_box, self, "auto_stop", label="Stop calculation when converged", labelWidth=260,
+                     items=["No", "Yes"], sendSelectedValue=False, orientation="horizontal")
+
+        criterion_label = QLabel("Relative error of the mean intensity I(N), after N macro-electrons, estimated\n"
+                                 "from the snapshots at N-\u0394N and N:\n\n"
+                                 "    ||I(N) - I(N-\u0394N)|| / ||I(N)|| \u00b7 \u221a(N/\u0394N)\n\n"
+                                 "N is the number of macro-electrons saved by the running processes\n"
+                                 "(shards weighted by it), or snapshots \u00d7 saving periodicity if\n"
+                                 "the processes are not known.")
+        font = QFont(criterion_label.font())
+        font.setItalic(True)
+        criterion_label.setFont(font)
+        convergence_box.layout().addWidget(criterion_label)
+
+        self.le_convergence_status = oasysgui.lineEdit(convergence_box, self, "convergence_status", "Status", labelWidth=80, valueType=str, orientation="horizontal")
+        self.le_convergence_status.setReadOnly(True)
+
+        convergence_tab = oasysgui.createTabPage(self.main_tabs, "Convergence")
+
+        self.convergence_plot_canvas = oasysgui.plotWindow(roi=False, control=False, position=True, logScale=True)
+        self.convergence_plot_canvas.setDefaultPlotLines(True)
+        self.convergence_plot_canvas.setGraphYLogarithmic(True)
+        self.convergence_plot_canvas.setGraphXLabel("Macro-Electrons")
+        self.convergence_plot_canvas.setGraphYLabel("Estimated Relative Error")
+
+        convergence_tab.layout().addWidget(self.convergence_plot_canvas)
+
+        self.monitor_timer = QTimer(self)
+        self.monitor_timer.timeout.connect(self.check_file)
+
+        self.file_watcher = None
+        self.convergence_estimator = None
+        self.monitored_jobs = {}
+
+    def selectIntensityFile(self):
+        self.le_intensity_file_name.setText(oasysgui.selectFileFromDialog(self, self.intensity_file_name, "ME Output File"))
+
+    def toggle_monitoring(self):
+        if self.monitor_timer.isActive():
+            self.stop_monitoring("Not monitoring")
+        else:
+            try:
+                congruence.checkEmptyString(self.intensity_file_name, "ME Output File")
+                congruence.checkStrictlyPositiveNumber(self.polling_interval, "Polling Interval")
+                congruence.checkStrictlyPositiveNumber(self.save_periodicity, "Saving periodicity")
+                congruence.checkStrictlyPositiveNumber(self.convergence_threshold, "Relative Error Threshold")
+                congruence.checkStrictlyPositiveNumber(self.convergence_snapshots, "Nr. of consecutive snapshots below threshold")
+
+                self.file_watcher = SRWIntensityFileWatcher(self.intensity_file_name)
+                self.convergence_estimator = SRWConvergenceEstimator()
+                self.monitored_jobs = {}
+
+                self.convergence_plot_canvas.clear()
+                self.set_status("Waiting for results")
+
+                self.monitor_button.setText("Stop Monitoring")
+                self.monitor_timer.start(int(self.polling_interval*1000))
+            except Exception as e:
+                QMessageBox.critical(self, "Error", str(e), QMessageBox.Ok)
+
+                if self.IS_DEVELOP: raise e
+
+    def stop_monitoring(self, status):
+        self.monitor_timer.stop()
+        self.monitor_button.setText("Start Monitoring")
+
+        self.set_status(status)
+
+    def set_status(self, status):
+        self.convergence_status = status
+        self.le_convergence_status.setText(status)
+
+    def stop_calculation(self):
+        job_runner = SRWScriptJobRunner.Instance()
+
+        # the output file, or the ones of its shards (local parallel calculation)
+        file_names = [self.intensity_file_name] + [get_shard_file_name(self.intensity_file_name, index) for index in range(len(job_runner.get_jobs()))]
+
+        jobs = job_runner.get_jobs_writing(file_names)
+
+        for job in jobs: job.stop()
+
+        return len(jobs)
+
+    def get_saved_macro_electrons(self, file_name):
+        '''
+        :return: number of macro-electrons saved in the file by a job of this session, None if not known
+        '''
+        file_name = os.path.abspath(file_name)
+
+        # jobs are kept after their end, when they are no more in the runner
+        for job in SRWScriptJobRunner.Instance().get_jobs_writing([file_name]): self.monitored_jobs[file_name] = job
+
+        job = self.monitored_jobs.get(file_name, None)
+
+        return None if job is None else job.get_saved_macro_electrons()
+
+    def check_file(self):
+        try:
+            snapshot = self.file_watcher.read_snapshot(self.get_saved_macro_electrons)
+
+            if not snapshot is None:
+                x, y, intensity, macro_electrons = snapshot
+
+                if macro_electrons is None: macro_electrons = (self.convergence_estimator.get_number_of_snapshots() + 1)*self.save_periodicity
+
+                self.convergence_estimator.add_snapshot(intensity, macro_electrons)
+
+                self.plot_snapshot(x, y, intensity)
+                self.plot_convergence()
+
+                relative_error = self.convergence_estimator.get_last_relative_error()
+
+                if self.convergence_estimator.is_converged(self.convergence_threshold, self.convergence_snapshots):
+                    if self.auto_stop == 1:
+                        self.stop_monitoring("Converged: stopped " + str(self.stop_calculation()) + " process(es)")
+                    else:
+                        self.set_status("Converged (relative error: {0:.2e})".format(relative_error))
+                elif not relative_error is None:
+                    self.set_status("{0} macro-electrons, relative error: {1:.2e}".format(macro_electrons, relative_error))
+                else:
+                    self.set_status("Snapshot 1")
+        except Exception as e:
+            self.stop_monitoring("Error")
+
+            QMessageBox.critical(self, "Error", str(e), QMessageBox.Ok)
+
+            if self.IS_DEVELOP: raise e
+
+    def plot_snapshot(self, x, y, intensity):
+        self.progressBarInit()
+
+        tickets = [SRWPlot.get_ticket_2D(x*1000, y*1000, intensity)]
+
+        self.plot_results(tickets, progressBarValue=50)
+
+        self.last_tickets = tickets
+
+        self.progressBarFinished()
+
+    def plot_convergence(self):
+        relative_errors = self.convergence_estimator.get_relative_errors()
+
+        if len(relative_errors) == 0: return
+
+        # the first snapshot has no relative error
+        macro_electrons = numpy.array(self.convergence_estimator.get_macro_electrons())
+
+        self.convergence_plot_canvas.addCurve(macro_electrons, numpy.array(relative_errors), "Relative Error", symbol='o', replace=True)
+        self.convergence_plot_canvas.addCurve([macro_electrons[0], macro_electrons[-1]], [self.convergence_threshold]*2, "Threshold", color="red", linestyle="--", replace=False)
+        self.convergence_plot_canvas.resetZoom()
+
+    def replot(self):
+        if not self.last_tickets is None:
+            self.progressBarInit()
+
+            self.progressBarSet(50)
+
+            self.plot_results(self.last_tickets, progressBarValue=50)
+
+            self.progressBarFinished()
+
+    def onDeleteWidget(self):
+        self.monitor_timer.stop()
+
+        super().onDeleteWidget()
+
+    def getVariablesToPlot(self):
+        return [[1, 2]]
+
+    def getTitles(self, with_um=False):
+        if with_um: return ["Intensity [ph/s/.1%bw/mm\u00b2]"]
+        else: return ["Intensity"]
+
+    def getXTitles(self):
+        return ["X [\u03bcm]"]
+
+    def getYTitles(self):
+        return ["Y [\u03bcm]"]
+
+    def getXUM(self):
+        return ["X [\u03bcm]"]
+
+    def getYUM(self):
+        return ["Y [\u03bcm]"]
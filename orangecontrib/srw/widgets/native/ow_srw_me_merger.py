@@ -0,0 +1,178 @@
+__author__ = 'labx'
+
+import os
+
+from PyQt5.QtGui import QPalette, QColor, QFont
+from PyQt5.QtWidgets import QMessageBox, QFileDialog
+from orangewidget import gui
+from orangewidget.settings import Setting
+from oasys.widgets import gui as oasysgui
+from oasys.widgets import congruence
+
+from orangecontrib.srw.util.srw_util import SRWPlot
+from orangecontrib.srw.widgets.gui.ow_srw_wavefront_viewer import SRWWavefrontViewer
+
+from orangecontrib.srw.widgets.native.util import me_merger
+
+class OWSRWMEMerger(SRWWavefrontViewer):
+
+    maintainer = "Luca Rebuffi"
+    maintainer_email = "lrebuffi(@at@)anl.gov"
+    category = "Native"
+    keywords = ["data", "file", "merge", "multi-electron"]
+    name = "ME Result Merger"
+    description = "SRW Native: ME Result Merger"
+    icon = "icons/intensity.png"
+    priority = 6
+
+    want_main_area=1
+
+    TABS_AREA_HEIGHT = 618
+
+    input_files = Setting("")
+    merged_file_name = Setting("merged_srw_me.h5")
+    block_lines = Setting(1000000)
+
+    is_final_screen = True
+    view_type = 1
+
+    last_tickets=None
+
+    def __init__(self):
+        super().__init__(show_automatic_box=False, show_view_box=False)
+
+        self.general_options_box.setVisible(False)
+
+        button_box = oasysgui.widgetBox(self.controlArea, "", addSpace=False, orientation="horizontal")
+
+        button = gui.button(button_box, self, "Merge Files", callback=self.merge_files)
+        font = QFont(button.font())
+        font.setBold(True)
+        button.setFont(font)
+        palette = QPalette(button.palette()) # make a copy of the palette
+        palette.setColor(QPalette.ButtonText, QColor('Dark Blue'))
+        button.setPalette(palette) # assign new palette
+        button.setFixedHeight(45)
+
+        gui.separator(self.controlArea)
+
+        self.controlArea.setFixedWidth(self.CONTROL_AREA_WIDTH)
+
+        self.tabs_setting = oasysgui.tabWidget(self.controlArea)
+        self.tabs_setting.setFixedHeight(self.TABS_AREA_HEIGHT)
+        self.tabs_setting.setFixedWidth(self.CONTROL_AREA_WIDTH-5)
+
+        self.tab_bas = oasysgui.createTabPage(self.tabs_setting, "Merger Setting")
+
+        files_box = oasysgui.widgetBox(self.tab_bas, "ME Files (one per line: <file> <nr. of macro-electrons>)", addSpace=False, orientation="vertical", height=330)
+
+        self.input_files_area = oasysgui.textArea(height=250, readOnly=False)
+        self.input_files_area.setText(self.input_files)
+        self.input_files_area.textChanged.connect(self.input_files_changed)
+        files_box.layout().addWidget(self.input_files_area)
+
+        gui.button(files_box, self, "Add Files...", callback=self.add_files)
+
+        gui.separator(self.tab_bas)
+
+        file_box =  oasysgui.widgetBox(self.tab_bas, "", addSpace=False, orientation="horizontal")
+        self.le_merged_file_name = oasysgui.lineEdit(file_box, self, "merged_file_name", "Merged File (HDF5)", labelWidth=130, valueType=str, orientation="horizontal")
+        gui.button(file_box, self, "...", callback=self.selectMergedFile)
+
+        oasysgui.lineEdit(self.tab_bas, self, "block_lines", "Lines read at a time from each file", labelWidth=260, valueType=int, orientation="horizontal")
+
+    def input_files_changed(self):
+        self.input_files = self.input_files_area.toPlainText()
+
+    def add_files(self):
+        file_names = QFileDialog.getOpenFileNames(self, "Add ME Files", os.getcwd(), "SRW ASCII (*.dat *.txt);;All Files (*)")[0]
+
+        text = self.input_files.strip()
+        for file_name in file_names:
+            text += ("" if text == "" else "\n") + file_name + " 1"
+
+        self.input_files_area.setText(text)
+
+    def selectMergedFile(self):
+        self.le_merged_file_name.setText(oasysgui.selectFileFromDialog(self, self.merged_file_name, "Merged File (HDF5)"))
+
+    def get_files_and_weights(self):
+        file_names = []
+        weights = []
+
+        for line in self.input_files.splitlines():
+            if line.strip() == "": continue
+
+            tokens = line.rsplit(maxsplit=1)
+
+            if len(tokens) != 2: raise ValueError("Line \"" + line + "\" is not <file> <nr. of macro-electrons>")
+
+            file_names.append(congruence.checkFile(tokens[0].strip()))
+            weight = float(tokens[1])
+            congruence.checkStrictlyPositiveNumber(weight, "Nr. of macro-electrons of " + tokens[0].strip())
+            weights.append(weight)
+
+        if len(file_names) == 0: raise ValueError("No files to merge")
+
+        return file_names, weights
+
+    def merge_files(self):
+        try:
+            congruence.checkEmptyString(self.merged_file_name, "Merged File")
+            congruence.checkStrictlyPositiveNumber(self.block_lines, "Lines read at a time")
+
+            file_names, weights = self.get_files_and_weights()
+
+            self.progressBarInit()
+            self.setStatusMessage("Merging " + str(len(file_names)) + " files")
+
+            data_type, shape = me_merger.merge_files(file_names, weights, self.merged_file_name, block_lines=self.block_lines,
+                                                     progress_callback=lambda fraction: self.progressBarSet(80*fraction))
+
+            self.writeStdOut(data_type + " " + str(shape) + " of " + str(len(file_names)) + " files (" + str(int(sum(weights))) + " macro-electrons) written to " + self.merged_file_name + "\n")
+
+            if data_type == me_merger.INTENSITY:
+                x, y, intensity = me_merger.load_merged_intensity(self.merged_file_name)
+
+                tickets = [SRWPlot.get_ticket_2D(x*1000, y*1000, intensity)]
+
+                self.plot_results(tickets, progressBarValue=80)
+
+                self.last_tickets = tickets
+
+            self.setStatusMessage("")
+        except Exception as e:
+            QMessageBox.critical(self, "Error", str(e), QMessageBox.Ok)
+
+            if self.IS_DEVELOP: raise e
+
+        self.progressBarFinished()
+
+    def replot(self):
+        if not self.last_tickets is None:
+            self.progressBarInit()
+
+            self.progressBarSet(50)
+
+            self.plot_results(self.last_tickets, progressBarValue=50)
+
+            self.progressBarFinished()
+
+    def getVariablesToPlot(self):
+        return [[1, 2]]
+
+    def getTitles(self, with_um=False):
+        if with_um: return ["Merged Intensity [ph/s/.1%bw/mm\u00b2]"]
+        else: return ["Merged Intensity"]
+
+    def getXTitles(self):
+        return ["X [\u03bcm]"]
+
+    def getYTitles(self):
+        return ["Y [\u03bcm]"]
+
+    def getXUM(self):
+        return ["X [\u03bcm]"]
+
+    def getYUM(self):
+        return ["Y [\u03bcm]"]
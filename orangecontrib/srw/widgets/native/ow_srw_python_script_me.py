@@ -1,8 +1,7 @@
-import os, sys
+import sys, numpy
 
-from PyQt5 import QtGui, QtWidgets
+from PyQt5 import QtWidgets
 from PyQt5.QtGui import QPalette, QColor, QFont
-from PyQt5.QtWidgets import QApplication, QFileDialog
 
 from orangewidget import gui
 from orangewidget.settings import Setting
@@ -10,14 +9,18 @@ from oasys.widgets import gui as oasysgui
 from oasys.widgets import congruence
 
 from orangecontrib.srw.util.python_script import PythonConsole
+from orangecontrib.srw.util.srw_script_runner import SRWScriptJob
+from orangecontrib.srw.util import srw_qmc_sampling
+from orangecontrib.srw.util.srw_me_convolution import get_electron_beam_moments
+from orangecontrib.srw.util.srw_me_sharding import get_shard_sizes, get_shard_file_name, get_shard_seed, merge_shards
 from orangecontrib.srw.util.srw_objects import SRWData
-from orangecontrib.srw.util.srw_util import showConfirmMessage
 from orangecontrib.srw.widgets.gui.ow_srw_widget import SRWWidget
+from orangecontrib.srw.widgets.gui.ow_srw_script_jobs_widget import SRWScriptJobsWidget
 
 from wofrysrw.storage_ring.light_sources.srw_bending_magnet_light_source import SRWBendingMagnetLightSource
 from wofrysrw.storage_ring.light_sources.srw_undulator_light_source import SRWUndulatorLightSource
 
-class SRWPythonScriptME(SRWWidget):
+class SRWPythonScriptME(SRWScriptJobsWidget, SRWWidget):
 
     name = "SRW Python Script (ME)"
     description = "SRW Python Script (ME)"
@@ -40,6 +43,13 @@ class SRWPythonScriptME(SRWWidget):
     srCalcPrec = Setting(0.01) # SR calculation rel. accuracy
     strIntPropME_OutFileName = Setting("output_srw_script_me.dat")
     _char = Setting(0)
+    number_of_shards = Setting(1)
+    random_seed = Setting(12345)
+    sampling_method = Setting(0)
+    use_checkpoint = Setting(0)
+    max_restarts = Setting(0)
+    benchmark_max_macro_electrons = Setting(4096)
+    benchmark_repetitions = Setting(10)
 
     IMAGE_WIDTH = 890
     IMAGE_HEIGHT = 680
@@ -70,7 +80,7 @@ class SRWPythonScriptME(SRWWidget):
 
         gui.separator(self.controlArea)
 
-        gen_box = oasysgui.widgetBox(self.controlArea, "SRW Native Code: ME", addSpace=False, orientation="vertical", height=530, width=self.CONTROL_AREA_WIDTH-5)
+        gen_box = oasysgui.widgetBox(self.controlArea, "SRW Native Code: ME", addSpace=False, orientation="vertical", width=self.CONTROL_AREA_WIDTH-5)
 
         oasysgui.lineEdit(gen_box, self, "sampFactNxNyForProp", "Sampling factor for adjusting nx, ny\n(effective if > 0)", labelWidth=260, valueType=float, orientation="horizontal")
         oasysgui.lineEdit(gen_box, self, "nMacroElec", "Total Nr. of Electrons (Wavefronts)", labelWidth=260, valueType=int, orientation="horizontal")
@@ -84,12 +94,48 @@ class SRWPythonScriptME(SRWWidget):
                      items=["Total Intensity", "Mutual Intensity"], labelWidth=300,
                      sendSelectedValue=False, orientation="horizontal")
 
+        sampling_box = oasysgui.widgetBox(gen_box, "Electron Phase Space Sampling", addSpace=False, orientation="vertical")
+
+        gui.comboBox(sampling_box, self, "sampling_method", label="Sampling", items=srw_qmc_sampling.METHODS, labelWidth=200,
+                     sendSelectedValue=False, orientation="horizontal")
+
+        benchmark_box = oasysgui.widgetBox(sampling_box, "", addSpace=False, orientation="horizontal")
+
+        oasysgui.lineEdit(benchmark_box, self, "benchmark_max_macro_electrons", "Benchmark: max Nr.", labelWidth=120, valueType=int, orientation="horizontal")
+        oasysgui.lineEdit(benchmark_box, self, "benchmark_repetitions", "Rep.", labelWidth=40, valueType=int, orientation="horizontal")
+        gui.button(benchmark_box, self, "Run", callback=self.run_sampling_benchmark)
+
+        checkpoint_box = oasysgui.widgetBox(gen_box, "Checkpoint", addSpace=False, orientation="vertical")
+
+        gui.comboBox(checkpoint_box, self, "use_checkpoint", label="Resumable (checkpoint at each saving)", items=["No", "Yes"], labelWidth=260,
+                     sendSelectedValue=False, orientation="horizontal", callback=self.set_use_checkpoint)
+        self.le_max_restarts = oasysgui.lineEdit(checkpoint_box, self, "max_restarts", "Automatic restarts of failed processes", labelWidth=260, valueType=int, orientation="horizontal")
+
+        self.set_use_checkpoint()
+
+        shard_box = oasysgui.widgetBox(gen_box, "Local Parallel Calculation (no MPI)", addSpace=False, orientation="vertical")
+
+        oasysgui.lineEdit(shard_box, self, "number_of_shards", "Nr. of Processes (Electrons split among them)", labelWidth=260, valueType=int, orientation="horizontal")
+        oasysgui.lineEdit(shard_box, self, "random_seed", "Random Seed", labelWidth=260, valueType=int, orientation="horizontal")
+
         tabs_setting = oasysgui.tabWidget(self.mainArea)
         tabs_setting.setFixedHeight(self.IMAGE_HEIGHT)
         tabs_setting.setFixedWidth(self.IMAGE_WIDTH)
 
         tab_scr = oasysgui.createTabPage(tabs_setting, "Python Script")
         tab_out = oasysgui.createTabPage(tabs_setting, "System Output")
+        tab_bnc = oasysgui.createTabPage(tabs_setting, "Sampling Benchmark")
+
+        self.tabs_setting = tabs_setting
+
+        self.benchmark_plot_canvas = oasysgui.plotWindow(roi=False, control=False, position=True, logScale=True)
+        self.benchmark_plot_canvas.setDefaultPlotLines(True)
+        self.benchmark_plot_canvas.setGraphXLogarithmic(True)
+        self.benchmark_plot_canvas.setGraphYLogarithmic(True)
+        self.benchmark_plot_canvas.setGraphXLabel("Nr. of Macro-Electrons")
+        self.benchmark_plot_canvas.setGraphYLabel("Relative RMS Error")
+
+        tab_bnc.layout().addWidget(self.benchmark_plot_canvas)
 
         self.pythonScript = oasysgui.textArea(readOnly=False)
         self.pythonScript.setStyleSheet("background-color: white; font-family: Courier, monospace;")
@@ -111,32 +157,67 @@ class SRWPythonScriptME(SRWWidget):
 
         #############################
 
-        button_box = oasysgui.widgetBox(tab_scr, "", addSpace=True, orientation="horizontal")
+        self.create_jobs_box(tab_scr)
+
+        self.shards = None
+
+    def create_jobs(self):
+        congruence.checkStrictlyPositiveNumber(self.number_of_shards, "Nr. of Processes")
+        congruence.checkPositiveNumber(self.max_restarts, "Automatic restarts of failed processes")
+
+        # only resumable scripts continue from where they failed, the others would start again from the beginning
+        max_restarts = self.max_restarts if self.use_checkpoint == 1 else 0
+
+        if self.number_of_shards == 1:
+            self.shards = None
+
+            return [SRWScriptJob(str(self.pythonScript.toPlainText()), name="SRW ME Script", number_of_macro_electrons=self.nMacroElec,
+                                 output_file_name=self.strIntPropME_OutFileName, max_restarts=max_restarts, save_periodicity=self.nMacroElecSavePer)]
+        else:
+            if self.input_srw_data is None: raise ValueError("Calculation on more processes needs the input data")
+
+            congruence.checkStrictlyPositiveNumber(self.nMacroElec, "Total Nr. of Electrons")
+
+            # each shard is the generated script (edits of the displayed script are not considered)
+            shard_sizes = get_shard_sizes(self.nMacroElec, self.number_of_shards)
+            shard_file_names = [get_shard_file_name(self.strIntPropME_OutFileName, index) for index in range(len(shard_sizes))]
+
+            self.shards = (shard_file_names, shard_sizes)
+
+            return [SRWScriptJob(self.get_script(shard_size, shard_file_name, get_shard_seed(self.random_seed, index)),
+                                 name="SRW ME Script (process " + str(index + 1) + "/" + str(len(shard_sizes)) + ")",
+                                 number_of_macro_electrons=shard_size,
+                                 output_file_name=shard_file_name,
+                                 max_restarts=max_restarts,
+                                 save_periodicity=self.nMacroElecSavePer)
+                    for index, (shard_size, shard_file_name) in enumerate(zip(shard_sizes, shard_file_names))]
+
+    def set_use_checkpoint(self):
+        self.le_max_restarts.setEnabled(self.use_checkpoint == 1)
 
-        gui.button(button_box, self, "Run Script", callback=self.execute_script, height=40)
-        gui.button(button_box, self, "Save Script to File", callback=self.save_script, height=40)
+    def jobs_ended(self):
+        # stopped processes (e.g. converged) contribute with their last saved results
+        if not self.shards is None and all([job.get_state() in (SRWScriptJob.FINISHED, SRWScriptJob.STOPPED) for job in self.jobs]): self.merge_shards()
 
-    def execute_script(self):
-        if showConfirmMessage(message = "Do you confirm launching a ME propagation?",
-                              informative_text="This is a very long and resource-consuming process: launching it within the OASYS environment is highly discouraged." + \
-                                               "The suggested solution is to save the script into a file and to launch it in a different environment."):
-            self._script = str(self.pythonScript.toPlainText())
-            self.console.write("\nRunning script:\n")
-            self.console.push("exec(_script)")
-            self.console.new_prompt(sys.ps1)
+    def merge_shards(self):
+        try:
+            shard_file_names, _ = self.shards
 
-    def save_script(self):
-        file_name = QFileDialog.getSaveFileName(self, "Save File to Disk", os.getcwd(), filter='*.py')[0]
+            # stopped processes saved their results up to the last multiple of the saving periodicity
+            shard_sizes = [job.get_saved_macro_electrons() for job in self.jobs]
 
-        if not file_name is None:
-            if not file_name.strip() == "":
-                file = open(file_name, "w")
-                file.write(str(self.pythonScript.toPlainText()))
-                file.close()
+            shard_file_names = [shard_file_name for shard_file_name, shard_size in zip(shard_file_names, shard_sizes) if shard_size > 0]
+            shard_sizes = [shard_size for shard_size in shard_sizes if shard_size > 0]
 
-                QtWidgets.QMessageBox.information(self, "QMessageBox.information()",
-                                              "File " + file_name + " written to disk",
-                                              QtWidgets.QMessageBox.Ok)
+            if len(shard_sizes) == 0: raise ValueError("No results saved by the processes: nothing to merge")
+
+            merge_shards(shard_file_names, shard_sizes, self.strIntPropME_OutFileName)
+
+            self.writeStdOut("\nResults of " + str(len(shard_file_names)) + " processes (" + str(sum(shard_sizes)) + " macro-electrons) merged into " + self.strIntPropME_OutFileName + "\n")
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Error", str(e), QtWidgets.QMessageBox.Ok)
+
+            if self.IS_DEVELOP: raise e
 
     def set_input(self, srw_data):
         if not srw_data is None:
@@ -157,20 +238,81 @@ class SRWPythonScriptME(SRWWidget):
                 if not (isinstance(received_light_source, SRWBendingMagnetLightSource) or isinstance(received_light_source, SRWUndulatorLightSource)):
                     raise ValueError("ME Script is not available with this source")
 
-                _char = 0 if self._char == 0 else 4
-
-                parameters = [self.sampFactNxNyForProp,
-                              self.nMacroElec,
-                              self.nMacroElecAvgOneProc,
-                              self.nMacroElecSavePer,
-                              self.srCalcMeth,
-                              self.srCalcPrec,
-                              self.strIntPropME_OutFileName,
-                              _char]
-
-                self.pythonScript.setText(self.input_srw_data.get_srw_beamline().to_python_code([self.input_srw_data.get_srw_wavefront(), True, parameters]))
+                self.pythonScript.setText(self.get_script(self.nMacroElec, self.strIntPropME_OutFileName))
             except Exception as e:
                 self.pythonScript.setText("Problem in writing python script:\n" + str(sys.exc_info()[0]) + ": " + str(sys.exc_info()[1]))
 
                 if self.IS_DEVELOP: raise e
 
+    def get_script(self, nMacroElec, strIntPropME_OutFileName, seed=None):
+        '''
+        :param seed: seed of the shard, for calculations on more processes
+        '''
+        _char = 0 if self._char == 0 else 4
+
+        # SRW reseeds its generator with the MPI rank: the shards sample the electrons explicitly, with their own seed
+        is_explicit_sampling = self.sampling_method != srw_qmc_sampling.PSEUDO_RANDOM or self.use_checkpoint == 1 or not seed is None
+
+        if is_explicit_sampling and _char != 0: raise ValueError("Mutual Intensity is available with SRW sampling only, on a single process, not resumable")
+
+        parameters = [self.sampFactNxNyForProp,
+                      nMacroElec,
+                      self.nMacroElecAvgOneProc,
+                      self.nMacroElecSavePer,
+                      self.srCalcMeth,
+                      self.srCalcPrec,
+                      strIntPropME_OutFileName,
+                      _char]
+
+        script = self.input_srw_data.get_srw_beamline().to_python_code([self.input_srw_data.get_srw_wavefront(), True, parameters])
+
+        if is_explicit_sampling:
+            # the propagation with srwl_wfr_emit_prop_multi_e is replaced (it cannot be resumed)
+            beamline_code = script[:script.index("\n\n####################################################\n# MULTI ELECTRON PROPAGATION")]
+
+            script = beamline_code + \
+                     srw_qmc_sampling.get_python_code(self.sampling_method,
+                                                      nMacroElec,
+                                                      self.nMacroElecSavePer,
+                                                      self.srCalcMeth,
+                                                      self.srCalcPrec,
+                                                      self.sampFactNxNyForProp,
+                                                      strIntPropME_OutFileName,
+                                                      self.random_seed if seed is None else seed,
+                                                      checkpoint=self.use_checkpoint == 1,
+                                                      beamline_code=beamline_code)
+
+        return script
+
+    def run_sampling_benchmark(self):
+        try:
+            if self.input_srw_data is None: raise ValueError("Benchmark needs the input data (electron beam)")
+
+            congruence.checkStrictlyPositiveNumber(self.benchmark_max_macro_electrons, "Benchmark max Nr. of Electrons")
+            congruence.checkStrictlyPositiveNumber(self.benchmark_repetitions, "Benchmark Repetitions")
+
+            electron_beam = self.input_srw_data.get_srw_beamline().get_light_source().get_electron_beam()
+            moments_x, moments_y = get_electron_beam_moments(electron_beam)
+
+            counts = [2**power for power in range(4, max(5, int(numpy.log2(self.benchmark_max_macro_electrons)) + 1))]
+
+            errors = srw_qmc_sampling.benchmark_sampling(moments_x, moments_y, electron_beam.get_value_from_key_name("energy_spread"), counts,
+                                                         repetitions=self.benchmark_repetitions, seed=self.random_seed)
+
+            self.benchmark_plot_canvas.clear()
+
+            for method, color in zip([srw_qmc_sampling.PSEUDO_RANDOM, srw_qmc_sampling.SOBOL, srw_qmc_sampling.HALTON], ["black", "blue", "red"]):
+                self.benchmark_plot_canvas.addCurve(counts, errors[method], srw_qmc_sampling.METHODS[method], color=color, symbol='o', replace=False)
+
+            self.benchmark_plot_canvas.resetZoom()
+
+            self.tabs_setting.setCurrentIndex(2)
+
+            # nr. of pseudo-random electrons needed for the error of the low-discrepancy methods, at the largest count (error ~ 1/sqrt(N))
+            for method in [srw_qmc_sampling.SOBOL, srw_qmc_sampling.HALTON]:
+                self.writeStdOut(srw_qmc_sampling.METHODS[method] + ": error at " + str(counts[-1]) + " electrons = {0:.2e}, pseudo-random = {1:.2e} (~{2:.1f}x fewer electrons for the same error)\n".format(
+                                 errors[method][-1], errors[srw_qmc_sampling.PSEUDO_RANDOM][-1], (errors[srw_qmc_sampling.PSEUDO_RANDOM][-1]/errors[method][-1])**2))
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Error", str(e), QtWidgets.QMessageBox.Ok)
+
+            if self.IS_DEVELOP: raise e
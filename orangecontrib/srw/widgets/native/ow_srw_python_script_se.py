@@ -1,15 +1,17 @@
-import os, sys
+import sys
 
-from PyQt5 import QtGui, QtWidgets
+from PyQt5 import QtWidgets
 from PyQt5.QtCore import QRect
-from PyQt5.QtWidgets import QApplication, QFileDialog
+from PyQt5.QtWidgets import QApplication
 from orangewidget import gui
 from oasys.widgets import gui as oasysgui, widget
 
 from orangecontrib.srw.util.python_script import PythonConsole
+from orangecontrib.srw.util.srw_script_runner import SRWScriptJob
 from orangecontrib.srw.util.srw_objects import SRWData
+from orangecontrib.srw.widgets.gui.ow_srw_script_jobs_widget import SRWScriptJobsWidget
 
-class SRWPythonScriptSE(widget.OWWidget):
+class SRWPythonScriptSE(SRWScriptJobsWidget, widget.OWWidget):
 
     name = "SRW Python Script (SE)"
     description = "SRW Python Script (SE)"
@@ -71,30 +73,10 @@ class SRWPythonScriptSE(widget.OWWidget):
 
         #############################
 
-        button_box = oasysgui.widgetBox(tab_scr, "", addSpace=True, orientation="horizontal")
-
-        gui.button(button_box, self, "Run Script", callback=self.execute_script, height=40)
-        gui.button(button_box, self, "Save Script to File", callback=self.save_script, height=40)
-
-    def execute_script(self):
-        self._script = str(self.pythonScript.toPlainText())
-        self.console.write("\nRunning script:\n")
-        self.console.push("exec(_script)")
-        self.console.new_prompt(sys.ps1)
-
-    def save_script(self):
-        file_name = QFileDialog.getSaveFileName(self, "Save File to Disk", os.getcwd(), filter='*.py')[0]
-
-        if not file_name is None:
-            if not file_name.strip() == "":
-                file = open(file_name, "w")
-                file.write(str(self.pythonScript.toPlainText()))
-                file.close()
-
-                QtWidgets.QMessageBox.information(self, "QMessageBox.information()",
-                                              "File " + file_name + " written to disk",
-                                              QtWidgets.QMessageBox.Ok)
+        self.create_jobs_box(tab_scr)
 
+    def create_jobs(self):
+        return [SRWScriptJob(str(self.pythonScript.toPlainText()), name="SRW SE Script", number_of_macro_electrons=None)]
 
     def set_input(self, srw_data):
         if not srw_data is None:
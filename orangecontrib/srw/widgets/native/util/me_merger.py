@@ -0,0 +1,184 @@
+'''
+Merge of partial multi-electron results (SRW ASCII intensity or mutual intensity files of runs on different
+machines, restarts or seeds) into an HDF5 file: the files must have the same mesh, their values are averaged
+weighted by the number of macro-electrons of each run. Files are read in blocks, never whole.
+
+Command line:
+
+    python -m orangecontrib.srw.widgets.native.util.me_merger merged.h5 run_1.dat:100000 run_2.dat:50000 ...
+'''
+import os, sys, argparse
+
+import numpy
+import h5py
+
+from orangecontrib.srw.widgets.native.util.native_util import file_load_header, file_stream
+
+INTENSITY = "intensity"
+MUTUAL_INTENSITY = "mutual_intensity"
+
+class SRWFileBlockReader(object):
+    '''
+    Values of an SRW ASCII file read in blocks of the requested size, independently of the lines of the file
+    '''
+    def __init__(self, file_name, block_lines=1000000):
+        self.__stream = file_stream(file_name, block_lines)
+        self.__buffer = numpy.empty(0)
+
+    def read(self, number_of_values):
+        blocks = [self.__buffer]
+        available = self.__buffer.size
+
+        while available < number_of_values:
+            block = next(self.__stream, None)
+            if block is None: break
+
+            blocks.append(block)
+            available += block.size
+
+        values = numpy.concatenate(blocks)
+
+        self.__buffer = values[number_of_values:]
+
+        return values[:number_of_values]
+
+def get_file_info(file_name):
+    '''
+    :return: mesh (e0, e1, ne, x0, x1, nx, y0, y1, ny), number of components, header lines
+    '''
+    header, allrange, ns = file_load_header(file_name)
+
+    return allrange, ns, header
+
+def get_data_shape(allrange, ns, number_of_values):
+    '''
+    :return: type of data, shape of the 2D dataset: (rows, values per row)
+    '''
+    ne, nx, ny = allrange[2], allrange[5], allrange[8]
+
+    if number_of_values == ne*nx*ny*ns:
+        # components are the outer loop
+        return INTENSITY, (ns*ny, nx*ne)
+    else:
+        # mutual intensity: (dim x dim) matrix, 1 or 2 (re, im) values per element
+        dim = nx*ny*ne
+        components = number_of_values // (dim**2)
+
+        if components*dim**2 != number_of_values: raise ValueError("Number of values (" + str(number_of_values) + ") not consistent with the mesh")
+
+        return MUTUAL_INTENSITY, (dim, dim*components)
+
+def count_values(file_name, block_lines=1000000):
+    return sum([block.size for block in file_stream(file_name, block_lines)])
+
+def check_compatibility(file_names):
+    '''
+    :return: mesh, number of components, number of values, common to all the files
+    '''
+    allrange, ns, _ = get_file_info(file_names[0])
+    number_of_values = count_values(file_names[0])
+
+    for file_name in file_names[1:]:
+        other_allrange, other_ns, _ = get_file_info(file_name)
+
+        if not (numpy.allclose(other_allrange, allrange, rtol=1e-9, atol=0.0) and other_ns == ns):
+            raise ValueError("Mesh of " + file_name + " is different from the mesh of " + file_names[0])
+
+        other_number_of_values = count_values(file_name)
+
+        if other_number_of_values != number_of_values:
+            raise ValueError("File " + file_name + " has " + str(other_number_of_values) + " values, " + file_names[0] + " has " + str(number_of_values) + " (incomplete file?)")
+
+    return allrange, ns, number_of_values
+
+def merge_files(file_names, weights, output_file_name, block_lines=1000000, progress_callback=None):
+    '''
+    :param weights: number of macro-electrons of each file
+    :param progress_callback: function (fraction of the merge done)
+    :return: type of data, shape of the merged dataset
+    '''
+    if len(file_names) == 0: raise ValueError("No files to merge")
+    if len(file_names) != len(weights): raise ValueError("Number of files and weights are different")
+    if min(weights) <= 0: raise ValueError("Weights must be strictly positive")
+
+    allrange, ns, number_of_values = check_compatibility(file_names)
+
+    data_type, shape = get_data_shape(allrange, ns, number_of_values)
+
+    rows, row_length = shape
+    rows_per_block = max(1, block_lines // row_length)
+    total_weight = float(numpy.sum(weights))
+
+    readers = [SRWFileBlockReader(file_name, block_lines) for file_name in file_names]
+
+    with h5py.File(output_file_name, "w") as file:
+        dataset = file.create_dataset(data_type, shape=shape, dtype=numpy.float64)
+
+        dataset.attrs["photon_energy"] = numpy.array(allrange[0:2])
+        dataset.attrs["horizontal_position"] = numpy.array(allrange[3:5])
+        dataset.attrs["vertical_position"] = numpy.array(allrange[6:8])
+        dataset.attrs["mesh_points"] = numpy.array([allrange[2], allrange[5], allrange[8]]) # ne, nx, ny
+        dataset.attrs["number_of_components"] = ns
+        dataset.attrs["layout"] = "C-aligned: inner loop vs photon energy, outer loop vs vertical position"
+
+        file.attrs["number_of_macro_electrons"] = total_weight
+        file.attrs["input_files"] = numpy.array([os.path.abspath(file_name) for file_name in file_names], dtype=h5py.string_dtype())
+        file.attrs["input_weights"] = numpy.array(weights, dtype=numpy.float64)
+
+        for first_row in range(0, rows, rows_per_block):
+            last_row = min(rows, first_row + rows_per_block)
+            number_of_block_values = (last_row - first_row)*row_length
+
+            block = numpy.zeros(number_of_block_values)
+            for reader, weight in zip(readers, weights): block += reader.read(number_of_block_values)*weight
+
+            dataset[first_row:last_row, :] = (block/total_weight).reshape((last_row - first_row, row_length))
+
+            if not progress_callback is None: progress_callback(last_row/rows)
+
+    return data_type, shape
+
+def load_merged_intensity(file_name):
+    '''
+    :return: x, y, intensity (at the first photon energy and component) of a merged intensity file
+    '''
+    with h5py.File(file_name, "r") as file:
+        if not INTENSITY in file: raise ValueError("File " + file_name + " does not contain an intensity")
+
+        dataset = file[INTENSITY]
+
+        ne, nx, ny = dataset.attrs["mesh_points"]
+        x0, x1 = dataset.attrs["horizontal_position"]
+        y0, y1 = dataset.attrs["vertical_position"]
+
+        intensity = dataset[()].reshape((dataset.attrs["number_of_components"], ny, nx, ne))[0, :, :, 0].T
+
+    return numpy.linspace(x0, x1, nx), numpy.linspace(y0, y1, ny), intensity
+
+def parse_file_argument(argument):
+    '''
+    :return: file name, weight from "file_name:number_of_macro_electrons"
+    '''
+    file_name, separator, weight = argument.rpartition(":")
+
+    if separator == "" or file_name == "": raise ValueError("Argument " + argument + " is not <file>:<number of macro-electrons>")
+
+    return file_name, float(weight)
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Merge SRW multi-electron results, weighted by the number of macro-electrons")
+    parser.add_argument("output_file_name", help="merged HDF5 file")
+    parser.add_argument("files", nargs="+", help="<SRW ASCII file>:<number of macro-electrons>")
+    parser.add_argument("--block-lines", type=int, default=1000000, help="lines read at a time from each file")
+
+    arguments = parser.parse_args(arguments)
+
+    file_names, weights = zip(*[parse_file_argument(argument) for argument in arguments.files])
+
+    data_type, shape = merge_files(list(file_names), list(weights), arguments.output_file_name, block_lines=arguments.block_lines,
+                                   progress_callback=lambda fraction: print("\r{0:.0f}%".format(100*fraction), end=""))
+
+    print("\n" + data_type + " " + str(shape) + " of " + str(len(file_names)) + " files (" + str(int(sum(weights))) + " macro-electrons) written to " + arguments.output_file_name)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+'''
+Monitoring of running multi-electron calculations: SRW rewrites the output file every nMacroElecSavePer
+macro-electrons, the watcher reads it only when a new complete snapshot is available, and the estimator measures
+the statistical error of the mean intensity from the change between successive snapshots.
+'''
+import os
+
+import numpy
+
+from orangecontrib.srw.util.srw_me_sharding import get_shard_file_name, resample_intensity
+from orangecontrib.srw.widgets.native.util.native_util import load_intensity_file
+
+class SRWIntensityFileWatcher(object):
+    '''
+    Watches the output file of an ME calculation or, if it does not exist, the output files of its shards (local
+    parallel calculation), whose intensities are averaged weighted by the number of macro-electrons saved in each file,
+    on the mesh of the first one (each shard saves on the mesh of its first electron, see srw_me_sharding)
+    '''
+    def __init__(self, file_name):
+        self.__file_name = file_name
+        self.__last_stats = None
+        self.__read_stats = None
+
+    def get_file_names(self):
+        if os.path.exists(self.__file_name): return [self.__file_name]
+
+        file_names = []
+        while os.path.exists(get_shard_file_name(self.__file_name, len(file_names))):
+            file_names.append(get_shard_file_name(self.__file_name, len(file_names)))
+
+        return file_names
+
+    def read_snapshot(self, get_macro_electrons=None):
+        '''
+        :param get_macro_electrons: function (file name) -> number of macro-electrons saved in the file, None if not known
+        :return: x, y, intensity, number of macro-electrons (None if not known) of a new snapshot, None if the files did
+                 not change since the last one or are being written (modified since the last check, or not complete)
+        '''
+        file_names = self.get_file_names()
+
+        if len(file_names) == 0: return None
+
+        stats = [(os.stat(file_name).st_mtime, os.stat(file_name).st_size) for file_name in file_names]
+
+        # the files must be unchanged between two checks, to be sure SRW finished writing them
+        is_stable = stats == self.__last_stats
+        self.__last_stats = stats
+
+        if not is_stable or stats == self.__read_stats: return None
+
+        macro_electrons = None if get_macro_electrons is None else [get_macro_electrons(file_name) for file_name in file_names]
+
+        if macro_electrons is None or None in macro_electrons:
+            weights, macro_electrons = [1]*len(file_names), None # equal weights
+        else:
+            weights = macro_electrons
+            macro_electrons = sum(macro_electrons)
+
+            if macro_electrons == 0: return None
+
+        # files of shards with nothing saved yet are left over by previous calculations
+        file_names = [file_name for file_name, weight in zip(file_names, weights) if weight > 0]
+        weights = [weight for weight in weights if weight > 0]
+
+        try:
+            snapshots = [load_intensity_file(file_name) for file_name in file_names]
+        except ValueError:
+            return None # incomplete file
+
+        x, y, intensity = snapshots[0]
+        intensity = intensity*weights[0]
+
+        for file_name, (shard_x, shard_y, shard_intensity), weight in zip(file_names[1:], snapshots[1:], weights[1:]):
+            try:
+                shard_intensity = resample_intensity(shard_intensity, (shard_x, shard_y), (x, y))
+            except ValueError as e:
+                raise ValueError("Mesh of " + file_name + " is different from the mesh of " + file_names[0] + " and cannot be interpolated on it: " + str(e))
+
+            intensity = intensity + shard_intensity*weight
+
+        self.__read_stats = stats
+
+        return x, y, intensity/sum(weights), macro_electrons
+
+class SRWConvergenceEstimator(object):
+    '''
+    Relative statistical error of the mean intensity I(N) after N macro-electrons, estimated from two successive
+    snapshots: I(N) - I(N - dN) = dN/N (B - I(N - dN)), with B the mean of the last dN macro-electrons, has norm
+    ~ sigma sqrt(dN)/N, so that
+
+        error(N) = ||I(N) - I(N - dN)|| / ||I(N)|| * sqrt(N/dN) ~ sigma/sqrt(N) / ||I(N)||
+
+    unlike the bare relative change, which decreases as sqrt(dN)/N also when the mean is far from converged.
+    '''
+    def __init__(self):
+        self.__last_intensity = None
+        self.__last_macro_electrons = 0
+        self.__macro_electrons = []
+        self.__relative_errors = []
+
+    def add_snapshot(self, intensity, macro_electrons):
+        '''
+        :param macro_electrons: number of macro-electrons averaged in the intensity
+        '''
+        intensity = numpy.array(intensity, dtype=numpy.float64)
+
+        if not self.__last_intensity is None and self.__last_intensity.shape == intensity.shape:
+            if macro_electrons <= self.__last_macro_electrons: return # no new macro-electrons
+
+            norm = numpy.linalg.norm(intensity)
+
+            if norm > 0:
+                relative_error = numpy.linalg.norm(intensity - self.__last_intensity)/norm*numpy.sqrt(macro_electrons/(macro_electrons - self.__last_macro_electrons))
+            else:
+                relative_error = numpy.inf
+
+            self.__macro_electrons.append(macro_electrons)
+            self.__relative_errors.append(relative_error)
+
+        self.__last_intensity = intensity
+        self.__last_macro_electrons = macro_electrons
+
+    def get_number_of_snapshots(self):
+        return len(self.__relative_errors) + (0 if self.__last_intensity is None else 1)
+
+    def get_macro_electrons(self):
+        return self.__macro_electrons
+
+    def get_relative_errors(self):
+        return self.__relative_errors
+
+    def get_last_relative_error(self):
+        return None if len(self.__relative_errors) == 0 else self.__relative_errors[-1]
+
+    def is_converged(self, threshold, number_of_snapshots=1):
+        '''
+        :return: True if the last number_of_snapshots estimated relative errors are below threshold
+        '''
+        return len(self.__relative_errors) >= number_of_snapshots and max(self.__relative_errors[-number_of_snapshots:]) < threshold
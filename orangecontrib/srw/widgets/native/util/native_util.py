@@ -1,3 +1,4 @@
+import itertools
 import numpy
 from scipy.interpolate import RectBivariateSpline
 
@@ -223,26 +224,10 @@ def load_mutual_intensity_file(filename):
 
 # copied from SRW's uti_plot_com and slightly  modified (no _enum)
 def file_load(_fname, _read_labels=1):
-    import numpy as np
-    nLinesHead = 11
-    hlp = []
-
-    with open(_fname,'r') as f:
-        for i in range(nLinesHead):
-            hlp.append(f.readline())
-
-    ne, nx, ny = [int(hlp[i].replace('#','').split()[0]) for i in [3,6,9]]
-    ns = 1
-    testStr = hlp[nLinesHead - 1]
-    if testStr[0] == '#':
-        ns = int(testStr.replace('#','').split()[0])
-
-    e0,e1,x0,x1,y0,y1 = [float(hlp[i].replace('#','').split()[0]) for i in [1,2,4,5,7,8]]
+    hlp, allrange, ns = file_load_header(_fname)
 
     data = numpy.squeeze(numpy.loadtxt(_fname, dtype=numpy.float64)) #get data from file (C-aligned flat)
 
-    allrange = e0, e1, ne, x0, x1, nx, y0, y1, ny
-
     arLabels = ['Photon Energy', 'Horizontal Position', 'Vertical Position', 'Intensity']
     arUnits = ['eV', 'm', 'm', 'ph/s/.1%bw/mm\u00b2']
 
@@ -269,6 +254,40 @@ def file_load(_fname, _read_labels=1):
     return data, None, allrange, arLabels, arUnits
 
 
+def file_load_header(_fname):
+    nLinesHead = 11
+    hlp = []
+
+    with open(_fname,'r') as f:
+        for i in range(nLinesHead):
+            hlp.append(f.readline())
+
+    ne, nx, ny = [int(hlp[i].replace('#','').split()[0]) for i in [3,6,9]]
+    ns = 1
+    testStr = hlp[nLinesHead - 1]
+    if testStr[0] == '#':
+        ns = int(testStr.replace('#','').split()[0])
+
+    e0,e1,x0,x1,y0,y1 = [float(hlp[i].replace('#','').split()[0]) for i in [1,2,4,5,7,8]]
+
+    allrange = e0, e1, ne, x0, x1, nx, y0, y1, ny
+
+    return hlp, allrange, ns
+
+def file_stream(_fname, _block_lines=1000000):
+    """
+    values of the file (C-aligned flat), in blocks of at most _block_lines lines, without loading the whole file
+    """
+    with open(_fname,'r') as f:
+        while True:
+            lines = list(itertools.islice(f, _block_lines))
+
+            if len(lines) == 0: break
+
+            lines = [line for line in lines if not line.startswith('#')]
+
+            if len(lines) > 0: yield numpy.fromstring("".join(lines), dtype=numpy.float64, sep=" ")
+
 def srwUtiNonZeroIntervB(p, pmin, pmax):
     if((p < pmin) or (p > pmax)):
         return 0.
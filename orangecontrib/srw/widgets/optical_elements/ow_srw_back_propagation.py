@@ -5,7 +5,6 @@ from wofrysrw.propagator.wavefront2D.srw_wavefront import PolarizationComponent
 
 from orangecontrib.srw.widgets.gui.ow_srw_optical_element import OWSRWOpticalElement
 
-from orangecontrib.srw.util.srw_util import SRWPlot
 
 class OWSRWBackPropagation(OWSRWOpticalElement):
 
@@ -29,23 +28,18 @@ class OWSRWBackPropagation(OWSRWOpticalElement):
     def check_data(self):
         super().check_data()
 
-    def run_calculation_for_plots(self, tickets, progress_bar_value):
-        if not self.output_wavefront is None:
-            super().run_calculation_for_plots(tickets, progress_bar_value)
-
-            if self.view_type == 1:
-                e, h, v, i = self.output_wavefront.get_intensity(multi_electron=True)
-
-                tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)]))
-
-            elif self.view_type == 2:
-                e, h, v, i = self.output_wavefront.get_intensity(multi_electron=True, polarization_component_to_be_extracted=PolarizationComponent.LINEAR_HORIZONTAL)
-
-                tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)]))
-
-                e, h, v, i = self.output_wavefront.get_intensity(multi_electron=True, polarization_component_to_be_extracted=PolarizationComponent.LINEAR_VERTICAL)
-
-                tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)]))
+    def get_ticket_calculators(self):
+        if self.view_type == 1:
+            return self.get_single_electron_ticket_calculators() + \
+                   [lambda extraction: extraction.get_intensity_ticket(multi_electron=True)] + \
+                   self.get_additional_ticket_calculators()
+        elif self.view_type == 2:
+            return self.get_single_electron_ticket_calculators() + \
+                   [lambda extraction: extraction.get_intensity_ticket(PolarizationComponent.LINEAR_HORIZONTAL, multi_electron=True),
+                    lambda extraction: extraction.get_intensity_ticket(PolarizationComponent.LINEAR_VERTICAL, multi_electron=True)] + \
+                   self.get_additional_ticket_calculators()
+        else:
+            return super().get_ticket_calculators()
 
     def receive_specific_syned_data(self, optical_element):
         if not optical_element is None:
@@ -56,54 +50,32 @@ class OWSRWBackPropagation(OWSRWOpticalElement):
 
     def getVariablesToPlot(self):
         if self.view_type == 2:
-            return [[1, 2], [1, 2], [1, 2], [1, 2], [1, 2], [1, 2]]
+            variables = [[1, 2], [1, 2], [1, 2], [1, 2], [1, 2], [1, 2]]
         else:
-            return [[1, 2], [1, 2], [1, 2]]
+            variables = [[1, 2], [1, 2], [1, 2]]
 
-    def getTitles(self, with_um=False):
-        if self.view_type == 2:
-            if with_um: return ["Intensity SE \u03c0 [ph/s/.1%bw/mm\u00b2]",
-                                "Intensity SE \u03c3 [ph/s/.1%bw/mm\u00b2]",
-                                "Phase SE \u03c0 [rad]",
-                                "Phase SE \u03c3 [rad]",
-                                "Intensity ME \u03c0 [ph/s/.1%bw/mm\u00b2]",
-                                "Intensity ME \u03c3 [ph/s/.1%bw/mm\u00b2]"]
-            else: return ["Intensity SE \u03c0",
-                          "Intensity SE \u03c3",
-                          "Phase SE \u03c0",
-                          "Phase SE \u03c3",
-                          "Intensity ME \u03c0 (Convolution)",
-                          "Intensity ME \u03c3 (Convolution)"]
-        else:
-            if with_um: return ["Intensity SE [ph/s/.1%bw/mm\u00b2]",
-                                "Phase SE [rad]",
-                                "Intensity ME [ph/s/.1%bw/mm\u00b2]"]
-            else: return ["Intensity SE",
-                          "Phase SE",
-                          "Intensity ME (Convolution)"]
-
-    def getXTitles(self):
-        if self.view_type == 2:
-            return ["X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]"]
-        else:
-            return ["X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]"]
-
-    def getYTitles(self):
-        if self.view_type == 2:
-            return ["Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]"]
-        else:
-            return ["Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]"]
-
-    def getXUM(self):
-        if self.view_type == 2:
-            return ["X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]"]
-        else:
-            return ["X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]"]
+        return variables + [[1, 2]]*len(self.get_additional_titles())
 
-    def getYUM(self):
+    def getTitles(self, with_um=False):
         if self.view_type == 2:
-            return ["Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]"]
+            if with_um: titles = ["Intensity SE \u03c0 [ph/s/.1%bw/mm\u00b2]",
+                                  "Intensity SE \u03c3 [ph/s/.1%bw/mm\u00b2]",
+                                  "Phase SE \u03c0 [rad]",
+                                  "Phase SE \u03c3 [rad]",
+                                  "Intensity ME \u03c0 [ph/s/.1%bw/mm\u00b2]",
+                                  "Intensity ME \u03c3 [ph/s/.1%bw/mm\u00b2]"]
+            else: titles = ["Intensity SE \u03c0",
+                            "Intensity SE \u03c3",
+                            "Phase SE \u03c0",
+                            "Phase SE \u03c3",
+                            "Intensity ME \u03c0 (Convolution)",
+                            "Intensity ME \u03c3 (Convolution)"]
         else:
-            return ["Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]"]
-
-
+            if with_um: titles = ["Intensity SE [ph/s/.1%bw/mm\u00b2]",
+                                  "Phase SE [rad]",
+                                  "Intensity ME [ph/s/.1%bw/mm\u00b2]"]
+            else: titles = ["Intensity SE",
+                            "Phase SE",
+                            "Intensity ME (Convolution)"]
+
+        return titles + self.get_additional_titles(with_um)
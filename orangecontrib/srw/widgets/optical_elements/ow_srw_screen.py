@@ -7,11 +7,15 @@ from wofrysrw.propagator.propagators2D.srw_propagation_mode import SRWPropagatio
 from wofrysrw.propagator.propagators2D.srw_fresnel_native import SRW_APPLICATION
 from wofrysrw.propagator.wavefront2D.srw_wavefront import PolarizationComponent
 
+from PyQt5.QtWidgets import QMessageBox
+
 from orangewidget.settings import Setting
 from orangewidget import gui
+from oasys.widgets import gui as oasysgui
+from oasys.widgets import congruence
 
+from orangecontrib.srw.util.srw_checkpoints import SRWCheckpointStore
 from orangecontrib.srw.widgets.gui.ow_srw_optical_element import OWSRWOpticalElement
-from orangecontrib.srw.util.srw_util import SRWPlot
 
 class OWSRWScreen(OWSRWOpticalElement):
 
@@ -21,6 +25,9 @@ class OWSRWScreen(OWSRWOpticalElement):
     priority = 20
 
     is_final_screen = Setting(0)
+    reuse_upstream_propagation = Setting(0)
+
+    checkpoints_memory = SRWCheckpointStore.DEFAULT_MAX_MEMORY # global setting of the store, shared by all the screens
 
     def __init__(self):
         super().__init__(has_orientation_angles=False, has_oe_wavefront_propagation_parameters_tab=False, has_displacement_tab=False)
@@ -28,6 +35,16 @@ class OWSRWScreen(OWSRWOpticalElement):
         self.cb_is_final_screen = gui.comboBox(self.tab_bas, self, "is_final_screen", label="Compute Wavefront Propagation", items=["No", "Yes"],
                                                labelWidth=300, sendSelectedValue=False, orientation="horizontal", callback=self.set_is_final_screen)
 
+        self.reuse_box = oasysgui.widgetBox(self.tab_bas, "Whole Beamline Propagation", addSpace=False, orientation="vertical")
+
+        gui.comboBox(self.reuse_box, self, "reuse_upstream_propagation", label="Reuse propagation of shared upstream elements", items=["No", "Yes"],
+                     labelWidth=300, sendSelectedValue=False, orientation="horizontal", callback=self.set_reuse_upstream_propagation)
+
+        self.checkpoints_memory = SRWCheckpointStore.Instance().get_max_memory()
+
+        self.le_checkpoints_memory = oasysgui.lineEdit(self.reuse_box, self, "checkpoints_memory", "Max memory for intermediate wavefronts [GB]\n(all the screens)",
+                                                       labelWidth=300, valueType=float, orientation="horizontal", callback=self.set_checkpoints_memory)
+
         self.set_is_final_screen()
 
     def set_is_final_screen(self):
@@ -35,35 +52,56 @@ class OWSRWScreen(OWSRWOpticalElement):
 
         self.cb_is_final_screen.setEnabled(propagation_mode == SRWPropagationMode.WHOLE_BEAMLINE)
 
+        self.reuse_box.setEnabled(propagation_mode == SRWPropagationMode.WHOLE_BEAMLINE and self.is_final_screen == 1)
+        self.set_reuse_upstream_propagation()
+
         self.view_type = self.is_final_screen
         self.set_PlotQuality()
 
-    def draw_specific_box(self):
-        pass
+    def set_reuse_upstream_propagation(self):
+        self.le_checkpoints_memory.setEnabled(self.reuse_upstream_propagation == 1)
 
-    def get_optical_element(self):
-        return SRWScreen(name=self.oe_name)
+    def set_checkpoints_memory(self):
+        checkpoint_store = SRWCheckpointStore.Instance()
 
-    def check_data(self):
-        super().check_data()
+        try:
+            congruence.checkPositiveNumber(self.checkpoints_memory, "Max memory for intermediate wavefronts")
+
+            checkpoint_store.set_max_memory(self.checkpoints_memory)
+        except Exception as e:
+            self.checkpoints_memory = checkpoint_store.get_max_memory()
 
-    def run_calculation_for_plots(self, tickets, progress_bar_value):
-        if not self.output_wavefront is None:
-            super().run_calculation_for_plots(tickets, progress_bar_value)
+            QMessageBox.critical(self, "Error", str(e), QMessageBox.Ok)
 
-            if self.view_type == 1:
-                e, h, v, i = self.output_wavefront.get_intensity(multi_electron=True)
+            if self.IS_DEVELOP: raise e
 
-                tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)]))
+    def is_reuse_upstream_propagation(self):
+        # the memory limit may have been changed by another screen
+        self.checkpoints_memory = SRWCheckpointStore.Instance().get_max_memory()
 
-            elif self.view_type == 2:
-                e, h, v, i = self.output_wavefront.get_intensity(multi_electron=True, polarization_component_to_be_extracted=PolarizationComponent.LINEAR_HORIZONTAL)
+        return self.reuse_upstream_propagation == 1
+
+    def draw_specific_box(self):
+        pass
 
-                tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)]))
+    def get_optical_element(self):
+        return SRWScreen(name=self.oe_name)
 
-                e, h, v, i = self.output_wavefront.get_intensity(multi_electron=True, polarization_component_to_be_extracted=PolarizationComponent.LINEAR_VERTICAL)
+    def check_data(self):
+        super().check_data()
 
-                tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, i[int(e.size/2)]))
+    def get_ticket_calculators(self):
+        if self.view_type == 1:
+            return self.get_single_electron_ticket_calculators() + \
+                   [lambda extraction: extraction.get_intensity_ticket(multi_electron=True)] + \
+                   self.get_additional_ticket_calculators()
+        elif self.view_type == 2:
+            return self.get_single_electron_ticket_calculators() + \
+                   [lambda extraction: extraction.get_intensity_ticket(PolarizationComponent.LINEAR_HORIZONTAL, multi_electron=True),
+                    lambda extraction: extraction.get_intensity_ticket(PolarizationComponent.LINEAR_VERTICAL, multi_electron=True)] + \
+                   self.get_additional_ticket_calculators()
+        else:
+            return super().get_ticket_calculators()
 
     def receive_specific_syned_data(self, optical_element):
         if not optical_element is None:
@@ -74,11 +112,16 @@ class OWSRWScreen(OWSRWOpticalElement):
 
     def getVariablesToPlot(self):
         if self.view_type == 2:
-            return [[1, 2], [1, 2], [1, 2], [1, 2], [1, 2], [1, 2]]
+            variables = [[1, 2], [1, 2], [1, 2], [1, 2], [1, 2], [1, 2]]
         else:
-            return [[1, 2], [1, 2], [1, 2]]
+            variables = [[1, 2], [1, 2], [1, 2]]
+
+        return variables + [[1, 2]]*len(self.get_additional_titles())
 
     def getTitles(self, with_um=False):
+        return self.__get_titles(with_um) + self.get_additional_titles(with_um)
+
+    def __get_titles(self, with_um=False):
         if self.view_type == 2:
             if with_um: return ["Intensity SE \u03c0 [ph/s/.1%bw/mm\u00b2]",
                                 "Intensity SE \u03c3 [ph/s/.1%bw/mm\u00b2]",
@@ -101,25 +144,13 @@ class OWSRWScreen(OWSRWOpticalElement):
                           "Intensity ME (Convolution)"]
 
     def getXTitles(self):
-        if self.view_type == 2:
-            return ["X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]"]
-        else:
-            return ["X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]"]
+        return ["X [\u03bcm]"]*len(self.getVariablesToPlot())
 
     def getYTitles(self):
-        if self.view_type == 2:
-            return ["Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]"]
-        else:
-            return ["Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]"]
+        return ["Y [\u03bcm]"]*len(self.getVariablesToPlot())
 
     def getXUM(self):
-        if self.view_type == 2:
-            return ["X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]"]
-        else:
-            return ["X [\u03bcm]", "X [\u03bcm]", "X [\u03bcm]"]
+        return ["X [\u03bcm]"]*len(self.getVariablesToPlot())
 
     def getYUM(self):
-        if self.view_type == 2:
-            return ["Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]"]
-        else:
-            return ["Y [\u03bcm]", "Y [\u03bcm]", "Y [\u03bcm]"]
+        return ["Y [\u03bcm]"]*len(self.getVariablesToPlot())
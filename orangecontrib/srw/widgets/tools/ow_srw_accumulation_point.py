@@ -1,16 +1,23 @@
 __author__ = 'labx'
 
-import os, sys, numpy
+import os, sys, time, numpy
 
+from PyQt5.QtCore import QTimer
 from PyQt5.QtGui import QPalette, QColor, QFont
 from PyQt5.QtWidgets import QMessageBox
 from orangewidget import gui
+from orangewidget.settings import Setting
 from oasys.widgets import gui as oasysgui
+from oasys.widgets import congruence
 
 from orangecontrib.srw.util.srw_util import SRWPlot
+from orangecontrib.srw.util.srw_running_statistics import SRWRunningStatistics
+from orangecontrib.srw.util.srw_cross_spectral_density import SRWCrossSpectralDensityCuts, SRWLowRankCrossSpectralDensity, HORIZONTAL, VERTICAL
 from orangecontrib.srw.util.srw_objects import SRWData
 from orangecontrib.srw.widgets.gui.ow_srw_wavefront_viewer import SRWWavefrontViewer
 
+from orangecontrib.srw.widgets.native.util import native_util
+
 class OWSRWAccumulationPoint(SRWWavefrontViewer):
 
     maintainer = "Luca Rebuffi"
@@ -24,14 +31,34 @@ class OWSRWAccumulationPoint(SRWWavefrontViewer):
 
     inputs = [("SRWData", SRWData, "receive_srw_data")]
 
+    outputs = [{"name":"SRWData",
+                "type":SRWData,
+                "doc":"SRWData",
+                "id":"SRWData"}]
+
     want_main_area=1
 
     TABS_AREA_HEIGHT = 618
     is_final_screen = True
 
-    accumulated_intensity = None
+    plotted_quantity = Setting(0)
+    plot_every = Setting(1)
+    plot_interval = Setting(0.0)
+
+    spill_to_hdf5 = Setting(0)
+    spill_file_name = Setting("accumulated_intensity.h5")
+    spill_every = Setting(100)
+
+    csd_mode = Setting(0)
+    csd_max_rank = Setting(50)
+    csd_number_of_modes = Setting(20)
+
+    QUANTITIES = ["Accumulated Intensity", "Mean Intensity", "Intensity Std. Deviation", "Intensity Std. Error of Mean"]
+
     last_tickets = None
 
+    accumulated_wavefronts = 0
+
     def __init__(self, show_automatic_box=False):
         super().__init__(show_automatic_box=show_automatic_box, show_view_box=False)
 
@@ -86,9 +113,88 @@ class OWSRWAccumulationPoint(SRWWavefrontViewer):
 
         self.set_PlottingRange()
 
+        accumulation_box = oasysgui.widgetBox(self.tab_bas, "Accumulation", addSpace=False, orientation="vertical")
+
+        gui.comboBox(accumulation_box, self, "plotted_quantity", label="Plot", labelWidth=120,
+                     items=self.QUANTITIES, callback=self.set_PlottedQuantity, sendSelectedValue=False, orientation="horizontal")
+
+        oasysgui.lineEdit(accumulation_box, self, "plot_every", "Plot every N wavefronts", labelWidth=260, valueType=int, orientation="horizontal")
+        oasysgui.lineEdit(accumulation_box, self, "plot_interval", "Min. time between plots [s]", labelWidth=260, valueType=float, orientation="horizontal")
+
+        le = oasysgui.lineEdit(accumulation_box, self, "accumulated_wavefronts", "Accumulated wavefronts", labelWidth=260, valueType=int, orientation="horizontal")
+        le.setReadOnly(True)
+
+        spill_box = oasysgui.widgetBox(self.tab_bas, "HDF5 Spill", addSpace=False, orientation="vertical")
+
+        gui.comboBox(spill_box, self, "spill_to_hdf5", label="Save statistics to HDF5 file", labelWidth=260,
+                     items=["No", "Yes"], callback=self.set_SpillToHDF5, sendSelectedValue=False, orientation="horizontal")
+
+        self.spill_box_1 = oasysgui.widgetBox(spill_box, "", addSpace=False, orientation="vertical", height=50)
+
+        file_box = oasysgui.widgetBox(self.spill_box_1, "", addSpace=False, orientation="horizontal")
+        self.le_spill_file_name = oasysgui.lineEdit(file_box, self, "spill_file_name", "File", labelWidth=60, valueType=str, orientation="horizontal")
+        gui.button(file_box, self, "...", callback=self.selectSpillFile)
+
+        spill_every_box = oasysgui.widgetBox(self.spill_box_1, "", addSpace=False, orientation="horizontal")
+        oasysgui.lineEdit(spill_every_box, self, "spill_every", "Save every N wavefronts", labelWidth=200, valueType=int, orientation="horizontal")
+        gui.button(spill_every_box, self, "Save Now", callback=self.save_now)
+
+        self.set_SpillToHDF5()
+
+        csd_box = oasysgui.widgetBox(self.tab_bas, "Cross-Spectral Density", addSpace=False, orientation="vertical")
+
+        gui.comboBox(csd_box, self, "csd_mode", label="Accumulate", labelWidth=120,
+                     items=["No", "1D Cuts (dense)", "2D (low rank)"], callback=self.set_CSDMode, sendSelectedValue=False, orientation="horizontal")
+
+        self.csd_box_1 = oasysgui.widgetBox(csd_box, "", addSpace=False, orientation="vertical", height=80)
+
+        oasysgui.lineEdit(self.csd_box_1, self, "csd_max_rank", "Max. nr. of coherent modes (rank)", labelWidth=260, valueType=int, orientation="horizontal")
+
+        send_box = oasysgui.widgetBox(self.csd_box_1, "", addSpace=False, orientation="horizontal")
+        oasysgui.lineEdit(send_box, self, "csd_number_of_modes", "Nr. of modes to send", labelWidth=200, valueType=int, orientation="horizontal")
+        gui.button(send_box, self, "Send", callback=self.send_coherent_modes)
+
+        self.statistics = SRWRunningStatistics()
+        self.csd = None
+        self.last_srw_data = None
+        self.mesh = None
+        self.last_plot_time = 0.0
+
+        # plots the last accumulated wavefronts, when they arrive during the min. time between plots
+        self.plot_timer = QTimer(self)
+        self.plot_timer.setSingleShot(True)
+        self.plot_timer.timeout.connect(self.plot_accumulation)
+
+        self.set_CSDMode()
+
+    def set_PlottedQuantity(self):
+        self.initializeTabs()
+        self.replot()
+
+    def set_CSDMode(self):
+        self.csd_box_1.setVisible(self.csd_mode==2)
+
+        # the cross-spectral density is accumulated from the next wavefront on
+        self.csd = self.create_csd()
+
+        self.initializeTabs()
+        self.replot()
+
+    def create_csd(self):
+        if self.csd_mode == 1:   return SRWCrossSpectralDensityCuts()
+        elif self.csd_mode == 2: return SRWLowRankCrossSpectralDensity(max_rank=max(1, self.csd_max_rank))
+        else:                    return None
+
+    def set_SpillToHDF5(self):
+        self.spill_box_1.setVisible(self.spill_to_hdf5==1)
+
+    def selectSpillFile(self):
+        self.le_spill_file_name.setText(oasysgui.selectFileFromDialog(self, self.spill_file_name, "HDF5 File"))
 
     def replot(self):
-        if not self.last_tickets is None:
+        if self.statistics.get_count() > 0:
+            self.plot_accumulation()
+        elif not self.last_tickets is None:
             self.progressBarInit()
 
             self.progressBarSet(50)
@@ -101,37 +207,139 @@ class OWSRWAccumulationPoint(SRWWavefrontViewer):
         if not data is None:
             if isinstance(data, SRWData):
                 if not data.get_srw_wavefront() is None:
-                    self.progressBarInit()
+                    try:
+                        congruence.checkStrictlyPositiveNumber(self.plot_every, "Plot every N wavefronts")
+                        congruence.checkPositiveNumber(self.plot_interval, "Min. time between plots")
+                        if self.spill_to_hdf5 == 1:
+                            congruence.checkEmptyString(self.spill_file_name, "HDF5 File")
+                            congruence.checkStrictlyPositiveNumber(self.spill_every, "Save every N wavefronts")
+
+                        e, h, v, i = data.get_srw_wavefront().get_intensity(multi_electron=False)
+
+                        self.statistics.add(i)
+                        self.mesh = e, h, v
+
+                        if not self.csd is None: self.csd.add(data.get_srw_wavefront())
+                        self.last_srw_data = data
 
-                    self.progressBarSet(30)
+                        self.accumulated_wavefronts = self.statistics.get_count()
 
-                    e, h, v, i = data.get_srw_wavefront().get_intensity(multi_electron=False)
+                        if self.spill_to_hdf5 == 1 and self.accumulated_wavefronts % self.spill_every == 0: self.spill_statistics()
 
-                    tickets = []
+                        if self.accumulated_wavefronts % self.plot_every == 0 or self.accumulated_wavefronts == 1:
+                            remaining_time = self.plot_interval - (time.time() - self.last_plot_time)
 
-                    if self.accumulated_intensity is None:
-                        self.accumulated_intensity = i
-                    else:
-                        if i.shape != self.accumulated_intensity.shape:
-                            raise ValueError("Accumulated Intensity Shape is different from received one")
+                            if remaining_time <= 0:
+                                self.plot_timer.stop()
+                                self.plot_accumulation()
+                            elif not self.plot_timer.isActive():
+                                self.plot_timer.start(int(remaining_time*1000))
+                    except Exception as e:
+                        QMessageBox.critical(self, "Error", str(e), QMessageBox.Ok)
 
-                        self.accumulated_intensity += i
+                        if self.IS_DEVELOP: raise e
 
-                    self.progressBarSet(60)
+    def get_plotted_quantity(self):
+        if self.plotted_quantity == 0:   return self.statistics.get_sum()
+        elif self.plotted_quantity == 1: return self.statistics.get_mean()
+        elif self.plotted_quantity == 2: return self.statistics.get_standard_deviation()
+        else:                            return self.statistics.get_standard_error()
 
-                    tickets.append(SRWPlot.get_ticket_2D(h*1000, v*1000, self.accumulated_intensity[int(e.size/2)]))
+    def plot_accumulation(self):
+        if self.statistics.get_count() == 0: return
 
-                    self.plot_results(tickets, progressBarValue=90)
+        try:
+            self.progressBarInit()
+
+            e, h, v = self.mesh
+
+            tickets = [SRWPlot.get_ticket_2D(h*1000, v*1000, self.get_plotted_quantity()[int(e.size/2)])]
+
+            if not self.csd is None and self.csd.get_count() > 0: tickets.extend(self.get_csd_tickets())
+
+            self.progressBarSet(50)
+
+            self.plot_results(tickets, progressBarValue=50)
+
+            self.last_tickets = tickets
+            self.last_plot_time = time.time()
+        except Exception as e:
+            QMessageBox.critical(self, "Error", str(e), QMessageBox.Ok)
+
+            if self.IS_DEVELOP: raise e
+
+        self.progressBarFinished()
+
+    def get_csd_tickets(self):
+        tickets = []
+
+        for direction in [HORIZONTAL, VERTICAL]:
+            coordinates = self.csd.get_coordinates()[direction] if self.csd_mode == 2 else self.csd.get_coordinates(direction)
+
+            # the modulus of the mutual intensity gives the modulus of the degree of coherence
+            sum, difference, degree_of_coherence = native_util.calculate_degree_of_coherence_vs_sum_and_difference(coordinates*1000,
+                                                                                                                   coordinates*1000,
+                                                                                                                   numpy.abs(self.csd.get_mutual_intensity(direction)))
+            tickets.append(SRWPlot.get_ticket_2D(sum, difference, degree_of_coherence))
+
+        if self.csd_mode == 2:
+            occupations = self.csd.get_occupations()
+
+            tickets.append(SRWPlot.get_ticket_1D(numpy.arange(occupations.size), occupations))
+
+        return tickets
 
-                    self.last_tickets = tickets
+    def send_coherent_modes(self):
+        try:
+            if self.csd_mode != 2 or self.csd is None or self.csd.get_count() == 0: raise ValueError("No 2D cross-spectral density accumulated")
+
+            congruence.checkStrictlyPositiveNumber(self.csd_number_of_modes, "Nr. of modes to send")
+
+            coherent_modes = self.csd.get_coherent_modes(self.last_srw_data.get_srw_wavefront(), number_of_modes=self.csd_number_of_modes)
+
+            self.writeStdOut("Coherent modes: " + str(coherent_modes.get_number_of_modes()) + ", captured fraction: {0:.4f}\n".format(coherent_modes.get_captured_fraction()))
+
+            output_srw_data = SRWData(srw_beamline=self.last_srw_data.get_srw_beamline(),
+                                      srw_wavefront=coherent_modes.get_wavefronts()[0])
+            output_srw_data.set_coherent_modes(coherent_modes)
+
+            self.send("SRWData", output_srw_data)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", str(e), QMessageBox.Ok)
+
+            if self.IS_DEVELOP: raise e
+
+    def spill_statistics(self):
+        if self.statistics.get_count() == 0: raise ValueError("No wavefronts accumulated")
+
+        e, h, v = self.mesh
 
-                    self.progressBarFinished()
+        self.statistics.save_to_hdf5(self.spill_file_name, attributes={"photon_energy" : numpy.array([e[0], e[-1]]),
+                                                                       "horizontal_position" : numpy.array([h[0], h[-1]]),
+                                                                       "vertical_position" : numpy.array([v[0], v[-1]]),
+                                                                       "layout" : "(photon energy, horizontal position, vertical position)"})
+
+    def save_now(self):
+        try:
+            congruence.checkEmptyString(self.spill_file_name, "HDF5 File")
+
+            self.spill_statistics()
+        except Exception as e:
+            QMessageBox.critical(self, "Error", str(e), QMessageBox.Ok)
+
+            if self.IS_DEVELOP: raise e
 
     def reset_accumulation(self):
         try:
             self.progressBarInit()
 
-            self.accumulated_intensity = None
+            self.plot_timer.stop()
+            self.statistics.reset()
+            self.csd = self.create_csd()
+            self.mesh = None
+            self.last_srw_data = None
+            self.last_tickets = None
+            self.accumulated_wavefronts = 0
 
             self.plot_results([SRWPlot.get_ticket_2D(numpy.array([0, 0.001]),
                                                      numpy.array([0, 0.001]),
@@ -140,21 +348,33 @@ class OWSRWAccumulationPoint(SRWWavefrontViewer):
         except:
             pass
 
+    def onDeleteWidget(self):
+        self.plot_timer.stop()
+
+        super().onDeleteWidget()
+
     def getVariablesToPlot(self):
-        return [[1, 2]]
+        if self.csd_mode == 0:   return [[1, 2]]
+        elif self.csd_mode == 1: return [[1, 2], [1, 2], [1, 2]]
+        else:                    return [[1, 2], [1, 2], [1, 2], [1]]
 
     def getTitles(self, with_um=False):
-        if with_um: return ["Accumulated Intensity [ph/s/.1%bw/mm\u00b2]"]
-        else: return ["Accumulated Intensity"]
+        if with_um: titles = [self.QUANTITIES[self.plotted_quantity] + " [ph/s/.1%bw/mm\u00b2]"]
+        else: titles = [self.QUANTITIES[self.plotted_quantity]]
+
+        if self.csd_mode > 0: titles.extend(["Degree Of Coherence (H)", "Degree Of Coherence (V)"])
+        if self.csd_mode == 2: titles.append("Coherent Mode Occupation")
+
+        return titles
 
     def getXTitles(self):
-        return ["X [\u03bcm]"]
+        return ["X [\u03bcm]", "(X\u2081 + X\u2082)/2 [\u03bcm]", "(Y\u2081 + Y\u2082)/2 [\u03bcm]", "Mode"][:len(self.getVariablesToPlot())]
 
     def getYTitles(self):
-        return ["Y [\u03bcm]"]
+        return ["Y [\u03bcm]", "(X\u2081 - X\u2082)/2 [\u03bcm]", "(Y\u2081 - Y\u2082)/2 [\u03bcm]", "Occupation"][:len(self.getVariablesToPlot())]
 
     def getXUM(self):
-        return ["X [\u03bcm]"]
+        return ["X [\u03bcm]", "X [\u03bcm]", "Y [\u03bcm]", "Mode"][:len(self.getVariablesToPlot())]
 
     def getYUM(self):
-        return ["Y [\u03bcm]"]
+        return ["Y [\u03bcm]", "X [\u03bcm]", "Y [\u03bcm]", "Occupation"][:len(self.getVariablesToPlot())]
@@ -16,6 +16,7 @@ from oasys.widgets.exchange import DataExchangeObject
 
 from orangecontrib.srw.widgets.gui.ow_srw_widget import SRWWidget
 from orangecontrib.srw.util.srw_objects import SRWPreProcessorData, SRWReflectivityData
+from orangecontrib.srw.util.srw_reflectivity import get_reflectivity_table, write_reflectivity_file, SRWReflectivityTableCache
 
 from wofrysrw.beamline.optical_elements.mirrors.srw_mirror import ScaleType
 
@@ -50,6 +51,7 @@ class OWReflectivityGenerator(SRWWidget):
     reflectivity_s_data = None
 
     data_file_name = Setting("reflectivity.dat")
+    data_file_format = Setting(0)
     energy_single_value = Setting(0.0)
     angle_single_value = Setting(0.0)
 
@@ -113,6 +115,9 @@ class OWReflectivityGenerator(SRWWidget):
         self.le_data_file_name = oasysgui.lineEdit(file_box, self, "data_file_name", "Output File Name", labelWidth=150, valueType=str, orientation="horizontal")
         gui.button(file_box, self, "...", callback=self.selectDataFile)
 
+        gui.comboBox(tab_bas, self, "data_file_format", label="Output File Format", labelWidth=150,
+                     items=["Text (SRW)", "Binary (compact)"], sendSelectedValue=False, orientation="horizontal")
+
         self.energy_box = oasysgui.widgetBox(tab_bas, "", addSpace=False, orientation="vertical")
         oasysgui.lineEdit(self.energy_box, self, "energy_single_value", "Energy Single Value [eV]", labelWidth=250, valueType=float, orientation="horizontal")
 
@@ -130,7 +135,7 @@ class OWReflectivityGenerator(SRWWidget):
 
         output_data = SRWPreProcessorData(reflectivity_data=SRWReflectivityData(reflectivity_data_file=self.data_file_name))
 
-        data_txt = ""
+        components = None
 
         if not self.reflectivity_unpol_data is None:
             try:
@@ -148,13 +153,7 @@ class OWReflectivityGenerator(SRWWidget):
                 output_data.reflectivity_data.angle_end = angle[-1]
                 output_data.reflectivity_data.angle_scale_type = ScaleType.LINEAR
 
-                data_txt = ""
-
-                for i in range(0, len(angle)):
-                    for j in range (0, len(energy)):
-                        if not (i==0 and j==0): data_txt += "\n"
-
-                        data_txt += str(reflectivity_data[j, i]) + "\n0.0"
+                components = [reflectivity_data]
 
             except:
                 try:
@@ -187,10 +186,8 @@ class OWReflectivityGenerator(SRWWidget):
                     output_data.reflectivity_data.energy_scale_type = ScaleType.LINEAR
                     output_data.reflectivity_data.angle_scale_type = ScaleType.LINEAR
 
-                    for i in range(0, len(reflectivity_data)):
-                        if i!=0: data_txt += "\n"
-
-                        data_txt += str(reflectivity_data[i, y_col]) + "\n0.0"
+                    # a single energy or angle: same layout
+                    components = [reflectivity_data[:, y_col].reshape((-1, 1))]
 
                 except Exception as exception:
                     QMessageBox.critical(self, "Error", str(exception), QMessageBox.Ok)
@@ -199,12 +196,7 @@ class OWReflectivityGenerator(SRWWidget):
 
                     return
 
-            if not data_txt == "":
-                file = open(file_name, "w")
-
-                file.write(data_txt)
-                file.flush()
-                file.close()
+            if not components is None: self.write_reflectivity_table(file_name, components, output_data)
 
             self.send("Reflectivity Data", output_data)
 
@@ -239,17 +231,7 @@ class OWReflectivityGenerator(SRWWidget):
                     output_data.reflectivity_data.angle_end = angle_s[-1]
                     output_data.reflectivity_data.angle_scale_type = ScaleType.LINEAR
 
-                    data_txt = ""
-
-                    for i in range(0, len(angle_s)):
-                        for j in range (0, len(energy_s)):
-                            if not (i==0 and j==0): data_txt += "\n"
-
-                            data_txt += str(reflectivity_s[j, i]) + "\n0.0"
-
-                    for i in range(0, len(angle_p)):
-                        for j in range (0, len(energy_p)):
-                            data_txt += "\n" + str(reflectivity_p[j, i]) + "\n0.0"
+                    components = [reflectivity_s, reflectivity_p]
 
                 except:
                     QMessageBox.critical(self, "Error", "Reflectivity data have different dimension", QMessageBox.Ok)
@@ -305,13 +287,8 @@ class OWReflectivityGenerator(SRWWidget):
                         output_data.reflectivity_data.energy_scale_type = ScaleType.LINEAR
                         output_data.reflectivity_data.angle_scale_type = ScaleType.LINEAR
 
-                        for i in range(0, len(reflectivity_s)):
-                            if i!=0: data_txt += "\n"
-
-                            data_txt += str(reflectivity_s[i, y_col]) + "\n0.0"
-
-                        for i in range(0, len(reflectivity_p)):
-                            data_txt += "\n" + str(reflectivity_p[i, y_col]) + "\n0.0"
+                        # a single energy or angle: same layout
+                        components = [reflectivity_s[:, y_col].reshape((-1, 1)), reflectivity_p[:, y_col].reshape((-1, 1))]
                     except:
                         QMessageBox.critical(self, "Error", "Reflectivity data have different dimension", QMessageBox.Ok)
 
@@ -324,12 +301,7 @@ class OWReflectivityGenerator(SRWWidget):
 
                     return
 
-            if not data_txt == "":
-                file = open(file_name, "w")
-
-                file.write(data_txt)
-                file.flush()
-                file.close()
+            if not components is None: self.write_reflectivity_table(file_name, components, output_data)
 
             self.send("Reflectivity Data", output_data)
 
@@ -337,6 +309,18 @@ class OWReflectivityGenerator(SRWWidget):
             QMessageBox.critical(self, "Error", "Incomplete Data: connect Total Polarization Data or BOTH Polarizations Data", QMessageBox.Ok)
 
 
+    def write_reflectivity_table(self, file_name, components, output_data):
+        table = get_reflectivity_table(components)
+
+        # the table in memory is the content of the file
+        if self.data_file_format == 1: table = table.astype(numpy.float32).astype(numpy.float64)
+
+        write_reflectivity_file(file_name, table, binary=self.data_file_format==1)
+
+        SRWReflectivityTableCache.Instance().put_table(file_name, table)
+
+        output_data.reflectivity_data.reflectivity_table = table
+
     def set_input_1(self, data):
         self.reflectivity_unpol_data = data
 